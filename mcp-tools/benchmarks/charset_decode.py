@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+正文解码开销基准测试
+
+对一组页面分别用旧路径和CharsetResolver解码，比较每个页面的耗时:
+
+- 旧路径: 未声明字符集时对整个正文做字符集检测(aiohttp 3.8的text()行为)，
+  未安装charset_normalizer和chardet时按UTF-8严格解码(aiohttp 3.9之后的行为)，
+  解码失败的页面单独计数
+- 新路径: 依次使用Content-Type、BOM、meta标签、主机缓存，最后只检测前缀样本
+
+页面均按未声明字符集处理(Content-Type为text/html且不带charset)，这正是两者有差异
+的情况。用 ``--corpus`` 指定保存的真实页面目录，子目录名作为主机名
+(例如 ``corpus/news.example/1.html``)；不指定时生成一组不同编码和大小的页面。
+
+用法:
+    python benchmarks/charset_decode.py --rounds 20
+    python benchmarks/charset_decode.py --corpus ./pages --rounds 5
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from typing import Callable, List, Tuple
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from mcp_fetch_server.charset import CharsetResolver  # noqa: E402
+
+# (名称, 主机, 正文)
+Page = Tuple[str, str, bytes]
+
+_PARAGRAPH = {
+    "utf-8": "<p>服务器返回的页面包含中文、English text与数字12345。</p>\n",
+    "gbk": "<p>服务器返回的页面包含中文、English text与数字12345。</p>\n",
+    "cp1252": "<p>Café, naïve résumé — “quoted” text and numbers 12345.</p>\n",
+}
+
+
+def synthetic_corpus() -> List[Page]:
+    pages = []
+    for size in (20 * 1024, 200 * 1024, 1024 * 1024):
+        for encoding, paragraph in _PARAGRAPH.items():
+            for meta in (False, True):
+                head = f'<html><head><meta charset="{encoding}">' if meta else "<html><head>"
+                text = head + "<title>bench</title></head><body>\n"
+                text += paragraph * (size // len(paragraph.encode(encoding)) + 1)
+                name = f"{encoding}{'+meta' if meta else ''} {size // 1024}KB"
+                pages.append((name, f"{encoding}.example", text.encode(encoding)))
+    return pages
+
+
+def load_corpus(root: str) -> List[Page]:
+    pages = []
+    for directory, _, files in os.walk(root):
+        host = os.path.relpath(directory, root)
+        for filename in sorted(files):
+            with open(os.path.join(directory, filename), "rb") as f:
+                pages.append((os.path.join(host, filename), host, f.read()))
+    return pages
+
+
+def old_decoder() -> Tuple[str, Callable[[bytes], str]]:
+    """旧路径: 对整个正文检测编码"""
+    try:
+        from charset_normalizer import from_bytes
+
+        def decode(body: bytes) -> str:
+            best = from_bytes(body).best()
+            return body.decode(best.encoding if best is not None else "utf-8")
+        return "charset_normalizer全文检测", decode
+    except ImportError:
+        pass
+    try:
+        import chardet
+
+        def decode(body: bytes) -> str:
+            return body.decode(chardet.detect(body)["encoding"] or "utf-8")
+        return "chardet全文检测", decode
+    except ImportError:
+        pass
+    return "UTF-8严格解码(未安装检测库)", lambda body: body.decode("utf-8")
+
+
+def measure(decode: Callable[[bytes], str], body: bytes, rounds: int) -> Tuple[float, bool]:
+    """返回单次解码耗时的中位数(微秒)和是否解码成功"""
+    durations = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        try:
+            decode(body)
+        except (UnicodeDecodeError, LookupError):
+            return 0.0, False
+        durations.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(durations), True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="正文解码开销基准测试")
+    parser.add_argument("--corpus", help="保存的页面目录，子目录名作为主机名 (默认: 生成页面)")
+    parser.add_argument("--rounds", type=int, default=20, help="每个页面的解码次数 (默认: 20)")
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus) if args.corpus else synthetic_corpus()
+    old_name, old_decode = old_decoder()
+    resolver = CharsetResolver()
+    print(f"旧路径: {old_name}，共 {len(pages)} 个页面\n")
+    print(f"{'页面':<24} {'大小KB':>8} {'旧 us':>10} {'新 us':>10} {'新编码':>10} {'来源':>8}")
+
+    old_total = new_total = 0.0
+    failures = 0
+    for name, host, body in pages:
+        old_us, ok = measure(old_decode, body, args.rounds)
+        # 首次解码的检测结果会被缓存，单独统计首次耗时再测稳定值
+        start = time.perf_counter()
+        resolver.decode(body, "text/html", None, host)
+        first_us = (time.perf_counter() - start) * 1e6
+        new_us, _ = measure(lambda b: resolver.decode(b, "text/html", None, host), body, args.rounds)
+        encoding, source = resolver.resolve(body, "text/html", None, host)
+
+        if ok:
+            old_total += old_us
+        else:
+            failures += 1
+        new_total += new_us
+        old_text = f"{old_us:10.0f}" if ok else f"{'失败':>8}"
+        print(
+            f"{name:<24} {len(body) / 1024:8.0f} {old_text} {new_us:10.0f} {encoding:>10} {source:>8}"
+            f"  (首次 {first_us:.0f} us)"
+        )
+
+    print(f"\n合计(中位数之和): 旧路径 {old_total / 1000:.1f} ms (不含 {failures} 个失败页面)，"
+          f"新路径 {new_total / 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+事件循环与HTTP解析器基准测试
+
+对 ``--loop`` 和 ``--http`` 的每种组合启动一个服务器进程，通过 ``/mcp`` 并发调用
+fetch工具访问本地上游服务，报告吞吐量和延迟分位数。上游服务和压测客户端
+在所有组合中保持不变，只有被测服务器的实现不同。
+
+用法:
+    python benchmarks/loop_http.py --requests 2000 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Dict, List
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = PROJECT_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(url: str, timeout: float = 30.0):
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"服务启动超时: {url}")
+
+
+def serve_upstream(port: int, size: int):
+    """本地上游服务，返回固定大小的文本"""
+    from aiohttp import web
+
+    body = "x" * size
+
+    async def handler(request):
+        return web.Response(text=body)
+
+    app = web.Application()
+    app.router.add_get("/", handler)
+    web.run_app(app, host="127.0.0.1", port=port, print=None, access_log=None)
+
+
+async def _load(url: str, upstream: str, requests: int, concurrency: int) -> List[float]:
+    """并发发送tools/call请求，返回每个请求的延迟(秒)"""
+    import aiohttp
+
+    latencies: List[float] = []
+    counter = itertools.count()
+    message = {
+        "jsonrpc": "2.0",
+        "method": "tools/call",
+        "params": {"name": "fetch", "arguments": {"url": upstream}},
+    }
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+        async def worker():
+            while next(counter) < requests:
+                start = time.perf_counter()
+                async with session.post(url, json=dict(message, id=1)) as response:
+                    await response.read()
+                    if response.status != 200:
+                        raise RuntimeError(f"请求失败: HTTP {response.status}")
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+def bench(loop: str, http: str, upstream: str, args) -> Dict[str, float]:
+    """测量一种组合"""
+    port = _free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "mcp_fetch_server.http_transport",
+            "--port", str(port), "--log-level", "WARNING",
+            "--loop", loop, "--http", http,
+            "--max-in-flight", str(args.concurrency),
+            "--max-queue", str(args.concurrency),
+        ],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=_env()
+    )
+    try:
+        _wait_ready(f"http://127.0.0.1:{port}/health")
+        url = f"http://127.0.0.1:{port}/mcp"
+        asyncio.run(_load(url, upstream, args.warmup, args.concurrency))
+
+        start = time.perf_counter()
+        latencies = asyncio.run(_load(url, upstream, args.requests, args.concurrency))
+        elapsed = time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait()
+
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="事件循环与HTTP解析器基准测试")
+    parser.add_argument("--requests", type=int, default=2000, help="每种组合的请求数 (默认: 2000)")
+    parser.add_argument("--concurrency", type=int, default=32, help="并发数 (默认: 32)")
+    parser.add_argument("--warmup", type=int, default=200, help="预热请求数 (默认: 200)")
+    parser.add_argument("--size", type=int, default=4096, help="上游响应大小(字节) (默认: 4096)")
+    parser.add_argument("--upstream-port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.upstream_port:
+        serve_upstream(args.upstream_port, args.size)
+        return
+
+    upstream_port = _free_port()
+    upstream = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--upstream-port", str(upstream_port), "--size", str(args.size)],
+        env=_env()
+    )
+    try:
+        _wait_ready(f"http://127.0.0.1:{upstream_port}/")
+        upstream_url = f"http://127.0.0.1:{upstream_port}/"
+        print(f"{'loop':<8} {'http':<10} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        for loop, http in itertools.product(("asyncio", "uvloop"), ("h11", "httptools")):
+            result = bench(loop, http, upstream_url, args)
+            print(f"{loop:<8} {http:<10} {result['rps']:>8.0f} {result['p50']:>8.1f} {result['p99']:>8.1f}")
+    finally:
+        upstream.terminate()
+        upstream.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+/mcp单请求开销基准测试
+
+在进程内直接调用ASGI应用(不经过网络和uvicorn)，对ping和tools/list
+这类不访问上游的消息测量每个请求的耗时，反映传输层本身的开销:
+路由、中间件、JSON编解码和响应构建。
+
+用法:
+    python benchmarks/mcp_overhead.py --requests 20000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from typing import List
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+
+def _scope(body: bytes) -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/mcp",
+        "raw_path": b"/mcp",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"127.0.0.1:8000"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+    }
+
+
+async def _call(app, body: bytes) -> int:
+    """调用一次ASGI应用，返回状态码"""
+    disconnect = asyncio.Event()
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    status = 0
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(_scope(body), receive, send)
+    disconnect.set()
+    return status
+
+
+async def measure(app, method: str, requests: int) -> List[float]:
+    """返回每个请求的耗时(微秒)"""
+    body = json.dumps({"jsonrpc": "2.0", "id": 1, "method": method}).encode()
+    for _ in range(min(requests, 1000)):
+        await _call(app, body)
+
+    durations = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        status = await _call(app, body)
+        durations.append((time.perf_counter() - start) * 1e6)
+        if status != 200:
+            raise RuntimeError(f"{method} 返回 HTTP {status}")
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/mcp单请求开销基准测试")
+    parser.add_argument("--requests", type=int, default=20000, help="每种消息的请求数 (默认: 20000)")
+    args = parser.parse_args()
+
+    import logging
+    from mcp_fetch_server.http_transport import HTTPTransportServer
+
+    # 请求日志不计入传输层开销
+    logging.disable(logging.INFO)
+    server = HTTPTransportServer("bench")
+    app = server.get_app()
+
+    for method in ("ping", "tools/list"):
+        durations = asyncio.run(measure(app, method, args.requests))
+        durations.sort()
+        print(
+            f"{method:<12} 中位数 {statistics.median(durations):7.1f} us  "
+            f"p99 {durations[int(len(durations) * 0.99) - 1]:7.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+冷启动基准测试
+
+测量三个指标:
+1. ``python -X importtime`` 下导入HTTP传输模块的耗时及最重的模块
+2. ``--help`` 的墙钟时间
+3. 从启动进程到成功响应第一个请求(/health)的时间
+
+用法:
+    python benchmarks/startup.py --runs 5
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import List, Tuple
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = PROJECT_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def import_time(module: str) -> Tuple[float, List[Tuple[int, str]]]:
+    """返回模块累计导入耗时(毫秒)和自身耗时最高的模块"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=_env(), check=True
+    )
+    total = 0.0
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue
+        name = parts[2].strip()
+        modules.append((self_us, name))
+        if name == module:
+            total = cumulative_us / 1000
+    return total, sorted(modules, reverse=True)[:10]
+
+
+def help_time() -> float:
+    """返回--help的墙钟时间(毫秒)"""
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", "mcp_fetch_server.http_transport", "--help"],
+        capture_output=True, env=_env(), check=True
+    )
+    return (time.perf_counter() - start) * 1000
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def first_request_time(timeout: float = 30.0) -> float:
+    """返回从启动进程到/health首次返回200的时间(毫秒)"""
+    port = _free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "mcp_fetch_server.http_transport", "--port", str(port), "--log-level", "WARNING"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=_env()
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - start) * 1000
+            except OSError:
+                time.sleep(0.005)
+        raise RuntimeError("服务器启动超时")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCP Fetch Server冷启动基准测试")
+    parser.add_argument("--runs", type=int, default=5, help="重复次数 (默认: 5)")
+    parser.add_argument("--module", default="mcp_fetch_server.http_transport", help="测量导入耗时的模块")
+    args = parser.parse_args()
+
+    imports = [import_time(args.module) for _ in range(args.runs)]
+    helps = [help_time() for _ in range(args.runs)]
+    firsts = [first_request_time() for _ in range(args.runs)]
+
+    print(f"导入 {args.module}: {statistics.median(total for total, _ in imports):.1f} ms (中位数)")
+    print("  自身耗时最高的模块:")
+    for self_us, name in imports[-1][1]:
+        print(f"    {self_us / 1000:8.1f} ms  {name}")
+    print(f"--help: {statistics.median(helps):.1f} ms (中位数)")
+    print(f"启动到首个请求: {statistics.median(firsts):.1f} ms (中位数)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Unix域套接字与127.0.0.1 TCP对比
+
+分别以 ``--uds`` 和 ``--port`` 启动服务器进程，通过keep-alive连接向 ``POST /mcp``
+发送同样的JSON-RPC消息，报告串行调用的延迟和并发调用的吞吐量。
+
+用法:
+    python benchmarks/uds_vs_tcp.py --requests 5000 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = PROJECT_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_ready(connector_factory, base_url: str, timeout: float = 30.0):
+    import aiohttp
+
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            async with aiohttp.ClientSession(connector=connector_factory()) as session:
+                async with session.get(f"{base_url}/health") as response:
+                    if response.status == 200:
+                        return
+        except aiohttp.ClientError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError("服务器启动超时")
+
+
+async def _run(session, url: str, method: str, requests: int, concurrency: int) -> List[float]:
+    """发送requests个调用，返回每个调用的延迟(秒)"""
+    latencies: List[float] = []
+    next_id = iter(range(requests))
+
+    async def worker():
+        for msg_id in next_id:
+            body = json.dumps({"jsonrpc": "2.0", "id": msg_id, "method": method})
+            start = time.perf_counter()
+            async with session.post(url, data=body, headers={"Content-Type": "application/json"}) as response:
+                await response.read()
+                if response.status != 200:
+                    raise RuntimeError(f"请求失败: HTTP {response.status}")
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+async def bench(connector_factory, base_url: str, args) -> Dict[str, float]:
+    import aiohttp
+
+    url = f"{base_url}/mcp"
+    await _wait_ready(connector_factory, base_url)
+    async with aiohttp.ClientSession(connector=connector_factory()) as session:
+        await _run(session, url, args.method, args.warmup, args.concurrency)
+        serial = sorted(await _run(session, url, args.method, args.requests, 1))
+        start = time.perf_counter()
+        await _run(session, url, args.method, args.requests, args.concurrency)
+        elapsed = time.perf_counter() - start
+    return {
+        "p50": statistics.median(serial) * 1e6,
+        "p99": serial[int(len(serial) * 0.99) - 1] * 1e6,
+        "rps": args.requests / elapsed,
+    }
+
+
+def measure(listen_args: List[str], connector_factory, base_url: str, args) -> Dict[str, float]:
+    process = subprocess.Popen(
+        [sys.executable, "-m", "mcp_fetch_server.http_transport", "--log-level", "WARNING"] + listen_args,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=_env()
+    )
+    try:
+        return asyncio.run(bench(connector_factory, base_url, args))
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Unix域套接字与127.0.0.1 TCP对比")
+    parser.add_argument("--requests", type=int, default=5000, help="每个阶段的请求数 (默认: 5000)")
+    parser.add_argument("--concurrency", type=int, default=32, help="吞吐量阶段的并发数 (默认: 32)")
+    parser.add_argument("--warmup", type=int, default=500, help="预热请求数 (默认: 500)")
+    parser.add_argument("--method", default="ping", choices=["ping", "tools/list"], help="测试的MCP方法 (默认: ping)")
+    args = parser.parse_args()
+
+    import aiohttp
+
+    port = _free_port()
+    tcp = measure(
+        ["--port", str(port)],
+        lambda: aiohttp.TCPConnector(limit=args.concurrency),
+        f"http://127.0.0.1:{port}",
+        args
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "mcp.sock")
+        uds = measure(
+            ["--uds", path],
+            lambda: aiohttp.UnixConnector(path=path, limit=args.concurrency),
+            "http://localhost",
+            args
+        )
+
+    print(f"方法: {args.method}")
+    print(f"{'listener':<10} {'p50 us':>8} {'p99 us':>8} {'req/s':>8}")
+    for name, result in (("tcp", tcp), ("uds", uds)):
+        print(f"{name:<10} {result['p50']:>8.0f} {result['p99']:>8.0f} {result['rps']:>8.0f}")
+    print(f"uds相对tcp: p50延迟 {(uds['p50'] / tcp['p50'] - 1) * 100:+.1f}%，吞吐量 {(uds['rps'] / tcp['rps'] - 1) * 100:+.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+WebSocket与Streamable HTTP传输对比
+
+启动一个服务器进程，分别通过 ``POST /mcp`` (keep-alive连接)和 ``/mcp/ws``
+发送同样的JSON-RPC消息，报告:
+
+1. 串行调用的单次延迟(中位数和p99)
+2. 并发调用的吞吐量
+3. 服务器进程每条消息消耗的CPU时间(读取/proc，仅Linux)
+
+用法:
+    python benchmarks/ws_vs_http.py --requests 5000 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Dict, List, Optional
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = PROJECT_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(url: str, timeout: float = 30.0):
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"服务启动超时: {url}")
+
+
+def cpu_seconds(pid: int) -> Optional[float]:
+    """进程累计的用户态+内核态CPU时间(秒)"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+class HTTPClient:
+    def __init__(self, session, url: str):
+        self.session = session
+        self.url = url
+
+    async def call(self, message: Dict) -> Dict:
+        async with self.session.post(self.url, data=json.dumps(message), headers={"Content-Type": "application/json"}) as response:
+            return await response.json()
+
+
+class WebSocketClient:
+    """在一个连接上复用并发调用，按id匹配响应"""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.reader = asyncio.ensure_future(self._read())
+
+    async def _read(self):
+        async for message in self.ws:
+            response = json.loads(message.data)
+            future = self.pending.pop(response["id"], None)
+            if future is not None:
+                future.set_result(response)
+
+    async def call(self, message: Dict) -> Dict:
+        future = asyncio.get_event_loop().create_future()
+        self.pending[message["id"]] = future
+        await self.ws.send_str(json.dumps(message))
+        return await future
+
+
+async def run_client(client, method: str, requests: int, concurrency: int) -> List[float]:
+    """发送requests个调用，返回每个调用的延迟(秒)"""
+    latencies: List[float] = []
+    next_id = iter(range(requests))
+
+    async def worker():
+        for msg_id in next_id:
+            start = time.perf_counter()
+            response = await client.call({"jsonrpc": "2.0", "id": msg_id, "method": method})
+            latencies.append(time.perf_counter() - start)
+            if "result" not in response:
+                raise RuntimeError(f"调用失败: {response}")
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+async def bench(port: int, pid: int, args) -> List[Dict]:
+    import aiohttp
+
+    results = []
+    async with aiohttp.ClientSession() as session:
+        async with session.ws_connect(f"http://127.0.0.1:{port}/mcp/ws", compress=15 if args.deflate else 0) as ws:
+            clients = [
+                ("http", HTTPClient(session, f"http://127.0.0.1:{port}/mcp")),
+                ("websocket", WebSocketClient(ws)),
+            ]
+            for name, client in clients:
+                await run_client(client, args.method, args.warmup, 1)
+
+                cpu_before = cpu_seconds(pid)
+                serial = await run_client(client, args.method, args.requests, 1)
+                start = time.perf_counter()
+                await run_client(client, args.method, args.requests, args.concurrency)
+                elapsed = time.perf_counter() - start
+                cpu_after = cpu_seconds(pid)
+
+                serial.sort()
+                cpu_per_message = None
+                if cpu_before is not None and cpu_after is not None:
+                    cpu_per_message = (cpu_after - cpu_before) / (2 * args.requests) * 1e6
+                results.append({
+                    "transport": name,
+                    "p50": statistics.median(serial) * 1e6,
+                    "p99": serial[int(len(serial) * 0.99) - 1] * 1e6,
+                    "rps": args.requests / elapsed,
+                    "cpu": cpu_per_message,
+                })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket与Streamable HTTP传输对比")
+    parser.add_argument("--requests", type=int, default=5000, help="每个阶段的请求数 (默认: 5000)")
+    parser.add_argument("--concurrency", type=int, default=32, help="吞吐量阶段的并发数 (默认: 32)")
+    parser.add_argument("--warmup", type=int, default=500, help="预热请求数 (默认: 500)")
+    parser.add_argument("--method", default="ping", choices=["ping", "tools/list"], help="测试的MCP方法 (默认: ping)")
+    parser.add_argument("--no-deflate", dest="deflate", action="store_false", help="客户端不请求permessage-deflate")
+    args = parser.parse_args()
+
+    port = _free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "mcp_fetch_server.http_transport",
+            "--port", str(port), "--log-level", "WARNING",
+            "--ws-max-in-flight", str(args.concurrency),
+        ],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=_env()
+    )
+    try:
+        _wait_ready(f"http://127.0.0.1:{port}/health")
+        results = asyncio.run(bench(port, process.pid, args))
+    finally:
+        process.terminate()
+        process.wait()
+
+    print(f"方法: {args.method}，permessage-deflate: {'开启' if args.deflate else '关闭'}")
+    print(f"{'transport':<10} {'p50 us':>8} {'p99 us':>8} {'req/s':>8} {'CPU us/msg':>11}")
+    for result in results:
+        cpu = f"{result['cpu']:.0f}" if result["cpu"] is not None else "n/a"
+        print(f"{result['transport']:<10} {result['p50']:>8.0f} {result['p99']:>8.0f} {result['rps']:>8.0f} {cpu:>11}")
+
+
+if __name__ == "__main__":
+    main()
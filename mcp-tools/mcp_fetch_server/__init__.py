@@ -1,5 +1,15 @@
-from .server import FetchMCPServer
-from .main import main
-
 __version__ = "0.1.0"
-__all__ = ["FetchMCPServer", "main"]
\ No newline at end of file
+__all__ = ["FetchMCPServer", "main"]
+
+
+def __getattr__(name):
+    """按需导入公开对象，导入任一子模块时不会连带加载整个服务器"""
+    if name == "FetchMCPServer":
+        from .server import FetchMCPServer as value
+    elif name == "main":
+        from .main import main as value
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    # 子模块导入会覆盖同名属性，这里重新绑定为导出对象
+    globals()[name] = value
+    return value
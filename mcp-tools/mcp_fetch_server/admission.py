@@ -0,0 +1,239 @@
+"""
+准入控制
+
+在工具执行前设置有界的准入队列: 同时执行的调用数不超过max_in_flight，
+超出的请求最多排队max_queue个、等待max_queue_wait秒。队列已满时立即拒绝，
+由传输层返回503和Retry-After，避免过载时所有请求的延迟一起无限增长。
+
+排队的调用按客户端分开，空出的名额以差额轮询(DRR)在客户端之间分配: 每轮为客户端
+增加一份额度(全局平均服务时间)，每次准入扣除该客户端的平均服务时间，调用越慢的客户端
+轮到的次数越少，各客户端分得的执行时间大致相同。队列已满时挤出最长队列末尾的调用，
+单个客户端无法占满整个队列。``client_max_in_flight`` 限制单个客户端同时执行的调用数。
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional
+
+from .deadline import Deadline, DeadlineExceeded
+from .metrics import MetricsRegistry
+
+
+# 没有身份信息的调用(例如stdio)共用的客户端
+ANONYMOUS = "anonymous"
+
+
+class Overloaded(Exception):
+    """服务器过载，请求被拒绝"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _ClientState:
+    """单个客户端的排队和执行状态"""
+
+    def __init__(self, avg_service_time: float):
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.in_flight = 0
+        self.deficit = 0.0
+        self.avg_service_time = avg_service_time
+
+
+class AdmissionController:
+    """按客户端公平调度的有界准入队列"""
+
+    def __init__(
+        self,
+        max_in_flight: int = 64,
+        max_queue: int = 128,
+        max_queue_wait: float = 5.0,
+        client_max_in_flight: int = 0,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_queue_wait = max_queue_wait
+        # 单个客户端同时执行的调用上限，0表示不限制
+        self.client_max_in_flight = client_max_in_flight
+        self.in_flight = 0
+        self._queued = 0
+        # 有调用在执行或排队的客户端；有排队调用的客户端按轮询顺序排列在_active中
+        self._clients: Dict[str, _ClientState] = {}
+        self._active: "OrderedDict[str, _ClientState]" = OrderedDict()
+        # 平均服务时间的指数移动平均，用于估算Retry-After和DRR额度
+        self._avg_service_time = 1.0
+
+        metrics = metrics or MetricsRegistry()
+        metrics.gauge("admission_in_flight", "正在执行的工具调用数", lambda: self.in_flight)
+        metrics.gauge("admission_queue_depth", "等待准入的工具调用数", lambda: self.queue_depth)
+        metrics.gauge("admission_clients", "有调用在执行或排队的客户端数", lambda: len(self._clients))
+        self._admitted = metrics.counter("admission_admitted_total", "获准执行的工具调用数")
+        self._shed = metrics.counter("admission_shed_total", "被拒绝的工具调用数")
+        self._queue_wait = metrics.summary("admission_queue_wait_seconds", "准入排队等待时间")
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    def client_in_flight(self, client: str) -> int:
+        state = self._clients.get(client)
+        return state.in_flight if state is not None else 0
+
+    def retry_after(self) -> int:
+        """按当前排队情况估算客户端的重试等待秒数"""
+        backlog = (self.queue_depth + 1) / max(self.max_in_flight, 1)
+        return max(1, min(30, int(backlog * self._avg_service_time + 0.999)))
+
+    def _reject(self, reason: str, message: str):
+        self._shed.inc(reason=reason)
+        raise Overloaded(message, self.retry_after())
+
+    def _at_quota(self, state: _ClientState) -> bool:
+        return bool(self.client_max_in_flight) and state.in_flight >= self.client_max_in_flight
+
+    async def acquire(self, deadline: Optional[Deadline] = None, client: str = ANONYMOUS):
+        """获取执行名额，必要时排队"""
+        state = self._clients.get(client)
+        if state is None:
+            state = self._clients[client] = _ClientState(self._avg_service_time)
+
+        # 有空闲名额时排队中的调用都属于已达并发上限的客户端，新调用可以直接执行
+        if self.in_flight < self.max_in_flight and not state.waiters and not self._at_quota(state):
+            self.in_flight += 1
+            state.in_flight += 1
+            self._admitted.inc()
+            self._queue_wait.observe(0.0)
+            return
+
+        if self._queued >= self.max_queue and not self._push_out(client):
+            self._forget(client)
+            self._reject("queue_full", "服务器繁忙，准入队列已满")
+
+        timeout = self.max_queue_wait
+        if deadline is not None:
+            timeout = deadline.clamp(timeout)
+
+        waiter = asyncio.get_event_loop().create_future()
+        state.waiters.append(waiter)
+        self._queued += 1
+        if client not in self._active:
+            self._active[client] = state
+        start_time = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            self._abandon(client, waiter)
+            if deadline is not None and deadline.expired:
+                raise DeadlineExceeded(f"排队期间超过截止时间 ({deadline.timeout}秒)")
+            self._reject("queue_timeout", "服务器繁忙，排队等待超时")
+        except BaseException:
+            # 被取消或被挤出队列
+            self._abandon(client, waiter)
+            raise
+
+        self._admitted.inc()
+        self._queue_wait.observe(time.monotonic() - start_time)
+
+    def _push_out(self, client: str) -> bool:
+        """队列已满时挤出最长队列末尾的调用，为其他客户端腾出位置"""
+        own = self._clients[client]
+        longest = max(self._active.values(), key=lambda state: len(state.waiters), default=None)
+        if longest is None or longest is own or len(longest.waiters) <= len(own.waiters) + 1:
+            return False
+        waiter = longest.waiters.pop()
+        self._queued -= 1
+        self._shed.inc(reason="pushed_out")
+        waiter.set_exception(Overloaded("服务器繁忙，排队的调用被其他客户端挤出", self.retry_after()))
+        return True
+
+    def _abandon(self, client: str, waiter: asyncio.Future):
+        """排队的调用放弃等待: 从队列中移除，已移交的名额归还"""
+        state = self._clients.get(client)
+        if state is not None:
+            try:
+                state.waiters.remove(waiter)
+                self._queued -= 1
+            except ValueError:
+                pass
+        if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+            self.release(client=client)
+        else:
+            self._forget(client)
+
+    def _forget(self, client: str):
+        """客户端没有执行中或排队的调用时清除其状态"""
+        state = self._clients.get(client)
+        if state is not None and state.in_flight == 0 and not state.waiters:
+            del self._clients[client]
+            self._active.pop(client, None)
+
+    def release(self, service_time: Optional[float] = None, client: str = ANONYMOUS):
+        """释放名额，优先移交给按DRR选出的排队调用"""
+        state = self._clients.get(client)
+        if service_time is not None:
+            self._avg_service_time = 0.9 * self._avg_service_time + 0.1 * service_time
+            if state is not None:
+                state.avg_service_time = 0.8 * state.avg_service_time + 0.2 * service_time
+
+        if state is not None:
+            state.in_flight -= 1
+            self._forget(client)
+        self.in_flight -= 1
+
+        while self.in_flight < self.max_in_flight:
+            next_client = self._next_waiter()
+            if next_client is None:
+                return
+            next_state = self._clients[next_client]
+            waiter = next_state.waiters.popleft()
+            self._queued -= 1
+            # 名额直接移交，在等待方恢复运行前计入
+            self.in_flight += 1
+            next_state.in_flight += 1
+            waiter.set_result(None)
+
+    def _next_waiter(self) -> Optional[str]:
+        """差额轮询选出下一个获得名额的客户端，没有可以执行的排队调用时返回None"""
+        quantum = max(self._avg_service_time, 1e-3)
+        skipped = 0
+        while self._active and skipped < len(self._active):
+            client, state = next(iter(self._active.items()))
+            while state.waiters and state.waiters[0].done():
+                state.waiters.popleft()
+                self._queued -= 1
+            if not state.waiters:
+                # 队列清空后不保留额度
+                state.deficit = 0.0
+                del self._active[client]
+                self._forget(client)
+                continue
+            if self._at_quota(state):
+                self._active.move_to_end(client)
+                skipped += 1
+                continue
+
+            cost = min(state.avg_service_time, quantum * 10)
+            if state.deficit >= cost:
+                state.deficit -= cost
+                if len(state.waiters) == 1:
+                    state.deficit = 0.0
+                    del self._active[client]
+                return client
+            state.deficit += quantum
+            self._active.move_to_end(client)
+            skipped = 0
+        return None
+
+    @asynccontextmanager
+    async def slot(self, deadline: Optional[Deadline] = None, client: str = ANONYMOUS) -> AsyncIterator[None]:
+        """在准入名额内执行"""
+        await self.acquire(deadline, client)
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start_time, client)
@@ -0,0 +1,190 @@
+"""
+响应正文的字符集识别与解码
+
+上游未在Content-Type中声明字符集时，对整个正文做字符集检测会在事件循环线程里
+消耗大量CPU，页面越大越明显。这里按开销从低到高依次确定编码，命中即停止:
+
+1. Content-Type中的charset参数
+2. 正文开头的BOM
+3. JSON类型按RFC 8259固定为UTF-8
+4. HTML/XML正文前 ``META_SCAN_SIZE`` 字节中的 ``<meta charset>``、
+   ``<meta http-equiv="Content-Type">`` 或XML声明中的encoding
+5. 同一主机此前检测出的编码
+6. 只对正文前 ``sample_size`` 字节检测: 先按UTF-8校验，不是UTF-8时使用已安装的
+   charset_normalizer或chardet，都未安装时按cp1252(浏览器对未声明编码的默认值)
+
+第6步的结果按主机缓存，同一站点后续的页面不再检测。解码时无法识别的字节替换为
+U+FFFD，不会因为上游声明错误的字符集而导致整个请求失败。
+"""
+
+import codecs
+import re
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from .metrics import MetricsRegistry
+
+
+# HTML规范的编码预扫描只检查前1024字节
+META_SCAN_SIZE = 1024
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+_META_CHARSET = re.compile(
+    rb"""<meta[^>]+?charset\s*=\s*["']?\s*([a-zA-Z0-9_:.+-]+)""",
+    re.IGNORECASE,
+)
+_XML_ENCODING = re.compile(
+    rb"""^\s*<\?xml[^>]+?encoding\s*=\s*["']([a-zA-Z0-9_:.+-]+)""",
+)
+
+_detector: Optional[Callable[[bytes], Optional[str]]] = None
+
+
+def _load_detector() -> Callable[[bytes], Optional[str]]:
+    """首次需要检测时才导入检测库，两者都未安装时检测总是返回None"""
+    try:
+        from charset_normalizer import from_bytes
+    except ImportError:  # pragma: no cover - 可选依赖
+        pass
+    else:
+        def detect(sample: bytes) -> Optional[str]:
+            best = from_bytes(sample).best()
+            return best.encoding if best is not None else None
+        return detect
+
+    try:
+        import chardet
+    except ImportError:  # pragma: no cover - 可选依赖
+        return lambda sample: None
+    return lambda sample: chardet.detect(sample)["encoding"]
+
+
+def detect(sample: bytes) -> Optional[str]:
+    """用已安装的检测库识别样本的编码，无法识别时返回None"""
+    global _detector
+    if _detector is None:
+        _detector = _load_detector()
+    return _detector(sample)
+
+
+def normalize(name: Optional[str]) -> Optional[str]:
+    """返回Python编解码器的规范名称，未知的编码返回None"""
+    if not name:
+        return None
+    try:
+        return codecs.lookup(name.strip().strip("\"'")).name
+    except LookupError:
+        return None
+
+
+def sniff_bom(body: bytes) -> Optional[str]:
+    for bom, encoding in _BOMS:
+        if body.startswith(bom):
+            return encoding
+    return None
+
+
+def sniff_markup(body: bytes) -> Optional[str]:
+    """从HTML的meta标签或XML声明中读取编码"""
+    head = body[:META_SCAN_SIZE]
+    match = _XML_ENCODING.match(head) or _META_CHARSET.search(head)
+    if match is None:
+        return None
+    encoding = normalize(match.group(1).decode("ascii"))
+    # 能读到ASCII的meta标签说明正文不是UTF-16，HTML规范要求此时按UTF-8处理
+    if encoding is not None and encoding.startswith("utf-16"):
+        return "utf-8"
+    return encoding
+
+
+def is_utf8(sample: bytes, truncated: bool) -> bool:
+    """样本是否为合法的UTF-8，样本是截断的前缀时允许末尾的不完整字符"""
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=not truncated)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def _is_json(mimetype: str) -> bool:
+    return mimetype == "application/json" or mimetype.endswith("+json")
+
+
+def _is_markup(mimetype: str) -> bool:
+    # 缺少Content-Type时aiohttp报告为application/octet-stream
+    return mimetype in ("", "application/octet-stream") or "html" in mimetype or mimetype.endswith("xml")
+
+
+class CharsetResolver:
+    """确定正文编码并解码，检测结果按主机缓存"""
+
+    def __init__(
+        self,
+        sample_size: int = 64 * 1024,
+        max_hosts: int = 1024,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
+        self.sample_size = sample_size
+        self.max_hosts = max_hosts
+        # 主机 -> 检测出的编码，按最近使用排序
+        self._hosts: "OrderedDict[str, str]" = OrderedDict()
+
+        metrics = metrics or MetricsRegistry()
+        self._resolved = metrics.counter("charset_resolved_total", "按来源统计的正文编码识别次数")
+        metrics.gauge("charset_cached_hosts", "缓存了检测结果的主机数", lambda: len(self._hosts))
+
+    def resolve(self, body: bytes, mimetype: str = "", charset: Optional[str] = None, host: str = "") -> Tuple[str, str]:
+        """返回(编码, 来源)，来源为header/bom/json/meta/host/detected/default之一"""
+        encoding = normalize(charset)
+        if encoding is not None:
+            return encoding, "header"
+        encoding = sniff_bom(body)
+        if encoding is not None:
+            return encoding, "bom"
+        mimetype = (mimetype or "").lower()
+        if _is_json(mimetype):
+            return "utf-8", "json"
+        if _is_markup(mimetype):
+            encoding = sniff_markup(body)
+            if encoding is not None:
+                return encoding, "meta"
+
+        encoding = self._hosts.get(host) if host else None
+        if encoding is not None:
+            self._hosts.move_to_end(host)
+            return encoding, "host"
+
+        sample = body[:self.sample_size]
+        if sample.isascii():
+            # 纯ASCII的样本无法区分编码，不缓存
+            return "utf-8", "default"
+        if is_utf8(sample, truncated=len(body) > len(sample)):
+            encoding = "utf-8"
+        else:
+            encoding = normalize(detect(sample)) or "cp1252"
+        if host:
+            self._hosts[host] = encoding
+            if len(self._hosts) > self.max_hosts:
+                self._hosts.popitem(last=False)
+        return encoding, "detected"
+
+    def incremental_decoder(
+        self, sample: bytes, mimetype: str = "", charset: Optional[str] = None, host: str = ""
+    ) -> codecs.IncrementalDecoder:
+        """按正文开头的样本确定编码，返回逐块解码的解码器，用于不缓冲完整正文的场景"""
+        encoding, source = self.resolve(sample, mimetype, charset, host)
+        self._resolved.inc(source=source)
+        return codecs.getincrementaldecoder(encoding)(errors="replace")
+
+    def decode(self, body: bytes, mimetype: str = "", charset: Optional[str] = None, host: str = "") -> str:
+        """解码正文，无法解码的字节替换为U+FFFD"""
+        encoding, source = self.resolve(body, mimetype, charset, host)
+        self._resolved.inc(source=source)
+        return body.decode(encoding, errors="replace")
@@ -0,0 +1,115 @@
+"""
+客户端身份与流量配额
+
+工具调用按客户端区分: 携带配置过的API密钥(``X-API-Key`` 或 ``Authorization: Bearer``)时
+以密钥的摘要作为身份，否则使用客户端IP。未配置的密钥不作为身份，否则客户端每次换一个
+随机密钥就能得到新的公平队列和配额。客户端IP按 ``ErrorHandler.get_client_ip`` 取得，
+``X-Forwarded-For`` 和 ``X-Real-IP`` 原样采信，服务器应部署在会改写这两个头部的代理之后。
+身份通过 ``current_client`` 传递给准入队列(按客户端公平调度)、速率限制和上游请求(统计拉取的字节数)。
+
+``ClientQuota`` 限制每个客户端在固定时间窗口内拉取的上游字节数，超出后该客户端的
+工具调用被拒绝，直到窗口结束。
+"""
+
+import contextvars
+import hashlib
+import time
+from typing import AbstractSet, Dict, List, Optional
+
+from .admission import ANONYMOUS, Overloaded
+from .metrics import MetricsRegistry
+
+
+class ClientContext:
+    """单次调用的客户端信息"""
+
+    def __init__(self, client_id: str = ANONYMOUS):
+        self.id = client_id
+        # 本次调用从上游拉取的字节数，由FetchMCPServer累加
+        self.bytes_fetched = 0
+
+
+# 当前调用的客户端，由传输层在分发前设置
+current_client: contextvars.ContextVar[Optional[ClientContext]] = contextvars.ContextVar(
+    "current_client", default=None
+)
+
+
+def key_digest(api_key: str) -> str:
+    """API密钥的摘要，配置和比较都只使用摘要"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+def client_identity(headers, client_ip: Optional[str], known_keys: AbstractSet[str] = frozenset()) -> str:
+    """根据请求头和客户端IP确定客户端身份，只有known_keys中的密钥(摘要)作为身份"""
+    api_key = headers.get("x-api-key")
+    if not api_key:
+        authorization = headers.get("authorization") or ""
+        if authorization[:7].lower() == "bearer ":
+            api_key = authorization[7:].strip()
+    if api_key:
+        digest = key_digest(api_key)
+        if digest in known_keys:
+            return "key:" + digest[:16]
+    return "ip:" + (client_ip or "unknown")
+
+
+class ClientQuota:
+    """按客户端统计固定时间窗口内拉取的上游字节数"""
+
+    def __init__(
+        self,
+        max_bytes: int = 0,
+        window: float = 60.0,
+        max_clients: int = 4096,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
+        # max_bytes为0时不限制，只统计
+        self.max_bytes = max_bytes
+        self.window = window
+        self.max_clients = max_clients
+        # 客户端 -> [窗口开始时间, 已用字节数]
+        self._usage: Dict[str, List[float]] = {}
+
+        metrics = metrics or MetricsRegistry()
+        self._fetched = metrics.counter("client_bytes_fetched_total", "为客户端拉取的上游字节数")
+        self._rejected = metrics.counter("client_quota_rejected_total", "因超出字节配额被拒绝的工具调用数")
+        metrics.gauge("client_quota_tracked", "正在统计字节配额的客户端数", lambda: len(self._usage))
+
+    def _window(self, client_id: str, now: float) -> List[float]:
+        usage = self._usage.get(client_id)
+        if usage is None or now - usage[0] >= self.window:
+            if usage is None and len(self._usage) >= self.max_clients:
+                self._prune(now)
+            usage = self._usage[client_id] = [now, 0.0]
+        return usage
+
+    def _prune(self, now: float):
+        """删除窗口已结束的客户端"""
+        for client_id in [c for c, usage in self._usage.items() if now - usage[0] >= self.window]:
+            del self._usage[client_id]
+
+    def check(self, client_id: str):
+        """客户端在当前窗口内已超出字节配额时抛出Overloaded"""
+        if not self.max_bytes:
+            return
+        now = time.monotonic()
+        usage = self._window(client_id, now)
+        if usage[1] >= self.max_bytes:
+            self._rejected.inc()
+            retry_after = max(1, int(usage[0] + self.window - now + 0.999))
+            raise Overloaded(f"客户端超出字节配额 ({self.max_bytes}字节/{self.window:g}秒)", retry_after)
+
+    def record(self, client_id: str, size: int):
+        """累加客户端拉取的字节数"""
+        if size <= 0:
+            return
+        self._fetched.inc(size)
+        if self.max_bytes:
+            self._window(client_id, time.monotonic())[1] += size
+
+    def usage(self, client_id: str) -> float:
+        usage = self._usage.get(client_id)
+        if usage is None or time.monotonic() - usage[0] >= self.window:
+            return 0.0
+        return usage[1]
@@ -0,0 +1,37 @@
+"""
+JSON编解码
+
+安装orjson时使用orjson，否则使用标准库json。输出为紧凑的UTF-8字节，
+不含换行，HTTP响应和stdio逐行消息共用。
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 可选依赖
+    orjson = None
+
+
+def loads(data: bytes) -> Any:
+    """解码JSON，格式错误时抛出ValueError"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(payload: Any) -> bytes:
+    """编码为紧凑的JSON字节"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(payload)
+        except TypeError:
+            # 超出64位的整数等orjson不支持的值交给json处理
+            pass
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def valid_id(value: Any) -> bool:
+    """JSON-RPC请求id只接受字符串或整数，其他值无法用于匹配取消通知"""
+    return isinstance(value, (str, int)) and not isinstance(value, bool)
@@ -0,0 +1,82 @@
+"""
+按内容寻址的正文存储
+
+镜像站点、未变化的文档和重定向到同一页面的URL经常返回完全相同的正文。``fetch`` 指定
+``body_ref`` 时，解码后的正文按内容摘要保存在 ``ContentStore`` 中，并记录已经把它发给
+了哪些客户端: 同一客户端再次拿到相同的正文时，结果中只返回摘要(``body_ref``)，
+客户端需要时通过 ``get_content`` 工具取回正文。
+
+摘要在安装xxhash时使用XXH3-128，否则使用标准库的BLAKE2b，带算法前缀，两者不会混淆。
+存储按字节数上限以LRU淘汰，正文被淘汰后会重新完整发送。
+"""
+
+import hashlib
+import sys
+from collections import OrderedDict
+from typing import Optional, Set, Tuple
+
+from .metrics import MetricsRegistry
+
+try:
+    import xxhash
+except ImportError:  # pragma: no cover - 可选依赖
+    xxhash = None
+
+
+def content_digest(content: str) -> str:
+    """正文的内容摘要"""
+    data = content.encode("utf-8", "surrogatepass")
+    if xxhash is not None:
+        return "xxh128:" + xxhash.xxh3_128_hexdigest(data)
+    return "blake2b:" + hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class ContentStore:
+    """摘要 -> 正文的LRU存储，记录每份正文已发送给哪些客户端"""
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
+        # max_bytes为0时不存储，body_ref请求总是返回完整正文
+        self.max_bytes = max_bytes
+        self.size = 0
+        # 摘要 -> (正文, 占用字节数, 已收到该正文的客户端)
+        self._entries: "OrderedDict[str, Tuple[str, int, Set[str]]]" = OrderedDict()
+
+        metrics = metrics or MetricsRegistry()
+        metrics.gauge("content_store_bytes", "内容存储占用的内存", lambda: self.size)
+        metrics.gauge("content_store_entries", "内容存储中的正文数", lambda: len(self._entries))
+        self._refs = metrics.counter("content_store_refs_total", "以摘要代替正文返回的次数")
+        self._saved = metrics.counter("content_store_saved_chars_total", "以摘要代替正文少返回的字符数")
+
+    def add(self, digest: str, content: str, client_id: str, sent: bool = True) -> bool:
+        """保存正文，sent为True时记录客户端已收到，返回该客户端此前是否已经收到过"""
+        entry = self._entries.get(digest)
+        if entry is not None:
+            self._entries.move_to_end(digest)
+            if client_id in entry[2]:
+                self._refs.inc()
+                self._saved.inc(len(content))
+                return True
+            if sent:
+                entry[2].add(client_id)
+            return False
+
+        size = sys.getsizeof(content)
+        if size > self.max_bytes:
+            return False
+        self._entries[digest] = (content, size, {client_id} if sent else set())
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, evicted, _) = self._entries.popitem(last=False)
+            self.size -= evicted
+        return False
+
+    def get(self, digest: str) -> Optional[str]:
+        entry = self._entries.get(digest)
+        if entry is None:
+            return None
+        self._entries.move_to_end(digest)
+        return entry[0]
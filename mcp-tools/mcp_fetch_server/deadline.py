@@ -0,0 +1,71 @@
+"""
+请求截止时间
+
+客户端可以通过 ``X-MCP-Timeout`` 头部或JSON-RPC消息的 ``params._meta.timeout``
+声明本次调用的剩余时间预算(秒)。传输层据此创建 :class:`Deadline` 并放入
+上下文，排队、上游请求等环节都从中扣减，超时后立即放弃剩余工作。
+"""
+
+import contextvars
+import math
+import time
+from typing import Any, Optional
+
+
+# 当前MCP请求的截止时间，由传输层设置
+current_deadline: contextvars.ContextVar[Optional["Deadline"]] = contextvars.ContextVar(
+    "current_deadline", default=None
+)
+
+
+class DeadlineExceeded(TimeoutError):
+    """请求截止时间已过"""
+
+
+class Deadline:
+    """基于单调时钟的截止时间"""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+
+    @classmethod
+    def from_request(cls, header: Optional[str] = None, message: Any = None) -> Optional["Deadline"]:
+        """从请求头或消息的_meta中解析截止时间，头部优先"""
+        value: Any = header
+        if value is None and isinstance(message, dict):
+            params = message.get("params")
+            if isinstance(params, dict) and isinstance(params.get("_meta"), dict):
+                value = params["_meta"].get("timeout")
+        if value is None:
+            return None
+
+        try:
+            timeout = float(value)
+        except (TypeError, ValueError):
+            return None
+        # nan会让截止时间立即过期，inf则永不过期，都视为未声明
+        if not math.isfinite(timeout) or timeout <= 0:
+            return None
+        return cls(timeout)
+
+    def remaining(self) -> float:
+        """剩余时间(秒)，已过期时为0"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self):
+        """已过期时抛出DeadlineExceeded"""
+        if self.expired:
+            raise DeadlineExceeded(f"请求已超过截止时间 ({self.timeout}秒)")
+
+    def clamp(self, timeout: Optional[float]) -> float:
+        """将超时时间限制在剩余时间之内"""
+        self.check()
+        remaining = self.remaining()
+        if timeout is None:
+            return remaining
+        return min(timeout, remaining)
@@ -0,0 +1,156 @@
+"""
+fetch_diff的快照与差异计算
+
+``fetch_diff`` 为每个客户端的每个请求保存一份上次内容的快照，再次调用时只返回变化:
+
+- 快照带有ETag或Last-Modified时发送条件请求，上游返回304即视为未变化
+- 内容摘要与快照相同时视为未变化，不计算差异
+- 文本内容返回unified diff，JSON内容返回JSON Patch(RFC 6902)
+
+快照按字节数上限以LRU淘汰。超过 ``OFFLOAD_SIZE`` 个字符的内容在线程池中计算差异，
+避免大正文的diff阻塞事件循环。
+"""
+
+import asyncio
+import difflib
+import json
+import sys
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from .metrics import MetricsRegistry
+
+
+# 超过该字符数的内容在线程池中计算差异
+OFFLOAD_SIZE = 64 * 1024
+
+
+def _escape(key: str) -> str:
+    """JSON Pointer的路径片段转义"""
+    return key.replace("~", "~0").replace("/", "~1")
+
+
+def _same(old: Any, new: Any) -> bool:
+    """按JSON类型逐层比较: 1、1.0和True在Python中相等，但在JSON中是不同的值"""
+    if type(old) is not type(new):
+        return False
+    if isinstance(old, dict):
+        return old.keys() == new.keys() and all(_same(value, new[key]) for key, value in old.items())
+    if isinstance(old, list):
+        return len(old) == len(new) and all(_same(a, b) for a, b in zip(old, new))
+    return old == new
+
+
+def json_patch(old: Any, new: Any, path: str = "") -> List[Dict[str, Any]]:
+    """生成把old变成new的JSON Patch操作"""
+    # 先用==快速排除不同的值，相等时再逐层核对类型，未变化的子树只遍历一次
+    if old == new and _same(old, new):
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = [{"op": "remove", "path": f"{path}/{_escape(key)}"} for key in old if key not in new]
+        for key, value in new.items():
+            child = f"{path}/{_escape(key)}"
+            if key in old:
+                ops.extend(json_patch(old[key], value, child))
+            else:
+                ops.append({"op": "add", "path": child, "value": value})
+        return ops
+    if isinstance(old, list) and isinstance(new, list):
+        return _list_patch(old, new, path)
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+def _list_patch(old: list, new: list, path: str) -> List[Dict[str, Any]]:
+    """按最长公共子序列对齐数组元素，列表头部插入元素时不会把后面的元素全部替换"""
+    keys_old = [json.dumps(item, sort_keys=True) for item in old]
+    keys_new = [json.dumps(item, sort_keys=True) for item in new]
+    ops: List[Dict[str, Any]] = []
+    matcher = difflib.SequenceMatcher(None, keys_old, keys_new, autojunk=False)
+    # 按顺序应用操作，处理到new[j1]时数组的前j1个元素已与new一致
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        paired = min(i2 - i1, j2 - j1) if tag == "replace" else 0
+        for k in range(paired):
+            ops.extend(json_patch(old[i1 + k], new[j1 + k], f"{path}/{j1 + k}"))
+        for _ in range(i2 - i1 - paired):
+            ops.append({"op": "remove", "path": f"{path}/{j1 + paired}"})
+        for k in range(paired, j2 - j1):
+            ops.append({"op": "add", "path": f"{path}/{j1 + k}", "value": new[j1 + k]})
+    return ops
+
+
+def unified_diff(old: str, new: str, context: int = 3) -> str:
+    lines = difflib.unified_diff(
+        old.splitlines(keepends=True),
+        new.splitlines(keepends=True),
+        fromfile="previous",
+        tofile="current",
+        n=context,
+    )
+    return "".join(line if line.endswith("\n") else line + "\n" for line in lines)
+
+
+async def compute_diff(old: Any, new: Any, fmt: str, size: int, context: int = 3) -> Any:
+    """计算差异，内容较大时在线程池中执行"""
+    if fmt == "json":
+        func, args = json_patch, (old, new)
+    else:
+        func, args = unified_diff, (old, new, context)
+    if size <= OFFLOAD_SIZE:
+        return func(*args)
+    return await asyncio.get_event_loop().run_in_executor(None, func, *args)
+
+
+class Snapshot:
+    """上次内容的快照，JSON内容保存解析后的值"""
+
+    __slots__ = ("format", "value", "digest", "etag", "last_modified", "size")
+
+    def __init__(self, fmt: str, value: Any, digest: str, etag: Optional[str], last_modified: Optional[str], size: int):
+        self.format = fmt
+        self.value = value
+        self.digest = digest
+        self.etag = etag
+        self.last_modified = last_modified
+        self.size = size
+
+
+class SnapshotStore:
+    """按客户端和请求保存快照，超出字节上限时淘汰最久未使用的快照"""
+
+    def __init__(
+        self,
+        max_bytes: int = 32 * 1024 * 1024,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
+        # max_bytes为0时不保存快照，每次调用都返回完整内容
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[str, Snapshot]" = OrderedDict()
+
+        metrics = metrics or MetricsRegistry()
+        metrics.gauge("diff_snapshot_bytes", "fetch_diff快照占用的内存(按内容字符数估算)", lambda: self.size)
+        metrics.gauge("diff_snapshots", "fetch_diff保存的快照数", lambda: len(self._entries))
+        self.results = metrics.counter("diff_results_total", "按结果统计的fetch_diff调用数")
+
+    def get(self, key: str) -> Optional[Snapshot]:
+        snapshot = self._entries.get(key)
+        if snapshot is not None:
+            self._entries.move_to_end(key)
+        return snapshot
+
+    def put(self, key: str, snapshot: Snapshot):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= old.size
+        # 字符串按实际内存计算，解析后的JSON按原文字符数估算
+        if isinstance(snapshot.value, str):
+            snapshot.size = sys.getsizeof(snapshot.value)
+        if snapshot.size > self.max_bytes:
+            return
+        self._entries[key] = snapshot
+        self.size += snapshot.size
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.size
@@ -1,17 +1,26 @@
 import logging
 import sys
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 
 class ErrorHandler:
     """错误处理和日志管理器"""
     
+    # 根日志处理器只安装一次，多个实例共享
+    _logging_configured = False
+    
     def __init__(self):
+        # 构造时不做任何I/O，日志处理器由入口函数调用setup_logging安装
         self.logger = logging.getLogger(__name__)
-        self.setup_logging()
     
     def setup_logging(self, level: str = "INFO"):
         """设置日志配置"""
+        root_logger = logging.getLogger()
+        root_logger.setLevel(getattr(logging, level.upper()))
+        if ErrorHandler._logging_configured:
+            return
+        ErrorHandler._logging_configured = True
+        
         # 创建日志格式化器
         formatter = logging.Formatter(
             '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -22,13 +31,11 @@ class ErrorHandler:
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setFormatter(formatter)
         
-        # 文件处理器
-        file_handler = logging.FileHandler('mcp-fetch-server.log')
+        # 文件处理器，首次写日志时才打开文件
+        file_handler = logging.FileHandler('mcp-fetch-server.log', delay=True)
         file_handler.setFormatter(formatter)
         
         # 配置根日志记录器
-        root_logger = logging.getLogger()
-        root_logger.setLevel(getattr(logging, level.upper()))
         root_logger.addHandler(console_handler)
         root_logger.addHandler(file_handler)
         
@@ -38,11 +45,24 @@ class ErrorHandler:
         
         self.logger = logging.getLogger(__name__)
     
-    def log_request(self, method: str, url: str, status: int, duration: float):
+    def log_request(
+        self,
+        method: str,
+        url: str,
+        client_ip: str = "unknown",
+        user_agent: str = "",
+        status: Optional[int] = None,
+        duration: Optional[float] = None
+    ):
         """记录HTTP请求日志"""
-        self.logger.info(
-            f"HTTP {method} {url} - Status: {status} - Duration: {duration:.3f}s"
-        )
+        request_msg = f"HTTP {method} {url} - Client: {client_ip}"
+        if user_agent:
+            request_msg += f" - User-Agent: {user_agent}"
+        if status is not None:
+            request_msg += f" - Status: {status}"
+        if duration is not None:
+            request_msg += f" - Duration: {duration:.3f}s"
+        self.logger.info(request_msg)
     
     def log_error(self, error_type: str, message: str, context: Dict[str, Any] = None):
         """记录错误日志"""
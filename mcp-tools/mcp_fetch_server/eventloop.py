@@ -0,0 +1,73 @@
+"""
+事件循环与HTTP解析器选择
+
+``--loop`` 在asyncio和uvloop之间选择，``--http`` 在h11和httptools之间选择。
+auto表示可用时使用更快的实现；显式指定的库未安装时记录警告并回退，
+不会因为缺少可选依赖而无法启动。
+"""
+
+import asyncio
+import importlib.util
+import logging
+import sys
+from typing import Any, Coroutine, Optional, TypeVar
+
+
+logger = logging.getLogger(__name__)
+
+LOOP_CHOICES = ("auto", "asyncio", "uvloop")
+HTTP_CHOICES = ("auto", "h11", "httptools")
+
+T = TypeVar("T")
+
+
+def _available(module: str) -> bool:
+    """检查模块是否可导入，不实际导入"""
+    return importlib.util.find_spec(module) is not None
+
+
+def resolve_loop(name: str = "auto") -> str:
+    """解析事件循环实现，返回asyncio或uvloop"""
+    if name not in LOOP_CHOICES:
+        raise ValueError(f"未知的事件循环实现: {name}")
+    if name == "asyncio":
+        return "asyncio"
+    # uvloop不支持Windows
+    if sys.platform != "win32" and _available("uvloop"):
+        return "uvloop"
+    if name == "uvloop":
+        logger.warning("uvloop不可用，回退到asyncio事件循环")
+    return "asyncio"
+
+
+def resolve_http(name: str = "auto") -> str:
+    """解析HTTP解析器实现，返回h11或httptools"""
+    if name not in HTTP_CHOICES:
+        raise ValueError(f"未知的HTTP解析器实现: {name}")
+    if name == "h11":
+        return "h11"
+    if _available("httptools"):
+        return "httptools"
+    if name == "httptools":
+        logger.warning("httptools不可用，回退到h11解析器")
+    return "h11"
+
+
+def run(main: Coroutine[Any, Any, T], loop: Optional[str] = "auto") -> T:
+    """在选定的事件循环上运行协程，替代asyncio.run"""
+    if resolve_loop(loop or "auto") != "uvloop":
+        return asyncio.run(main)
+
+    import uvloop
+
+    if sys.version_info >= (3, 11):
+        with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+            return runner.run(main)
+    uvloop.install()
+    return asyncio.run(main)
+
+
+def describe_loop() -> str:
+    """当前运行中事件循环的实现名称"""
+    loop_type = type(asyncio.get_event_loop())
+    return "uvloop" if loop_type.__module__.startswith("uvloop") else "asyncio"
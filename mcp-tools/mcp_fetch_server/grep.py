@@ -0,0 +1,208 @@
+"""
+fetch_grep的流式搜索
+
+``fetch_grep`` 不缓冲完整正文: 上游正文逐块读取、逐块解码后送入 ``StreamSearcher``，
+只保留未结束的当前行、前文的 ``context`` 行和结果，内存占用与页面大小无关:
+
+- 按行匹配，跨块的行在匹配前拼接完整，因此跨块边界的匹配不会遗漏
+- 超过 ``MAX_LINE`` 个字符的行(压缩过的HTML、JS等)按窗口扫描，相邻窗口重叠 ``OVERLAP``
+  个字符，跨窗口且不超过该长度的匹配同样能找到；长行中的每个匹配单独返回，``text`` 为匹配附近的片段
+- 找到 ``max_matches`` 个匹配并收集完最后一个匹配的后文后停止读取上游
+
+``offset`` 和 ``column`` 是解码后文本中的字符偏移。
+"""
+
+import codecs
+import re
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional
+
+
+# 超过该字符数的行按窗口扫描
+MAX_LINE = 8192
+# 长行相邻窗口的重叠字符数，也是长行中跨窗口匹配的最大长度
+OVERLAP = 1024
+# 结果中每行最多返回的字符数
+DISPLAY = 500
+# 截断行时匹配位置之前保留的字符数
+SNIPPET = 200
+
+
+def compile_pattern(pattern: str, regex: bool = False, ignore_case: bool = False) -> "re.Pattern[str]":
+    """编译匹配模式，字面量按原样匹配，正则表达式无效时抛出ValueError"""
+    if not pattern:
+        raise ValueError("pattern不能为空")
+    flags = re.IGNORECASE if ignore_case else 0
+    try:
+        compiled = re.compile(pattern if regex else re.escape(pattern), flags)
+    except re.error as e:
+        raise ValueError(f"无效的正则表达式: {e}")
+    if compiled.match(""):
+        # 能匹配空串的模式会匹配每一行
+        raise ValueError("pattern不能匹配空字符串")
+    return compiled
+
+
+def _clip(text: str, column: int = 0) -> str:
+    """截取行中匹配位置附近的至多DISPLAY个字符"""
+    if len(text) <= DISPLAY:
+        return text
+    start = max(0, min(column - SNIPPET, len(text) - DISPLAY))
+    return text[start:start + DISPLAY]
+
+
+class StreamSearcher:
+    """逐段接收解码后的文本，按行查找匹配"""
+
+    def __init__(self, pattern: "re.Pattern[str]", context: int = 2, max_matches: int = 20):
+        self.pattern = pattern
+        self.context = context
+        self.max_matches = max_matches
+        self.matches: List[Dict[str, Any]] = []
+        # 找到足够的匹配后不再需要更多文本；complete表示扫描到了正文末尾
+        self.done = False
+        self.complete = False
+        self.chars = 0
+        # 未结束的当前行及其开头在全文中的偏移
+        self._buf = ""
+        self._buf_offset = 0
+        # 当前行是长行时，已扫描到的位置(相对_buf)和行首的片段
+        self._scanned = 0
+        self._long_head: Optional[str] = None
+        self._line = 1
+        self._line_start = 0
+        self._before: Deque[str] = deque(maxlen=context)
+        # 还在收集后文的匹配
+        self._waiting: List[Dict[str, Any]] = []
+
+    def feed(self, text: str) -> bool:
+        """送入一段文本，返回是否已经可以停止"""
+        if self.done or not text:
+            return self.done
+        self.chars += len(text)
+        buf = self._buf + text
+        start = 0
+        while not self.done:
+            end = buf.find("\n", start)
+            if end < 0:
+                break
+            self._end_line(buf[start:end], self._buf_offset + start)
+            start = end + 1
+        self._buf = buf[start:]
+        self._buf_offset += start
+        if not self.done and len(self._buf) > MAX_LINE:
+            self._scan_window()
+        return self.done
+
+    def finish(self):
+        """正文结束，处理没有换行符结尾的最后一行"""
+        if not self.done and self._buf:
+            self._end_line(self._buf, self._buf_offset)
+            self._buf = ""
+        self.done = self.complete = True
+
+    @property
+    def _full(self) -> bool:
+        return len(self.matches) >= self.max_matches
+
+    def _end_line(self, line: str, offset: int):
+        next_start = offset + len(line) + 1
+        if line.endswith("\r"):
+            line = line[:-1]
+        shown = self._long_head if self._long_head is not None else _clip(line)
+        self._add_context(shown)
+        if not self._full:
+            if self._long_head is not None or len(line) > MAX_LINE:
+                self._scan_long(line, offset, len(line))
+            else:
+                match = self.pattern.search(line)
+                if match is not None:
+                    self._add_match(match, offset, _clip(line, match.start()))
+        self._before.append(shown)
+        self._line += 1
+        self._line_start = next_start
+        self._scanned = 0
+        self._long_head = None
+
+    def _scan_window(self):
+        """扫描长行中已收到的部分，保留末尾OVERLAP个字符与后续文本一起扫描"""
+        if self._long_head is None:
+            self._long_head = _clip(self._buf)
+        limit = len(self._buf) - OVERLAP
+        self._scan_long(self._buf, self._buf_offset, limit)
+        # 丢弃已扫描的部分，保留扫描点之前的OVERLAP个字符作为后续匹配的前文
+        drop = max(0, min(self._scanned, limit) - OVERLAP)
+        self._buf = self._buf[drop:]
+        self._buf_offset += drop
+        self._scanned -= drop
+
+    def _scan_long(self, text: str, offset: int, limit: int):
+        """在text中查找起点在[_scanned, limit)之间的匹配，每个匹配单独返回"""
+        resume = limit
+        for match in self.pattern.finditer(text, self._scanned):
+            if match.start() >= limit or self._full:
+                break
+            start = max(0, match.start() - SNIPPET)
+            self._add_match(match, offset, text[start:start + DISPLAY])
+            # 跨过扫描终点的匹配不在下一个窗口中重复报告
+            resume = max(resume, match.end())
+        self._scanned = max(self._scanned, resume)
+
+    def _add_match(self, match: "re.Match[str]", offset: int, text: str):
+        position = offset + match.start()
+        entry = {
+            "line": self._line,
+            "column": position - self._line_start,
+            "offset": position,
+            "match": match.group(0)[:DISPLAY],
+            "text": text,
+        }
+        if self.context:
+            entry["before"] = list(self._before)
+            entry["after"] = []
+            self._waiting.append(entry)
+        self.matches.append(entry)
+        self._check_done()
+
+    def _add_context(self, text: str):
+        """当前行作为等待中的匹配的后文，长行中已找到的匹配不以本行作为后文"""
+        for entry in self._waiting:
+            if entry["line"] != self._line:
+                entry["after"].append(text)
+        self._waiting = [entry for entry in self._waiting if len(entry["after"]) < self.context]
+        self._check_done()
+
+    def _check_done(self):
+        if self._full and not self._waiting:
+            self.done = True
+
+
+async def search_chunks(
+    chunks: AsyncIterator[bytes],
+    searcher: StreamSearcher,
+    make_decoder: Callable[[bytes], "codecs.IncrementalDecoder"],
+    sample_size: int,
+) -> int:
+    """逐块解码并搜索，编码由前sample_size字节确定，返回读取的字节数"""
+    size = 0
+    sample: List[bytes] = []
+    decoder = None
+    async for chunk in chunks:
+        size += len(chunk)
+        if decoder is None:
+            sample.append(chunk)
+            # 样本超过sample_size时编码检测才知道样本是截断的前缀
+            if size <= sample_size:
+                continue
+            chunk = b"".join(sample)
+            sample = []
+            decoder = make_decoder(chunk)
+        if searcher.feed(decoder.decode(chunk)):
+            return size
+    if decoder is None:
+        head = b"".join(sample)
+        decoder = make_decoder(head)
+        searcher.feed(decoder.decode(head))
+    searcher.feed(decoder.decode(b"", final=True))
+    searcher.finish()
+    return size
@@ -0,0 +1,189 @@
+"""
+存活与就绪检查
+
+健康检查由后台任务每 ``interval`` 秒采集一次负载信号并预先编码成响应，探针请求
+只需写出缓存的字节，不经过FastAPI路由、准入队列和进行中请求统计，实例繁忙时
+也不会排在真实请求后面。
+
+- ``/health/live``: 存活检查，刷新任务停止工作时返回503
+- ``/health/ready``: 就绪检查，排空期间或持续饱和 ``window`` 秒后返回503，
+  饱和解除持续同样时间后恢复，避免在阈值附近来回摘除实例
+- ``/health``: 兼容原有的健康检查，只在排空期间返回503，附带全部负载信号
+
+任一条件成立即视为饱和: 执行名额用尽且有请求在准入队列中排队、事件循环延迟超过
+``max_loop_lag``、上游连接池用尽、有调用在等待内存预算、常驻内存超过 ``memory_limit``。
+"""
+
+import asyncio
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .codec import dumps
+from .metrics import MetricsRegistry
+
+
+def rss_bytes() -> Optional[int]:
+    """当前进程的常驻内存(字节)，无法获取时返回None"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # 没有/proc时退化为峰值内存，macOS以字节为单位，其他平台以KB为单位
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class HealthMonitor:
+    """后台刷新的健康检查快照"""
+
+    def __init__(
+        self,
+        collect: Callable[[], Dict[str, Any]],
+        interval: float = 1.0,
+        window: float = 10.0,
+        max_loop_lag: float = 0.5,
+        memory_limit: int = 0,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
+        # collect返回传输层的负载信号，键名见saturation_reasons
+        self.collect = collect
+        self.interval = interval
+        self.window = window
+        self.max_loop_lag = max_loop_lag
+        self.memory_limit = memory_limit
+        self.ready = True
+        self.reasons: List[str] = []
+        self.snapshot: Dict[str, Any] = {}
+        # 预先编码的响应: 路径后缀 -> (状态码, 响应体)
+        self.responses: Dict[str, tuple] = {}
+        self._saturated_since: Optional[float] = None
+        self._clear_since: Optional[float] = None
+        self._refreshed_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+        metrics = metrics or MetricsRegistry()
+        metrics.gauge("ready", "实例是否就绪(1为就绪)", lambda: 1.0 if self.ready else 0.0)
+        metrics.gauge("memory_rss_bytes", "进程常驻内存", lambda: self.snapshot.get("memory_rss_bytes") or 0)
+
+    def start(self):
+        """在事件循环中启动后台刷新"""
+        if self._task is None or self._task.done():
+            self.refresh()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.refresh()
+
+    def saturation_reasons(self, load: Dict[str, Any]) -> List[str]:
+        """判断当前负载是否饱和，返回饱和原因"""
+        reasons = []
+        if load["in_flight"] >= load["max_in_flight"] and load["queue_depth"] > 0:
+            reasons.append("admission")
+        if load["event_loop"]["lag_ms"] > self.max_loop_lag * 1000:
+            reasons.append("event_loop_lag")
+        pool = load["upstream_pool"]
+        if pool["limit"] and pool["in_use"] >= pool["limit"]:
+            reasons.append("upstream_pool")
+        if load.get("memory_budget", {}).get("waiting"):
+            reasons.append("memory_budget")
+        if self.memory_limit and (load["memory_rss_bytes"] or 0) >= self.memory_limit:
+            reasons.append("memory")
+        return reasons
+
+    def refresh(self):
+        """采集负载信号、更新就绪状态并重新编码响应"""
+        now = time.monotonic()
+        load = self.collect()
+        load["memory_rss_bytes"] = rss_bytes()
+        reasons = self.saturation_reasons(load)
+
+        # 饱和或恢复都要持续window秒才改变就绪状态
+        if reasons:
+            self._clear_since = None
+            if self._saturated_since is None:
+                self._saturated_since = now
+            if now - self._saturated_since >= self.window:
+                self.ready = False
+        else:
+            self._saturated_since = None
+            if self._clear_since is None:
+                self._clear_since = now
+            if now - self._clear_since >= self.window:
+                self.ready = True
+        self.reasons = reasons
+
+        draining = load.pop("draining")
+        self.snapshot = load
+        self._refreshed_at = now
+
+        if draining:
+            ready_status = "draining"
+        else:
+            ready_status = "ready" if self.ready else "not_ready"
+        self.responses = {
+            "": (503 if draining else 200, dumps({
+                "status": "draining" if draining else "healthy",
+                **load,
+                "timestamp": now,
+            })),
+            "/ready": (200 if ready_status == "ready" else 503, dumps({
+                "status": ready_status,
+                "saturated": reasons,
+                **load,
+                "timestamp": now,
+            })),
+            "/live": (200, dumps({"status": "alive", "timestamp": now})),
+        }
+
+    def response(self, suffix: str) -> tuple:
+        """返回缓存的响应，刷新任务长时间未运行时存活检查失败"""
+        if not self.responses:
+            self.refresh()
+        if suffix == "/live" and self._task is not None and time.monotonic() - self._refreshed_at > self.interval * 10:
+            return 503, dumps({"status": "stale", "age": time.monotonic() - self._refreshed_at})
+        return self.responses[suffix]
+
+
+class HealthEndpoint:
+    """直接写出缓存的健康检查响应的ASGI处理器，其他请求交给内层应用"""
+
+    def __init__(self, app, monitor: HealthMonitor, path: str = "/health"):
+        self.app = app
+        self.monitor = monitor
+        self.paths = {path: "", path + "/live": "/live", path + "/ready": "/ready"}
+
+    async def __call__(self, scope, receive, send):
+        suffix = self.paths.get(scope["path"]) if scope["type"] == "http" else None
+        if suffix is None or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        status, body = self.monitor.response(suffix)
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"cache-control", b"no-store"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else body})
@@ -0,0 +1,240 @@
+"""
+上游主机的自适应并发上限
+
+固定的连接池上限对快的上游利用不足，对脆弱的上游又容易压垮。这里为每个
+上游主机维护一个随观测延迟变化的并发上限，算法参考Netflix concurrency-limits
+的Gradient2:
+
+- 长期RTT是请求耗时的指数移动平均，近似上游在正常负载下的延迟
+- 每个请求结束时计算 ``gradient = tolerance * 长期RTT / 本次RTT`` (限制在0.5-1之间)，
+  延迟平稳时gradient为1，上限按 ``sqrt(limit)`` 的余量缓慢增长；
+  延迟升高说明上游开始排队，上限随之按比例收缩
+- 超时、连接错误以及429/503等过载响应按AIMD的方式乘性减小上限
+- 实际并发远低于上限时(调用方自身没有压力)不调整，避免上限无意义地膨胀
+
+超过上限的请求在本地FIFO排队，排队时间计入上游耗时的queue阶段。
+
+主机数达到 ``max_hosts`` 且没有可淘汰的空闲主机时，新主机共用一个名为 ``other``
+的上限，指标中归入 ``host="other"``。按主机的指标只输出主机表中当前的主机，
+``upstream_congestion_total`` 不按主机区分，指标序列不会随请求中的URL无限增长。
+"""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional
+
+from .metrics import MetricsRegistry
+
+
+# 视为上游过载信号的HTTP状态码
+CONGESTION_STATUSES = frozenset({429, 503})
+
+# 超出max_hosts的主机共用的上限在指标中的名称
+OVERFLOW_HOST = "other"
+
+
+class AdaptiveLimit:
+    """单个上游主机的自适应并发上限"""
+
+    def __init__(
+        self,
+        initial_limit: int = 10,
+        min_limit: int = 1,
+        max_limit: int = 100,
+        tolerance: float = 1.5,
+        smoothing: float = 0.2,
+        backoff: float = 0.9,
+        long_window: int = 100,
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.backoff = backoff
+        self._long_decay = 2.0 / (long_window + 1)
+        self.long_rtt: Optional[float] = None
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def idle(self) -> bool:
+        return self.in_flight == 0 and not self._waiters
+
+    async def acquire(self, timeout: Optional[float] = None) -> int:
+        """获取名额，返回获取时的并发数；排队超过timeout时抛出asyncio.TimeoutError"""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return self.in_flight
+
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except BaseException:
+            self._discard(waiter)
+            # 名额已移交但等待方已放弃时归还
+            if waiter.done() and not waiter.cancelled():
+                self._release_slot()
+            raise
+        return self.in_flight
+
+    def release(self, rtt: Optional[float], in_flight: int, congested: bool = False):
+        """归还名额并根据本次请求的结果调整上限，rtt为None时只归还不调整"""
+        if congested:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+        elif rtt is not None and rtt > 0:
+            self._on_sample(rtt, in_flight)
+        self._release_slot()
+
+    def _on_sample(self, rtt: float, in_flight: int):
+        if self.long_rtt is None:
+            self.long_rtt = rtt
+        else:
+            self.long_rtt += self._long_decay * (rtt - self.long_rtt)
+            # 延迟明显回落后让长期RTT尽快跟上，避免长时间高估上游容量
+            if self.long_rtt / rtt > 2:
+                self.long_rtt *= 0.95
+
+        # 调用方自身并发不足时无法判断上游容量
+        if in_flight < self.limit / 2:
+            return
+
+        gradient = max(0.5, min(1.0, self.tolerance * self.long_rtt / rtt))
+        new_limit = self.limit * gradient + math.sqrt(self.limit)
+        new_limit = self.limit * (1 - self.smoothing) + new_limit * self.smoothing
+        self.limit = max(self.min_limit, min(self.max_limit, new_limit))
+
+    def _release_slot(self):
+        """归还名额，在上限允许时唤醒排队的请求"""
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _discard(self, waiter: asyncio.Future):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+
+class HostLimiter:
+    """按上游主机管理自适应并发上限"""
+
+    def __init__(
+        self,
+        initial_limit: int = 10,
+        max_limit: int = 100,
+        max_hosts: int = 1024,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
+        self.initial_limit = initial_limit
+        self.max_limit = max_limit
+        self.max_hosts = max_hosts
+        self._limits: "OrderedDict[str, AdaptiveLimit]" = OrderedDict()
+        # 主机表已满时新主机共用的上限，及正在使用它的主机的请求数
+        self._overflow: Optional[AdaptiveLimit] = None
+        self._overflow_hosts: Dict[str, int] = {}
+
+        metrics = metrics or MetricsRegistry()
+        metrics.gauge("upstream_concurrency_limit", "上游主机当前的自适应并发上限", self._limit_samples)
+        metrics.gauge("upstream_in_flight", "上游主机正在进行的请求数", self._in_flight_samples)
+        self._waits = metrics.summary("upstream_limit_wait_seconds", "等待上游主机并发名额的时间")
+        self._congestion = metrics.counter("upstream_congestion_total", "触发并发上限收缩的上游请求数")
+
+    def get(self, host: str) -> AdaptiveLimit:
+        """获取主机的并发上限，超出max_hosts时淘汰最久未使用的空闲主机，没有空闲主机时返回共用的上限"""
+        limit = self._limits.get(host)
+        if limit is not None:
+            self._limits.move_to_end(host)
+            return limit
+        # 仍有请求在共用上限中的主机继续使用它，同一主机的名额不会分属两个上限
+        if host in self._overflow_hosts:
+            return self._shared()
+
+        if len(self._limits) >= self.max_hosts:
+            for name, candidate in self._limits.items():
+                if candidate.idle:
+                    del self._limits[name]
+                    break
+            else:
+                return self._shared()
+
+        limit = self._new_limit()
+        self._limits[host] = limit
+        return limit
+
+    async def acquire(self, host: str, timeout: Optional[float] = None) -> int:
+        """获取主机的并发名额，返回获取时的并发数"""
+        start_time = time.monotonic()
+        limit = self.get(host)
+        shared = limit is self._overflow
+        if shared:
+            self._overflow_hosts[host] = self._overflow_hosts.get(host, 0) + 1
+        try:
+            in_flight = await limit.acquire(timeout)
+        except BaseException:
+            if shared:
+                self._leave_shared(host)
+            raise
+        self._waits.observe(time.monotonic() - start_time)
+        return in_flight
+
+    def release(self, host: str, rtt: Optional[float], in_flight: int, congested: bool = False):
+        if host in self._overflow_hosts:
+            limit = self._overflow
+            self._leave_shared(host)
+        else:
+            limit = self._limits.get(host)
+        if congested:
+            # 不按主机区分: 主机来自请求中的URL，被淘汰的主机的序列会永远留在输出中
+            self._congestion.inc()
+        if limit is not None:
+            limit.release(rtt, in_flight, congested)
+
+    def has_headroom(self, host: str) -> bool:
+        """主机没有排队且至少一半名额空闲，后台请求据此避免与前台请求争抢"""
+        limit = self._overflow if host in self._overflow_hosts else self._limits.get(host)
+        if limit is None:
+            return True
+        return not limit._waiters and limit.in_flight < max(1, int(limit.limit) // 2)
+
+    @property
+    def in_flight(self) -> int:
+        """所有主机正在进行的请求总数"""
+        return sum(limit.in_flight for limit in self._all().values())
+
+    def limits(self) -> Dict[str, float]:
+        return {host: limit.limit for host, limit in self._all().items()}
+
+    def _new_limit(self) -> AdaptiveLimit:
+        return AdaptiveLimit(initial_limit=min(self.initial_limit, self.max_limit), max_limit=self.max_limit)
+
+    def _shared(self) -> AdaptiveLimit:
+        if self._overflow is None:
+            self._overflow = self._new_limit()
+        return self._overflow
+
+    def _leave_shared(self, host: str):
+        count = self._overflow_hosts.get(host, 0) - 1
+        if count > 0:
+            self._overflow_hosts[host] = count
+        else:
+            self._overflow_hosts.pop(host, None)
+
+    def _all(self) -> Dict[str, AdaptiveLimit]:
+        limits: Dict[str, AdaptiveLimit] = dict(self._limits)
+        if self._overflow is not None:
+            limits[OVERFLOW_HOST] = self._overflow
+        return limits
+
+    def _limit_samples(self):
+        return {MetricsRegistry.labels(host=host): limit.limit for host, limit in self._all().items()}
+
+    def _in_flight_samples(self):
+        return {MetricsRegistry.labels(host=host): limit.in_flight for host, limit in self._all().items()}
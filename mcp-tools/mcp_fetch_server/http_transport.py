@@ -6,62 +6,232 @@ MCP Fetch Streamable HTTP Server - FastAPI HTTP Transport
 """
 
 import asyncio
-import json
+import hmac
 import logging
-import signal
+import os
 import sys
-from typing import Any, Dict, Optional
-
-import aiohttp
-from fastapi import FastAPI, HTTPException, Request, Response
-from fastapi.responses import StreamingResponse, HTMLResponse
-from pydantic import BaseModel
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Optional, Sequence
 
 from mcp_fetch_server.server import FetchMCPServer
+from mcp_fetch_server.admission import ANONYMOUS, AdmissionController, Overloaded
+from mcp_fetch_server.clients import ClientContext, ClientQuota, client_identity, current_client, key_digest
+from mcp_fetch_server.deadline import Deadline, DeadlineExceeded
 from mcp_fetch_server.error_handler import ErrorHandler
+from mcp_fetch_server.mcp_endpoint import ClientDisconnected, MCPEndpoint
+from mcp_fetch_server.health import HealthEndpoint, HealthMonitor
+from mcp_fetch_server.loop_monitor import LoopMonitor
+from mcp_fetch_server.eventloop import HTTP_CHOICES, LOOP_CHOICES, describe_loop, resolve_http, run
+from mcp_fetch_server.profiling import RequestProfiler, sample_stacks
+from mcp_fetch_server.sessions import SessionManager
+from mcp_fetch_server.uds import UnixSocketListener
+from mcp_fetch_server.ws_endpoint import WebSocketEndpoint
+
+# FastAPI延迟到创建服务器时导入，使--help等场景无需加载Web框架
+if TYPE_CHECKING:
+    from fastapi import Request
 
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 
+class ProcessTimeMiddleware:
+    """添加X-Process-Time头部的ASGI中间件"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        loop = asyncio.get_event_loop()
+        start_time = loop.time()
+        
+        async def send_with_process_time(message):
+            if message["type"] == "http.response.start":
+                process_time = loop.time() - start_time
+                headers = list(message.get("headers", []))
+                headers.append((b"x-process-time", str(process_time).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+        
+        await self.app(scope, receive, send_with_process_time)
+
+
+class InFlightMiddleware:
+    """统计进行中HTTP请求的ASGI中间件，SSE流在发送完毕前都计为进行中
+
+    WebSocket连接是长连接，不计入；其上的每个调用由WebSocketEndpoint单独统计。
+    """
+    
+    def __init__(self, app, transport: "HTTPTransportServer"):
+        self.app = app
+        self.transport = transport
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        self.transport.active_requests += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.transport.active_requests -= 1
+
+
 class HTTPTransportServer:
     """MCP Streamable HTTP传输服务器"""
     
-    def __init__(self, server_name: str = "mcp-fetch-server"):
+    # 排空时检查进行中请求的轮询间隔(秒)
+    DRAIN_POLL_INTERVAL = 0.1
+    
+    # 走优先通道、不经过准入队列的轻量MCP方法
+    PRIORITY_METHODS = frozenset({"initialize", "ping", "tools/list"})
+    
+    # 采样剖析允许的最长时间(秒)
+    MAX_PROFILE_SECONDS = 60.0
+
+    def __init__(
+        self,
+        server_name: str = "mcp-fetch-server",
+        admin_token: Optional[str] = None,
+        profile_sample_rate: float = 0.0,
+        slow_request_capacity: int = 20,
+        trace_export: bool = False,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 30.0,
+        max_in_flight: int = 64,
+        max_queue: int = 128,
+        max_queue_wait: float = 5.0,
+        drain_timeout: float = 25.0,
+        http_impl: str = "auto",
+        ws_max_in_flight: int = 32,
+        ws_per_message_deflate: bool = True,
+        upstream_initial_limit: int = 10,
+        upstream_max_limit: int = 100,
+        loop_block_threshold: float = 0.1,
+        readiness_window: float = 10.0,
+        readiness_max_lag: float = 0.5,
+        memory_limit: int = 0,
+        client_max_in_flight: int = 0,
+        client_max_bytes: int = 0,
+        client_bytes_window: float = 60.0,
+        client_keys: Sequence[str] = (),
+        memory_budget: int = 0,
+        memory_budget_wait: float = 5.0,
+        page_cache_size: int = 64 * 1024 * 1024,
+        page_cache_ttl: float = 300.0,
+        content_store_size: int = 64 * 1024 * 1024,
+        snapshot_store_size: int = 32 * 1024 * 1024,
+        session_ttl: float = 1800.0,
+        max_sessions_per_client: int = 16,
+        watch_min_interval: float = 5.0,
+        response_cache_size: int = 64 * 1024 * 1024,
+        cache_ttl: float = 0.0,
+        stale_while_revalidate: float = 60.0,
+        stale_if_error: float = 300.0,
+        refresh_concurrency: int = 2,
+        warm_urls: Sequence[str] = (),
+        negative_cache_max_ttl: float = 300.0,
+    ):
         self.server_name = server_name
-        self.mcp_server = FetchMCPServer(server_name)
+        # uvicorn使用的HTTP解析器: auto/h11/httptools
+        self.http_impl = http_impl
+        self.mcp_server = FetchMCPServer(
+            server_name,
+            trace_export=trace_export,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            upstream_initial_limit=upstream_initial_limit,
+            upstream_max_limit=upstream_max_limit,
+            memory_budget=memory_budget,
+            memory_budget_wait=memory_budget_wait,
+            page_cache_size=page_cache_size,
+            page_cache_ttl=page_cache_ttl,
+            content_store_size=content_store_size,
+            snapshot_store_size=snapshot_store_size,
+            watch_min_interval=watch_min_interval,
+            response_cache_size=response_cache_size,
+            cache_ttl=cache_ttl,
+            stale_while_revalidate=stale_while_revalidate,
+            stale_if_error=stale_if_error,
+            refresh_concurrency=refresh_concurrency,
+            warm_urls=warm_urls,
+            negative_cache_max_ttl=negative_cache_max_ttl
+        )
         self.error_handler = ErrorHandler()
+        self.metrics = self.mcp_server.metrics
+        self.admission = AdmissionController(
+            max_in_flight=max_in_flight,
+            max_queue=max_queue,
+            max_queue_wait=max_queue_wait,
+            client_max_in_flight=client_max_in_flight,
+            metrics=self.metrics
+        )
+        # 每个客户端在时间窗口内可拉取的上游字节数，0表示不限制
+        self.client_quota = ClientQuota(
+            max_bytes=client_max_bytes,
+            window=client_bytes_window,
+            metrics=self.metrics
+        )
+        # 作为客户端身份的API密钥摘要，未配置的密钥按客户端IP区分
+        self.client_keys = frozenset(key_digest(key) for key in client_keys)
+        # Streamable HTTP会话，空闲超过session_ttl秒且没有SSE流时过期
+        self.sessions = SessionManager(
+            ttl=session_ttl,
+            max_per_client=max_sessions_per_client,
+            metrics=self.metrics
+        )
+        # 未配置管理令牌时，所有/admin端点和按请求剖析均不可用
+        self.admin_token = admin_token
+        self.profiler = RequestProfiler(
+            sample_rate=profile_sample_rate,
+            slow_capacity=slow_request_capacity
+        )
+        # 事件循环被阻塞超过loop_block_threshold秒时记录阻塞处的调用栈，0表示只测量延迟
+        self.loop_monitor = LoopMonitor(block_threshold=loop_block_threshold, metrics=self.metrics)
+        self.health = HealthMonitor(
+            self._load,
+            window=readiness_window,
+            max_loop_lag=readiness_max_lag,
+            memory_limit=memory_limit,
+            metrics=self.metrics
+        )
+        from fastapi import FastAPI
+        
         self.app = FastAPI(
             title=server_name,
             description="MCP Fetch Streamable HTTP Server",
             version="1.0.0"
         )
+        # 排空状态: 收到SIGTERM后最多等待drain_timeout秒让进行中的请求完成
+        self.drain_timeout = drain_timeout
+        self.draining = False
+        self.active_requests = 0
+        self.server = None
+        self._drain_task: Optional[asyncio.Task] = None
         self._setup_routes()
         self._setup_middleware()
+        # /mcp和/mcp/ws绕过FastAPI路由和中间件，进行中请求统计覆盖全部HTTP请求；
+        # 健康检查在最外层直接返回缓存的快照，不计入进行中请求
+        self.ws_per_message_deflate = ws_per_message_deflate
+        self.ws_endpoint = WebSocketEndpoint(MCPEndpoint(self.app, self), self, max_in_flight=ws_max_in_flight)
+        self.asgi_app = HealthEndpoint(InFlightMiddleware(self.ws_endpoint, self), self.health)
         self.running = False
     
     def _setup_routes(self):
         """设置HTTP路由"""
+        from fastapi import HTTPException, Request
+        from fastapi.responses import HTMLResponse, PlainTextResponse
         
         @self.app.get("/", response_class=HTMLResponse)
         async def root():
             """根路径 - 提供Web界面"""
             return self._get_web_interface()
         
-        @self.app.get("/health")
-        async def health():
-            """健康检查端点"""
-            return {
-                "status": "healthy",
-                "server": self.server_name,
-                "timestamp": asyncio.get_event_loop().time()
-            }
-        
         @self.app.get("/info")
         async def info():
             """服务器信息"""
@@ -71,104 +241,22 @@ class HTTPTransportServer:
                 "transport": "streamable-http",
                 "endpoints": {
                     "mcp": "/mcp",
+                    "mcp_ws": "/mcp/ws",
                     "health": "/health",
+                    "liveness": "/health/live",
+                    "readiness": "/health/ready",
+                    "metrics": "/metrics",
                     "info": "/info",
                     "docs": "/docs"
                 },
-                "tools": ["fetch", "fetch_json"]
+                "tools": list(self.mcp_server.tools)
             }
         
-        @self.app.post("/mcp")
-        async def mcp_endpoint(request: Request):
-            """MCP Streamable HTTP端点"""
-            try:
-                # 获取客户端IP
-                client_ip = self.error_handler.get_client_ip(request)
-                
-                # 获取请求体
-                body = await request.json()
-                
-                # 记录请求
-                self.error_handler.log_request(
-                    method="POST",
-                    url="/mcp",
-                    client_ip=client_ip,
-                    user_agent=request.headers.get("user-agent", "")
-                )
-                
-                # 处理MCP消息
-                response = await self.mcp_server.mcp.handle_message(body)
-                
-                # 检查是否需要流式响应
-                accept_header = request.headers.get("accept", "")
-                if "text/event-stream" in accept_header:
-                    # 返回SSE流式响应
-                    async def event_stream():
-                        yield f"data: {json.dumps(response)}\n\n"
-                    
-                    return StreamingResponse(
-                        event_stream(),
-                        media_type="text/event-stream",
-                        headers=self._get_cors_headers()
-                    )
-                else:
-                    # 返回JSON响应
-                    return Response(
-                        content=json.dumps(response),
-                        media_type="application/json",
-                        headers=self._get_cors_headers()
-                    )
-                    
-            except Exception as e:
-                self.error_handler.log_error(
-                    "ERROR",
-                    f"MCP处理错误: {str(e)}",
-                    {
-                        "url": "/mcp",
-                        "method": "POST",
-                        "client_ip": client_ip
-                    }
-                )
-                
-                error_response = {
-                    "jsonrpc": "2.0",
-                    "error": {
-                        "code": -32603,
-                        "message": "Internal error",
-                        "data": str(e)
-                    },
-                    "id": None
-                }
-                return Response(
-                    content=json.dumps(error_response),
-                    media_type="application/json",
-                    status_code=500,
-                    headers=self._get_cors_headers()
-                )
-        
-        @self.app.options("/mcp")
-        async def mcp_options():
-            """CORS预检请求处理"""
-            return Response(
-                content="",
-                headers=self._get_cors_headers()
-            )
-        
         @self.app.get("/tools")
         async def list_tools():
             """列出可用工具"""
             try:
-                tools = await self.mcp_server.mcp.list_tools()
-                return {
-                    "tools": [
-                        {
-                            "name": tool.name,
-                            "description": tool.description,
-                            "inputSchema": tool.inputSchema
-                        }
-                        for tool in tools
-                    ]
-                }
+                return {"tools": self.mcp_server.list_tools()}
             except Exception as e:
                 raise HTTPException(status_code=500, detail=str(e))
         
@@ -180,7 +268,17 @@ class HTTPTransportServer:
                 arguments = body.get("arguments", {})
                 
                 # 调用MCP工具
-                result = await self.mcp_server.mcp.call_tool(tool_name, arguments)
+                client = ClientContext(client_identity(
+                    request.headers, self.error_handler.get_client_ip(request), self.client_keys
+                ))
+                current_client.set(client)
+                self._check_accepting()
+                self.client_quota.check(client.id)
+                try:
+                    async with self.admission.slot(client=client.id):
+                        result = await self.mcp_server.call_tool(tool_name, arguments)
+                finally:
+                    self.client_quota.record(client.id, client.bytes_fetched)
                 
                 return {
                     "result": result,
@@ -188,28 +286,165 @@ class HTTPTransportServer:
                     "arguments": arguments
                 }
                 
+            except ValueError as e:
+                raise HTTPException(status_code=404, detail=str(e))
+            except Overloaded as e:
+                raise HTTPException(
+                    status_code=503,
+                    detail=str(e),
+                    headers={"Retry-After": str(e.retry_after)}
+                )
             except Exception as e:
                 raise HTTPException(status_code=500, detail=str(e))
+        
+        @self.app.get("/metrics", response_class=PlainTextResponse)
+        async def metrics():
+            """Prometheus指标"""
+            return PlainTextResponse(
+                self.metrics.render(),
+                media_type="text/plain; version=0.0.4"
+            )
+        
+        @self.app.get("/admin/profile", response_class=PlainTextResponse)
+        async def admin_profile(request: Request, seconds: float = 10.0, interval: float = 0.005):
+            """对事件循环做墙钟采样，返回火焰图折叠栈"""
+            self._require_admin(request)
+            seconds = max(0.1, min(seconds, self.MAX_PROFILE_SECONDS))
+            interval = max(0.001, interval)
+            loop_thread_id = threading.get_ident()
+            self.error_handler.log_info("PROFILE", f"开始采样剖析: {seconds}秒")
+            return await asyncio.get_event_loop().run_in_executor(
+                None, sample_stacks, loop_thread_id, seconds, interval
+            )
+        
+        @self.app.get("/admin/slow-requests")
+        async def admin_slow_requests(request: Request):
+            """最慢请求列表及其剖析结果"""
+            self._require_admin(request)
+            return {"requests": self.profiler.slowest()}
+        
+        @self.app.get("/admin/profiles/{profile_id}", response_class=PlainTextResponse)
+        async def admin_get_profile(profile_id: str, request: Request):
+            """获取单请求剖析结果"""
+            self._require_admin(request)
+            text = self.profiler.get_profile(profile_id)
+            if text is None:
+                raise HTTPException(status_code=404, detail="剖析结果不存在或已过期")
+            return text
+    
+    def _check_accepting(self):
+        """排空期间拒绝新的工具调用"""
+        if self.draining:
+            raise Overloaded("服务器正在关闭，请重试其他实例", retry_after=1)
+    
+    async def _dispatch(self, body: Any, deadline: Optional[Deadline]):
+        """分发MCP消息，工具调用需要先通过准入控制"""
+        if isinstance(body, dict) and body.get("method") in self.PRIORITY_METHODS:
+            return await self.mcp_server.handle_message(body)
+        
+        self._check_accepting()
+        client = current_client.get()
+        client_id = client.id if client is not None else ANONYMOUS
+        self.client_quota.check(client_id)
+        try:
+            async with self.admission.slot(deadline, client_id):
+                return await self.mcp_server.handle_message(body)
+        finally:
+            if client is not None:
+                self.client_quota.record(client_id, client.bytes_fetched)
+    
+    async def _run_cancellable(self, disconnected, coro, deadline: Optional[Deadline]):
+        """执行协程，disconnected完成(客户端断开)或截止时间到达时立即取消"""
+        task = asyncio.ensure_future(coro)
+        watcher = asyncio.ensure_future(disconnected)
+        try:
+            done, _ = await asyncio.wait(
+                {task, watcher},
+                timeout=deadline.remaining() if deadline else None,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            watcher.cancel()
+        
+        if task in done:
+            return task.result()
+        
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        if watcher in done:
+            raise ClientDisconnected()
+        raise DeadlineExceeded(f"请求已超过截止时间 ({deadline.timeout}秒)")
+    
+    def _is_admin(self, request: "Request") -> bool:
+        """校验管理令牌"""
+        if not self.admin_token:
+            return False
+        token = request.headers.get("x-admin-token", "")
+        if not token:
+            authorization = request.headers.get("authorization", "")
+            if authorization.lower().startswith("bearer "):
+                token = authorization[7:].strip()
+        return hmac.compare_digest(token.encode(), self.admin_token.encode())
+    
+    def _require_admin(self, request: "Request"):
+        """要求管理权限，未配置令牌时端点视为不存在"""
+        from fastapi import HTTPException
+        
+        if not self.admin_token:
+            raise HTTPException(status_code=404, detail="Not Found")
+        if not self._is_admin(request):
+            raise HTTPException(status_code=403, detail="需要管理令牌")
+    
+    @staticmethod
+    def _describe_message(body: Any) -> str:
+        """生成用于慢请求列表的请求描述"""
+        if not isinstance(body, dict):
+            return "invalid"
+        method = body.get("method", "unknown")
+        params = body.get("params") or {}
+        if method == "tools/call" and isinstance(params, dict):
+            return f"{method}:{params.get('name', '')}"
+        return str(method)
     
     def _setup_middleware(self):
         """设置中间件"""
         
-        @self.app.middleware("http")
-        async def add_process_time_header(request: Request, call_next):
-            """添加处理时间头部"""
-            start_time = asyncio.get_event_loop().time()
-            response = await call_next(request)
-            process_time = asyncio.get_event_loop().time() - start_time
-            response.headers["X-Process-Time"] = str(process_time)
-            return response
+        # 使用纯ASGI中间件，BaseHTTPMiddleware会屏蔽客户端断开事件
+        self.app.add_middleware(ProcessTimeMiddleware)
+    
+    def _load(self) -> Dict[str, Any]:
+        """健康检查使用的负载信号"""
+        return {
+            "server": self.server_name,
+            "draining": self.draining,
+            "active_requests": self.active_requests,
+            "in_flight": self.admission.in_flight,
+            "max_in_flight": self.admission.max_in_flight,
+            "queue_depth": self.admission.queue_depth,
+            "max_queue": self.admission.max_queue,
+            "websocket_connections": self.ws_endpoint.connections,
+            "event_loop": self.loop_monitor.snapshot(),
+            "upstream_pool": self.mcp_server.connection_pool(),
+            "memory_budget": {
+                "used": self.mcp_server.memory_budget.used,
+                "limit": self.mcp_server.memory_budget.max_bytes,
+                "waiting": self.mcp_server.memory_budget.waiting,
+            },
+        }
+    
+    def get_app(self):
+        """uvicorn实际运行的ASGI应用: /mcp由原始ASGI端点处理，其余请求交给FastAPI"""
+        return self.asgi_app
     
     def _get_cors_headers(self) -> Dict[str, str]:
         """获取CORS头部"""
         return {
             "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-            "Access-Control-Allow-Headers": "Content-Type, Accept, Authorization",
-            "Access-Control-Max-Age": "86400"
+            "Access-Control-Allow-Methods": "GET, POST, DELETE, OPTIONS",
+            "Access-Control-Allow-Headers": "Content-Type, Accept, Authorization, traceparent, X-MCP-Timeout, Mcp-Session-Id",
+            "Access-Control-Max-Age": "86400",
+            "Timing-Allow-Origin": "*",
+            "Access-Control-Expose-Headers": "Server-Timing, Retry-After, X-Process-Time, X-Profile-Id, Mcp-Session-Id"
         }
     
     def _get_web_interface(self) -> str:
@@ -453,45 +688,113 @@ curl -N http://localhost:8000/mcp \\\n  -H "Accept: text/event-stream" \\\n  -X
     </script>
 </body>
 </html>
-        """.format(server_name=self.server_name)
+        """.replace("{server_name}", self.server_name)
     
-    async def start(self, host: str = "127.0.0.1", port: int = 8000):
-        """启动HTTP服务器"""
+    async def start(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        uds: Optional[str] = None,
+        uds_mode: int = 0o660,
+    ):
+        """启动HTTP服务器，指定uds时监听Unix域套接字而不是TCP端口"""
         self.host = host
         self.port = port
-        self.error_handler.log_info("STARTUP", f"启动HTTP传输服务器: {host}:{port}")
+        listener = None
+        sockets = None
+        if uds:
+            # 绑定要在启动后台线程之前完成，绑定期间会临时修改进程umask
+            listener = UnixSocketListener(uds, uds_mode)
+            sockets = [listener.bind()]
+            self.error_handler.log_info("STARTUP", f"启动HTTP传输服务器: unix:{uds} (权限 {uds_mode:o})")
+        else:
+            self.error_handler.log_info("STARTUP", f"启动HTTP传输服务器: {host}:{port}")
         await self.mcp_server.start()
         self.running = True
+        self._loop = asyncio.get_event_loop()
+        self.loop_monitor.start()
+        self.health.start()
+        self.sessions.start()
+        # 在后台线程预加载aiohttp和MCP SDK，健康检查无需等待
+        self._loop.run_in_executor(None, self.mcp_server.preload)
+        
+        http_impl = resolve_http(self.http_impl)
+        self.error_handler.log_info("STARTUP", f"事件循环: {describe_loop()}，HTTP解析器: {http_impl}")
         
         import uvicorn
         config = uvicorn.Config(
-            self.app,
+            self.asgi_app,
             host=host,
             port=port,
-            log_level="info"
+            http=http_impl,
+            ws_per_message_deflate=self.ws_per_message_deflate,
+            log_level="info",
+            # 排空阶段已等待过进行中的请求，这里只需收尾
+            timeout_graceful_shutdown=5
         )
         self.server = uvicorn.Server(config)
-        
-        # 设置信号处理
-        def signal_handler(signum, frame):
-            self.error_handler.log_info("SIGNAL", f"接收到信号 {signum}，正在关闭服务器...")
-            self.running = False
-            
-        signal.signal(signal.SIGINT, signal_handler)
-        signal.signal(signal.SIGTERM, signal_handler)
+        # 接管uvicorn的信号处理: 首次SIGTERM/SIGINT开始排空，再次收到时立即退出
+        self.server.handle_exit = self._handle_exit
         
         try:
-            await self.server.serve()
+            await self.server.serve(sockets=sockets)
         except KeyboardInterrupt:
             self.error_handler.log_info("SHUTDOWN", "服务器被用户中断")
         finally:
+            if listener is not None:
+                listener.close()
             await self.stop()
     
+    def _handle_exit(self, sig, frame):
+        """信号处理"""
+        if self.draining:
+            self.error_handler.log_info("SIGNAL", f"再次接收到信号 {sig}，立即关闭服务器")
+            self.server.force_exit = True
+            self.server.should_exit = True
+            return
+        
+        self.error_handler.log_info("SIGNAL", f"接收到信号 {sig}，开始排空连接...")
+        self._loop.call_soon_threadsafe(self.begin_drain)
+    
+    def begin_drain(self):
+        """开始排空: 健康检查变为未就绪，不再接受新的工具调用"""
+        if self.draining:
+            return
+        self.draining = True
+        # 立即刷新，不等下一次后台刷新
+        self.health.refresh()
+        # 会话的SSE流是长连接，立即结束，客户端重新连接到其他实例
+        self.sessions.end_streams()
+        self._drain_task = asyncio.ensure_future(self._drain_and_exit())
+    
+    async def drain(self, timeout: Optional[float] = None) -> bool:
+        """等待进行中的请求(包括SSE流)完成，返回是否在超时前全部完成"""
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + (self.drain_timeout if timeout is None else timeout)
+        while self.active_requests > 0 and loop.time() < deadline:
+            await asyncio.sleep(self.DRAIN_POLL_INTERVAL)
+        return self.active_requests == 0
+    
+    async def _drain_and_exit(self):
+        """排空后通知uvicorn退出"""
+        if await self.drain():
+            self.error_handler.log_info("SHUTDOWN", "进行中的请求已全部完成")
+        else:
+            self.error_handler.log_warning(
+                "SHUTDOWN",
+                f"排空超时({self.drain_timeout}秒)，仍有 {self.active_requests} 个请求未完成"
+            )
+        if self.server is not None:
+            self.server.should_exit = True
+    
     async def stop(self):
         """停止HTTP服务器"""
         if self.running:
             self.error_handler.log_info("SHUTDOWN", "停止HTTP传输服务器")
             self.running = False
+            await self.health.stop()
+            await self.loop_monitor.stop()
+            await self.sessions.stop()
             await self.mcp_server.stop()
 
 
@@ -499,29 +802,120 @@ def main():
     """主函数"""
     import argparse
     
+    def file_mode(value: str) -> int:
+        """解析八进制文件权限"""
+        return int(value, 8)
+    
     parser = argparse.ArgumentParser(description="MCP Fetch Streamable HTTP Server")
     parser.add_argument("--host", default="127.0.0.1", help="主机地址 (默认: 127.0.0.1)")
     parser.add_argument("--port", type=int, default=8000, help="端口 (默认: 8000)")
+    parser.add_argument("--uds", default=os.environ.get("MCP_UDS"), help="监听Unix域套接字路径，指定后忽略--host/--port")
+    parser.add_argument("--uds-mode", type=file_mode, default=os.environ.get("MCP_UDS_MODE", "660"), help="套接字文件权限(八进制) (默认: 660)")
     parser.add_argument("--name", default="mcp-fetch-server", help="服务器名称")
     parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"], help="日志级别")
+    parser.add_argument("--admin-token", default=os.environ.get("MCP_ADMIN_TOKEN"), help="管理端点令牌 (默认: $MCP_ADMIN_TOKEN)")
+    parser.add_argument("--profile-sample-rate", type=float, default=float(os.environ.get("MCP_PROFILE_SAMPLE_RATE", "0")), help="请求剖析采样率 0-1 (默认: 0)")
+    parser.add_argument("--slow-requests", type=int, default=20, help="保留的最慢请求数量 (默认: 20)")
+    parser.add_argument("--connect-timeout", type=float, default=float(os.environ.get("MCP_CONNECT_TIMEOUT", "10")), help="上游连接超时(秒) (默认: 10)")
+    parser.add_argument("--read-timeout", type=float, default=float(os.environ.get("MCP_READ_TIMEOUT", "30")), help="上游读取超时(秒) (默认: 30)")
+    parser.add_argument("--upstream-initial-limit", type=int, default=int(os.environ.get("MCP_UPSTREAM_INITIAL_LIMIT", "10")), help="每个上游主机的初始并发上限 (默认: 10)")
+    parser.add_argument("--upstream-max-limit", type=int, default=int(os.environ.get("MCP_UPSTREAM_MAX_LIMIT", "100")), help="每个上游主机的自适应并发上限最大值 (默认: 100)")
+    parser.add_argument("--max-in-flight", type=int, default=int(os.environ.get("MCP_MAX_IN_FLIGHT", "64")), help="同时执行的工具调用上限 (默认: 64)")
+    parser.add_argument("--max-queue", type=int, default=int(os.environ.get("MCP_MAX_QUEUE", "128")), help="准入队列长度上限 (默认: 128)")
+    parser.add_argument("--max-queue-wait", type=float, default=float(os.environ.get("MCP_MAX_QUEUE_WAIT", "5")), help="准入排队最长等待(秒) (默认: 5)")
+    parser.add_argument("--client-max-in-flight", type=int, default=int(os.environ.get("MCP_CLIENT_MAX_IN_FLIGHT", "0")), help="单个客户端同时执行的工具调用上限，0表示不限制 (默认: 0)")
+    parser.add_argument("--client-max-bytes", type=int, default=int(os.environ.get("MCP_CLIENT_MAX_BYTES", "0")), help="单个客户端每个时间窗口可拉取的上游数据量(MB)，0表示不限制 (默认: 0)")
+    parser.add_argument("--client-bytes-window", type=float, default=float(os.environ.get("MCP_CLIENT_BYTES_WINDOW", "60")), help="客户端数据量配额的时间窗口(秒) (默认: 60)")
+    parser.add_argument("--client-key", action="append", dest="client_keys", default=[key.strip() for key in os.environ.get("MCP_CLIENT_KEYS", "").split(",") if key.strip()], help="作为客户端身份的API密钥，可重复指定，未配置的密钥按客户端IP区分 (默认: $MCP_CLIENT_KEYS，逗号分隔)")
+    parser.add_argument("--drain-timeout", type=float, default=float(os.environ.get("MCP_DRAIN_TIMEOUT", "25")), help="关闭时等待进行中请求完成的最长时间(秒) (默认: 25)")
+    parser.add_argument("--loop", default=os.environ.get("MCP_EVENT_LOOP", "auto"), choices=LOOP_CHOICES, help="事件循环实现 (默认: auto，可用时使用uvloop)")
+    parser.add_argument("--http", default=os.environ.get("MCP_HTTP_PARSER", "auto"), choices=HTTP_CHOICES, help="HTTP解析器实现 (默认: auto，可用时使用httptools)")
+    parser.add_argument("--ws-max-in-flight", type=int, default=int(os.environ.get("MCP_WS_MAX_IN_FLIGHT", "32")), help="单个WebSocket连接同时处理的消息上限 (默认: 32)")
+    parser.add_argument("--no-ws-deflate", action="store_true", default=os.environ.get("MCP_WS_DEFLATE") == "0", help="禁用WebSocket permessage-deflate压缩")
+    parser.add_argument("--loop-block-threshold", type=float, default=float(os.environ.get("MCP_LOOP_BLOCK_THRESHOLD", "0.1")), help="事件循环阻塞超过该时间(秒)时记录调用栈，0表示禁用 (默认: 0.1)")
+    parser.add_argument("--readiness-window", type=float, default=float(os.environ.get("MCP_READINESS_WINDOW", "10")), help="持续饱和多久(秒)后就绪检查失败，恢复同样需要持续该时间 (默认: 10)")
+    parser.add_argument("--readiness-max-lag", type=float, default=float(os.environ.get("MCP_READINESS_MAX_LAG", "0.5")), help="视为饱和的事件循环延迟(秒) (默认: 0.5)")
+    parser.add_argument("--memory-budget", type=int, default=int(os.environ.get("MCP_MEMORY_BUDGET", "0")), help="进行中的工具调用可占用的正文内存(MB)，0表示不限制 (默认: 0)")
+    parser.add_argument("--memory-budget-wait", type=float, default=float(os.environ.get("MCP_MEMORY_BUDGET_WAIT", "5")), help="内存预算不足时的最长等待(秒)，0表示立即拒绝 (默认: 5)")
+    parser.add_argument("--page-cache-size", type=int, default=int(os.environ.get("MCP_PAGE_CACHE_SIZE", "64")), help="分页正文缓存大小(MB)，0表示不缓存 (默认: 64)")
+    parser.add_argument("--page-cache-ttl", type=float, default=float(os.environ.get("MCP_PAGE_CACHE_TTL", "300")), help="分页正文缓存的存活时间(秒) (默认: 300)")
+    parser.add_argument("--content-store-size", type=int, default=int(os.environ.get("MCP_CONTENT_STORE_SIZE", "64")), help="按摘要保存的正文大小上限(MB)，0表示不保存 (默认: 64)")
+    parser.add_argument("--snapshot-store-size", type=int, default=int(os.environ.get("MCP_SNAPSHOT_STORE_SIZE", "32")), help="fetch_diff快照大小上限(MB)，0表示不保存 (默认: 32)")
+    parser.add_argument("--negative-cache-max-ttl", type=float, default=float(os.environ.get("MCP_NEGATIVE_CACHE_MAX_TTL", "300")), help="不可达主机直接失败的最长时间(秒)，0表示不缓存失败 (默认: 300)")
+    parser.add_argument("--session-ttl", type=float, default=float(os.environ.get("MCP_SESSION_TTL", "1800")), help="会话空闲多久(秒)后过期，打开SSE流的会话不过期 (默认: 1800)")
+    parser.add_argument("--max-sessions-per-client", type=int, default=int(os.environ.get("MCP_MAX_SESSIONS_PER_CLIENT", "16")), help="单个客户端的会话数上限，超出时关闭它最久未使用的会话，0表示不限制 (默认: 16)")
+    parser.add_argument("--watch-min-interval", type=float, default=float(os.environ.get("MCP_WATCH_MIN_INTERVAL", "5")), help="watch订阅的最小轮询间隔(秒) (默认: 5)")
+    parser.add_argument("--response-cache-size", type=int, default=int(os.environ.get("MCP_RESPONSE_CACHE_SIZE", "64")), help="GET响应缓存大小(MB)，0表示不缓存 (默认: 64)")
+    parser.add_argument("--cache-ttl", type=float, default=float(os.environ.get("MCP_CACHE_TTL", "0")), help="上游未声明max-age时的缓存新鲜期(秒)，0表示只缓存上游声明可缓存的响应 (默认: 0)")
+    parser.add_argument("--stale-while-revalidate", type=float, default=float(os.environ.get("MCP_STALE_WHILE_REVALIDATE", "60")), help="过期后直接返回旧内容并在后台刷新的时间窗口(秒) (默认: 60)")
+    parser.add_argument("--stale-if-error", type=float, default=float(os.environ.get("MCP_STALE_IF_ERROR", "300")), help="过期后上游出错时返回旧内容的时间窗口(秒) (默认: 300)")
+    parser.add_argument("--refresh-concurrency", type=int, default=int(os.environ.get("MCP_REFRESH_CONCURRENCY", "2")), help="同时进行的后台刷新上限 (默认: 2)")
+    parser.add_argument("--warm-url", action="append", dest="warm_urls", default=[url.strip() for url in os.environ.get("MCP_WARM_URLS", "").split(",") if url.strip()], help="启动时在后台预热的URL，可重复指定 (默认: $MCP_WARM_URLS，逗号分隔)")
+    parser.add_argument("--memory-limit", type=int, default=int(os.environ.get("MCP_MEMORY_LIMIT", "0")), help="视为饱和的常驻内存(MB)，0表示不检查 (默认: 0)")
+    parser.add_argument("--trace-export", action="store_true", default=os.environ.get("MCP_TRACE_EXPORT") == "1", help="将上游请求导出为opentelemetry span")
     
     args = parser.parse_args()
     
-    # 设置日志级别
-    logging.getLogger().setLevel(getattr(logging, args.log_level))
+    # 设置日志
+    ErrorHandler().setup_logging(args.log_level)
     
     # 创建并运行服务器
-    server = HTTPTransportServer(args.name)
+    server = HTTPTransportServer(
+        args.name,
+        admin_token=args.admin_token,
+        profile_sample_rate=args.profile_sample_rate,
+        slow_request_capacity=args.slow_requests,
+        trace_export=args.trace_export,
+        connect_timeout=args.connect_timeout,
+        read_timeout=args.read_timeout,
+        upstream_initial_limit=args.upstream_initial_limit,
+        upstream_max_limit=args.upstream_max_limit,
+        loop_block_threshold=args.loop_block_threshold,
+        readiness_window=args.readiness_window,
+        readiness_max_lag=args.readiness_max_lag,
+        memory_limit=args.memory_limit * 1024 * 1024,
+        memory_budget=args.memory_budget * 1024 * 1024,
+        memory_budget_wait=args.memory_budget_wait,
+        page_cache_size=args.page_cache_size * 1024 * 1024,
+        page_cache_ttl=args.page_cache_ttl,
+        content_store_size=args.content_store_size * 1024 * 1024,
+        snapshot_store_size=args.snapshot_store_size * 1024 * 1024,
+        session_ttl=args.session_ttl,
+        max_sessions_per_client=args.max_sessions_per_client,
+        watch_min_interval=args.watch_min_interval,
+        response_cache_size=args.response_cache_size * 1024 * 1024,
+        cache_ttl=args.cache_ttl,
+        stale_while_revalidate=args.stale_while_revalidate,
+        stale_if_error=args.stale_if_error,
+        refresh_concurrency=args.refresh_concurrency,
+        warm_urls=args.warm_urls,
+        negative_cache_max_ttl=args.negative_cache_max_ttl,
+        max_in_flight=args.max_in_flight,
+        max_queue=args.max_queue,
+        max_queue_wait=args.max_queue_wait,
+        drain_timeout=args.drain_timeout,
+        client_max_in_flight=args.client_max_in_flight,
+        client_max_bytes=args.client_max_bytes * 1024 * 1024,
+        client_bytes_window=args.client_bytes_window,
+        client_keys=args.client_keys,
+        http_impl=args.http,
+        ws_max_in_flight=args.ws_max_in_flight,
+        ws_per_message_deflate=not args.no_ws_deflate
+    )
     
     server.error_handler.log_info("MAIN", f"启动MCP Fetch Streamable HTTP服务器...")
     server.error_handler.log_info("MAIN", f"服务器名称: {args.name}")
-    server.error_handler.log_info("MAIN", f"地址: http://{args.host}:{args.port}")
-    server.error_handler.log_info("MAIN", f"Web界面: http://{args.host}:{args.port}/")
-    server.error_handler.log_info("MAIN", f"健康检查: http://{args.host}:{args.port}/health")
-    server.error_handler.log_info("MAIN", f"MCP端点: http://{args.host}:{args.port}/mcp")
+    if args.uds:
+        server.error_handler.log_info("MAIN", f"地址: unix:{args.uds}")
+    else:
+        server.error_handler.log_info("MAIN", f"地址: http://{args.host}:{args.port}")
+        server.error_handler.log_info("MAIN", f"Web界面: http://{args.host}:{args.port}/")
+        server.error_handler.log_info("MAIN", f"健康检查: http://{args.host}:{args.port}/health")
+        server.error_handler.log_info("MAIN", f"MCP端点: http://{args.host}:{args.port}/mcp")
+        server.error_handler.log_info("MAIN", f"WebSocket端点: ws://{args.host}:{args.port}/mcp/ws")
     
     try:
-        asyncio.run(server.start(args.host, args.port))
+        run(server.start(args.host, args.port, uds=args.uds, uds_mode=args.uds_mode), loop=args.loop)
     except KeyboardInterrupt:
         server.error_handler.log_info("MAIN", "服务器被用户中断")
     except Exception as e:
@@ -0,0 +1,145 @@
+"""
+事件循环延迟监控
+
+事件循环线程里的同步代码(大对象序列化、字符集检测、同步写日志文件等)会让所有
+请求一起变慢，而asyncio的debug模式开销太大，不适合在生产环境常开。这里用两个
+轻量组件持续监控:
+
+- 心跳任务每隔 ``interval`` 秒醒来一次，实际睡眠时间超出预期的部分就是事件循环延迟
+- 看门狗线程检查心跳是否按时更新，超过 ``block_threshold`` 秒未更新说明有回调正在
+  阻塞事件循环，此时抓取事件循环线程的调用栈并记录日志，日志按 ``log_interval`` 限流
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from .metrics import MetricsRegistry
+
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    """事件循环延迟监控和阻塞回调检测"""
+
+    def __init__(
+        self,
+        interval: float = 0.1,
+        block_threshold: float = 0.1,
+        log_interval: float = 30.0,
+        window: float = 60.0,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.log_interval = log_interval
+        self.lag = 0.0
+        self.blocked_total = 0
+        self.last_block: Optional[Dict[str, Any]] = None
+        # 最近window秒内的延迟样本，用于报告窗口内的最大延迟
+        self._samples: Deque[float] = deque(maxlen=max(1, int(window / interval)))
+        self._thread_id: Optional[int] = None
+        self._last_beat = 0.0
+        self._last_log = float("-inf")
+        self._suppressed = 0
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+        metrics = metrics or MetricsRegistry()
+        metrics.gauge("event_loop_lag_seconds", "最近一次测得的事件循环延迟", lambda: self.lag)
+        self._lag_summary = metrics.summary("event_loop_lag_sample_seconds", "事件循环延迟样本")
+        self._blocked = metrics.counter("event_loop_blocked_total", "事件循环被阻塞超过阈值的次数")
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """在事件循环线程中调用，启动心跳任务和看门狗线程"""
+        if self.running:
+            return
+        self._thread_id = threading.get_ident()
+        # 心跳任务首次运行前看门狗不做检查，避免把启动过程误报为阻塞
+        self._last_beat = 0.0
+        self._stopped.clear()
+        self._task = asyncio.ensure_future(self._heartbeat())
+        if self.block_threshold > 0:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self):
+        """停止监控"""
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1.0)
+            self._watchdog = None
+
+    async def _heartbeat(self):
+        self._last_beat = time.monotonic()
+        while True:
+            start_time = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.lag = max(0.0, now - start_time - self.interval)
+            self._samples.append(self.lag)
+            self._lag_summary.observe(self.lag)
+            self._last_beat = now
+
+    def _watch(self):
+        """看门狗线程: 心跳超时时抓取事件循环线程的调用栈，每次阻塞只抓取一次"""
+        poll = min(self.interval, self.block_threshold) / 2
+        reported_beat = None
+        while not self._stopped.wait(poll):
+            beat = self._last_beat
+            blocked_for = time.monotonic() - beat - self.interval
+            if not beat or blocked_for < self.block_threshold or beat == reported_beat:
+                continue
+            reported_beat = beat
+
+            frame = sys._current_frames().get(self._thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            self.blocked_total += 1
+            self._blocked.inc()
+            self.last_block = {
+                "timestamp": time.time(),
+                "blocked_ms": round(blocked_for * 1000, 3),
+                "stack": stack,
+            }
+            self._log_block(blocked_for, stack)
+
+    def _log_block(self, blocked_for: float, stack: str):
+        """记录阻塞日志，log_interval内只记录一次，其余计数后合并报告"""
+        now = time.monotonic()
+        if now - self._last_log < self.log_interval:
+            self._suppressed += 1
+            return
+        suppressed, self._suppressed = self._suppressed, 0
+        self._last_log = now
+        message = f"事件循环已被阻塞 {blocked_for * 1000:.0f}ms，当前调用栈:\n{stack}"
+        if suppressed:
+            message += f"(此前 {suppressed} 次阻塞未记录)"
+        logger.warning(message)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前监控状态，用于健康检查"""
+        return {
+            "lag_ms": round(self.lag * 1000, 3),
+            "max_lag_ms": round(max(self._samples, default=0.0) * 1000, 3),
+            "blocked_total": self.blocked_total,
+            # 调用栈已写入日志，健康检查只返回摘要
+            "last_block": {key: value for key, value in self.last_block.items() if key != "stack"} if self.last_block else None,
+        }
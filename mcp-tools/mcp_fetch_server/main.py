@@ -6,14 +6,13 @@ A Model Context Protocol server that provides HTTP fetching capabilities
 with Streamable HTTP transport support.
 """
 
-import asyncio
 import logging
 import argparse
-import signal
+import os
 import sys
-from typing import Optional
 
-from .server import FetchMCPServer
+from .eventloop import HTTP_CHOICES, LOOP_CHOICES, run
+from .http_transport import HTTPTransportServer
 
 
 def setup_logging(level: str = "INFO"):
@@ -25,22 +24,22 @@ def setup_logging(level: str = "INFO"):
     )
 
 
-async def shutdown(server: FetchMCPServer, signal: Optional[signal.Signals] = None):
-    """优雅关闭服务器"""
-    if signal:
-        logging.info(f"Received exit signal {signal.name}...")
-    
+async def shutdown(server: HTTPTransportServer):
+    """优雅关闭服务器: 等待进行中的请求完成后再关闭上游会话"""
     logging.info("Shutting down MCP fetch server...")
-    await server.stop()
-    
-    # 取消所有正在运行的任务
-    tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
-    [task.cancel() for task in tasks]
+    server.begin_drain()
+    if not await server.drain():
+        logging.warning(f"Drain timed out with {server.active_requests} requests still in flight")
     
-    await asyncio.gather(*tasks, return_exceptions=True)
+    await server.stop()
     logging.info("Server shutdown complete")
 
 
+def file_mode(value: str) -> int:
+    """解析八进制文件权限"""
+    return int(value, 8)
+
+
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(
@@ -58,6 +57,18 @@ def main():
         default=8000,
         help="Port to bind to (default: 8000)"
     )
+    parser.add_argument(
+        "--uds",
+        type=str,
+        default=os.environ.get("MCP_UDS"),
+        help="Listen on this Unix domain socket path instead of host/port"
+    )
+    parser.add_argument(
+        "--uds-mode",
+        type=file_mode,
+        default=os.environ.get("MCP_UDS_MODE", "660"),
+        help="Permissions of the socket file, in octal (default: 660)"
+    )
     parser.add_argument(
         "--log-level",
         type=str,
@@ -71,6 +82,26 @@ def main():
         default="mcp-fetch-server",
         help="Server name (default: mcp-fetch-server)"
     )
+    parser.add_argument(
+        "--drain-timeout",
+        type=float,
+        default=float(os.environ.get("MCP_DRAIN_TIMEOUT", "25")),
+        help="Seconds to wait for in-flight requests on SIGTERM (default: 25)"
+    )
+    parser.add_argument(
+        "--loop",
+        type=str,
+        default=os.environ.get("MCP_EVENT_LOOP", "auto"),
+        choices=LOOP_CHOICES,
+        help="Event loop implementation, falls back to asyncio if uvloop is missing (default: auto)"
+    )
+    parser.add_argument(
+        "--http",
+        type=str,
+        default=os.environ.get("MCP_HTTP_PARSER", "auto"),
+        choices=HTTP_CHOICES,
+        help="HTTP parser implementation, falls back to h11 if httptools is missing (default: auto)"
+    )
     
     args = parser.parse_args()
     
@@ -79,17 +110,19 @@ def main():
     logger = logging.getLogger(__name__)
     
     # 创建服务器实例
-    server = FetchMCPServer(name=args.name)
+    server = HTTPTransportServer(
+        args.name,
+        drain_timeout=args.drain_timeout,
+        http_impl=args.http
+    )
     
     async def run_server():
         """运行服务器"""
-        # 设置信号处理
-        for sig in (signal.SIGINT, signal.SIGTERM):
-            signal.signal(sig, lambda s, _: asyncio.create_task(shutdown(server, s)))
-        
+        # SIGINT/SIGTERM由服务器接管: 先排空进行中的请求，再退出
         try:
-            logger.info(f"Starting {args.name} on {args.host}:{args.port}")
-            await server.start(host=args.host, port=args.port)
+            address = f"unix:{args.uds}" if args.uds else f"{args.host}:{args.port}"
+            logger.info(f"Starting {args.name} on {address}")
+            await server.start(host=args.host, port=args.port, uds=args.uds, uds_mode=args.uds_mode)
         except Exception as e:
             logger.error(f"Server error: {e}")
             await shutdown(server)
@@ -97,7 +130,7 @@ def main():
     
     # 运行服务器
     try:
-        asyncio.run(run_server())
+        run(run_server(), loop=args.loop)
     except KeyboardInterrupt:
         logger.info("Received KeyboardInterrupt, shutting down...")
         sys.exit(0)
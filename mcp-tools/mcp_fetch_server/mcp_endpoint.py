@@ -0,0 +1,321 @@
+"""
+/mcp的原始ASGI端点
+
+挂载在FastAPI应用之前，直接处理 ``POST /mcp`` 和 ``OPTIONS /mcp``:
+读取请求体字节、解码(安装orjson时使用orjson)、分发给工具注册表，
+再自行写出响应字节，不经过FastAPI路由、依赖注入和中间件栈。
+其余路径(Web界面、文档、管理端点等)原样交给FastAPI处理。
+
+``initialize`` 成功后通过 ``Mcp-Session-Id`` 头部返回会话ID，携带该头部的
+``GET /mcp`` (Accept: text/event-stream)打开会话的SSE流，``DELETE /mcp`` 结束会话。
+"""
+
+import asyncio
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from .admission import Overloaded
+from .clients import ClientContext, client_identity, current_client
+from .codec import dumps, loads
+from .deadline import Deadline, DeadlineExceeded, current_deadline
+from .sessions import Session, current_session
+from .tracing import TraceContext, current_trace, format_server_timing, timing_collector
+
+if TYPE_CHECKING:
+    from .http_transport import HTTPTransportServer
+
+
+Headers = List[Tuple[bytes, bytes]]
+
+
+class ClientDisconnected(Exception):
+    """客户端在请求完成前断开连接"""
+
+
+class RequestHeaders(dict):
+    """小写键的请求头字典，get()不区分大小写"""
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        return dict.get(self, key.lower(), default)
+
+
+class _Client:
+    __slots__ = ("host",)
+
+    def __init__(self, host: str):
+        self.host = host
+
+
+class RawRequest:
+    """从ASGI scope构建的轻量请求对象，提供ErrorHandler和管理令牌校验所需的属性"""
+
+    __slots__ = ("headers", "client")
+
+    def __init__(self, scope: Dict[str, Any]):
+        self.headers = RequestHeaders(
+            (name.decode("latin-1"), value.decode("latin-1")) for name, value in scope["headers"]
+        )
+        client = scope.get("client")
+        self.client = _Client(client[0]) if client else None
+
+
+class MCPEndpoint:
+    """/mcp的ASGI处理器，其他请求交给内层应用"""
+
+    # SSE流没有通知时发送注释行的间隔(秒)，避免代理因空闲断开连接
+    SSE_KEEPALIVE = 15.0
+
+    def __init__(self, app, transport: "HTTPTransportServer", path: str = "/mcp"):
+        self.app = app
+        self.transport = transport
+        self.path = path
+        # CORS头部在所有响应中相同，预先编码
+        self._cors_headers: Headers = [
+            (name.lower().encode("latin-1"), value.encode("latin-1"))
+            for name, value in transport._get_cors_headers().items()
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        if method == "POST":
+            await self._handle_post(scope, receive, send)
+        elif method == "GET" and "text/event-stream" in RawRequest(scope).headers.get("accept", ""):
+            await self._handle_stream(scope, receive, send)
+        elif method == "DELETE":
+            await self._handle_delete(scope, send)
+        elif method == "OPTIONS":
+            # CORS预检请求
+            await self._send(send, 200, b"", list(self._cors_headers))
+        else:
+            await self._send(send, 405, b"", [(b"allow", b"GET, POST, DELETE, OPTIONS")])
+
+    async def _handle_post(self, scope, receive, send):
+        """MCP Streamable HTTP端点"""
+        transport = self.transport
+        error_handler = transport.error_handler
+        loop = asyncio.get_event_loop()
+        start_time = loop.time()
+
+        request = RawRequest(scope)
+        client_ip = error_handler.get_client_ip(request)
+        body: Any = None
+
+        try:
+            try:
+                body = loads(await self._read_body(receive))
+            except ValueError as e:
+                await self._send_json(send, 400, self._error(None, -32700, "Parse error", str(e)), start_time)
+                return
+
+            # 记录请求
+            error_handler.log_request(
+                method="POST",
+                url=self.path,
+                client_ip=client_ip,
+                user_agent=request.headers.get("user-agent", "")
+            )
+
+            # 链路上下文和上游耗时收集
+            current_trace.set(TraceContext.parse(request.headers.get("traceparent")))
+            timings: list = []
+            timing_collector.set(timings)
+
+            # 客户端身份，用于公平调度、配额和速率限制
+            current_client.set(ClientContext(client_identity(request.headers, client_ip, transport.client_keys)))
+
+            # 截止时间，传递给排队和上游请求
+            deadline = Deadline.from_request(request.headers.get("x-mcp-timeout"), body)
+            current_deadline.set(deadline)
+
+            # 会话，watch订阅和SSE通知依赖它
+            session_id = request.headers.get("mcp-session-id")
+            session = None
+            if session_id:
+                session = transport.sessions.get(session_id)
+                if session is None:
+                    error_response = self._error(self._message_id(body), -32600, "Session not found")
+                    await self._send_json(send, 404, error_response, start_time)
+                    return
+                current_session.set(session)
+
+            # 处理MCP消息，按需剖析并记录耗时
+            profiler = transport.profiler
+            profile_requested = request.headers.get("x-mcp-profile") == "1" and transport._is_admin(request)
+            with profiler.profile(profiler.should_profile(profile_requested)) as capture:
+                response = await transport._run_cancellable(
+                    self._wait_disconnect(receive),
+                    transport._dispatch(body, deadline),
+                    deadline
+                )
+            profiler.record(transport._describe_message(body), loop.time() - start_time, capture)
+
+            headers = list(self._cors_headers)
+            if session is None and isinstance(body, dict) and body.get("method") == "initialize" \
+                    and isinstance(response, dict) and "result" in response:
+                session = transport.sessions.create(current_client.get().id)
+                headers.append((b"mcp-session-id", session.id.encode("latin-1")))
+            if capture is not None:
+                headers.append((b"x-profile-id", capture.profile_id.encode("latin-1")))
+            if timings:
+                headers.append((b"server-timing", format_server_timing(timings).encode("latin-1")))
+
+            if response is None:
+                # 通知消息没有响应体
+                await self._send(send, 202, b"", headers, start_time)
+            elif "text/event-stream" in request.headers.get("accept", ""):
+                # 单个事件的SSE流式响应
+                headers.append((b"content-type", b"text/event-stream"))
+                headers.append((b"cache-control", b"no-cache"))
+                await self._send(send, 200, b"data: " + dumps(response) + b"\n\n", headers, start_time)
+            else:
+                headers.append((b"content-type", b"application/json"))
+                await self._send(send, 200, dumps(response), headers, start_time)
+
+        except ClientDisconnected:
+            error_handler.log_info("DISCONNECT", "客户端已断开，已取消上游请求", {"client_ip": client_ip})
+            await self._send(send, 499, b"", list(self._cors_headers), start_time)
+
+        except Overloaded as e:
+            error_handler.log_warning("OVERLOAD", str(e), {"client_ip": client_ip})
+            headers = [(b"retry-after", str(e.retry_after).encode("latin-1"))]
+            if transport.draining:
+                # 让客户端在其他实例上重建连接
+                headers.append((b"connection", b"close"))
+            error_response = self._error(self._message_id(body), -32002, "Server overloaded", str(e))
+            await self._send_json(send, 503, error_response, start_time, headers)
+
+        except DeadlineExceeded as e:
+            error_response = error_handler.handle_exception(e, {"url": self.path, "client_ip": client_ip})
+            error_response.update({"jsonrpc": "2.0", "id": self._message_id(body)})
+            await self._send_json(send, 504, error_response, start_time)
+
+        except Exception as e:
+            error_handler.log_error(
+                "ERROR",
+                f"MCP处理错误: {str(e)}",
+                {
+                    "url": self.path,
+                    "method": "POST",
+                    "client_ip": client_ip
+                }
+            )
+            await self._send_json(send, 500, self._error(None, -32603, "Internal error", str(e)), start_time)
+
+    def _find_session(self, request: RawRequest) -> Tuple[Optional[Session], int]:
+        """按Mcp-Session-Id头部查找会话，找不到时返回对应的状态码"""
+        session_id = request.headers.get("mcp-session-id")
+        if not session_id:
+            return None, 400
+        session = self.transport.sessions.get(session_id)
+        return session, 404 if session is None else 200
+
+    async def _handle_stream(self, scope, receive, send):
+        """会话的SSE流，推送服务器主动发出的通知"""
+        session, status = self._find_session(RawRequest(scope))
+        if session is None:
+            message = "Missing Mcp-Session-Id header" if status == 400 else "Session not found"
+            await self._send_json(send, status, self._error(None, -32600, message), None)
+            return
+        if session.streaming:
+            # 每个会话只有一个SSE流，避免同一条通知被多个流分走
+            await self._send_json(send, 409, self._error(None, -32600, "Stream already open for session"), None)
+            return
+
+        session.streaming = True
+        disconnected = asyncio.ensure_future(self._wait_disconnect(receive))
+        headers = self._cors_headers + [
+            (b"content-type", b"text/event-stream"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ]
+        try:
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            # 排空时结束流，客户端重新连接到其他实例
+            while not (session.closed or self.transport.draining or disconnected.done()):
+                for message in session.drain():
+                    event = b"event: message\ndata: " + message + b"\n\n"
+                    await send({"type": "http.response.body", "body": event, "more_body": True})
+                waiter = asyncio.ensure_future(session.wait())
+                done, _ = await asyncio.wait(
+                    {waiter, disconnected}, timeout=self.SSE_KEEPALIVE, return_when=asyncio.FIRST_COMPLETED
+                )
+                waiter.cancel()
+                if not done:
+                    await send({"type": "http.response.body", "body": b": ping\n\n", "more_body": True})
+            if not disconnected.done():
+                await send({"type": "http.response.body", "body": b""})
+        except OSError:
+            # 客户端已断开，未发送的通知随流丢弃
+            pass
+        finally:
+            session.streaming = False
+            session.touch()
+            disconnected.cancel()
+
+    async def _handle_delete(self, scope, send):
+        """结束会话，会话的watch订阅随之取消"""
+        session, status = self._find_session(RawRequest(scope))
+        if session is None:
+            message = "Missing Mcp-Session-Id header" if status == 400 else "Session not found"
+            await self._send_json(send, status, self._error(None, -32600, message), None)
+            return
+        self.transport.sessions.close(session.id)
+        # 204响应不能带Content-Length
+        await send({"type": "http.response.start", "status": 204, "headers": list(self._cors_headers)})
+        await send({"type": "http.response.body", "body": b""})
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        """读取完整请求体"""
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise ClientDisconnected()
+        body = message.get("body", b"")
+        if not message.get("more_body", False):
+            return body
+
+        chunks = [body]
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise ClientDisconnected()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    @staticmethod
+    async def _wait_disconnect(receive):
+        """请求体读完后，下一条消息只会是http.disconnect"""
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    @staticmethod
+    def _message_id(body: Any) -> Any:
+        return body.get("id") if isinstance(body, dict) else None
+
+    @staticmethod
+    def _error(msg_id: Any, code: int, message: str, data: Any = None) -> Dict[str, Any]:
+        return {
+            "jsonrpc": "2.0",
+            "error": {"code": code, "message": message, "data": data},
+            "id": msg_id
+        }
+
+    async def _send_json(self, send, status: int, payload: Any, start_time: Optional[float], headers: Headers = ()):
+        """写出带CORS头部的JSON响应"""
+        headers = self._cors_headers + list(headers)
+        headers.append((b"content-type", b"application/json"))
+        await self._send(send, status, dumps(payload), headers, start_time)
+
+    @staticmethod
+    async def _send(send, status: int, body: bytes, headers: Headers, start_time: Optional[float] = None):
+        """写出完整响应"""
+        headers.append((b"content-length", str(len(body)).encode("latin-1")))
+        if start_time is not None:
+            process_time = asyncio.get_event_loop().time() - start_time
+            headers.append((b"x-process-time", str(process_time).encode("latin-1")))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,130 @@
+"""
+进程级内存预算
+
+每个工具调用在处理期间会同时持有上游响应正文的多份副本(原始字节、解码后的文本、
+序列化后的结果)，并发调用一多，峰值内存就没有上限。这里为所有进行中的调用设置
+一个共享的字节预算:
+
+- 响应带Content-Length时在读取正文之前按长度预留，否则在读取过程中按块预留
+- 预算不足时等待其他调用释放，等待超过 ``max_wait`` 秒(0表示不等待)后以过载拒绝
+- 预留的字节在工具调用结束时统一释放
+
+预留量按正文长度乘以 ``BODY_COPIES`` 估算，只用于限制峰值，不是精确的内存统计。
+"""
+
+import asyncio
+import contextvars
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+from .admission import Overloaded
+from .metrics import MetricsRegistry
+
+
+# 处理期间同时存在的正文副本数: 原始字节、解码后的文本、序列化后的结果
+BODY_COPIES = 3
+
+
+class MemoryBudget:
+    """所有进行中的工具调用共享的字节预算"""
+
+    def __init__(
+        self,
+        max_bytes: int = 0,
+        max_wait: float = 5.0,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
+        # max_bytes为0时不限制，只统计
+        self.max_bytes = max_bytes
+        self.max_wait = max_wait
+        self.used = 0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+
+        metrics = metrics or MetricsRegistry()
+        metrics.gauge("memory_budget_used_bytes", "进行中的调用预留的内存", lambda: self.used)
+        metrics.gauge("memory_budget_limit_bytes", "内存预算上限，0表示不限制", lambda: self.max_bytes)
+        metrics.gauge("memory_budget_waiting", "等待内存预算的调用数", lambda: len(self._waiters))
+        self._wait_time = metrics.summary("memory_budget_wait_seconds", "等待内存预算的时间")
+        self._rejected = metrics.counter("memory_budget_rejected_total", "因内存预算不足被拒绝的调用数")
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def _fits(self, size: int) -> bool:
+        return not self.max_bytes or self.used + size <= self.max_bytes
+
+    async def reserve(self, size: int, timeout: Optional[float] = None):
+        """预留size字节，预算不足时按FIFO等待，超时抛出Overloaded"""
+        if size <= 0:
+            return
+        if self.max_bytes and size > self.max_bytes:
+            self._rejected.inc(reason="too_large")
+            raise ValueError(f"响应过大，超出内存预算 ({size} > {self.max_bytes}字节)")
+        if not self._waiters and self._fits(size):
+            self.used += size
+            return
+
+        wait = self.max_wait if timeout is None else min(self.max_wait, timeout)
+        if wait <= 0:
+            self._rejected.inc(reason="exhausted")
+            raise Overloaded("服务器内存预算已用尽", retry_after=1)
+
+        waiter = asyncio.get_event_loop().create_future()
+        entry = (size, waiter)
+        self._waiters.append(entry)
+        start_time = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, wait)
+        except BaseException as e:
+            try:
+                self._waiters.remove(entry)
+            except ValueError:
+                pass
+            # 预算已移交但等待方已放弃时归还
+            if waiter.done() and not waiter.cancelled():
+                self.release(size)
+            if isinstance(e, asyncio.TimeoutError):
+                self._rejected.inc(reason="timeout")
+                raise Overloaded("服务器内存预算已用尽，等待超时", retry_after=max(1, int(wait + 0.999)))
+            raise
+        finally:
+            self._wait_time.observe(time.monotonic() - start_time)
+
+    def release(self, size: int):
+        """归还预算，按顺序唤醒能够满足的等待方"""
+        self.used -= size
+        while self._waiters:
+            size, waiter = self._waiters[0]
+            if waiter.done():
+                self._waiters.popleft()
+                continue
+            if not self._fits(size):
+                break
+            self._waiters.popleft()
+            self.used += size
+            waiter.set_result(None)
+
+
+class Lease:
+    """单个工具调用持有的预算，调用结束时一次性归还"""
+
+    def __init__(self, budget: MemoryBudget):
+        self.budget = budget
+        self.reserved = 0
+
+    async def reserve(self, size: int, timeout: Optional[float] = None):
+        await self.budget.reserve(size, timeout)
+        self.reserved += size
+
+    def release(self):
+        if self.reserved:
+            self.budget.release(self.reserved)
+            self.reserved = 0
+
+
+# 当前工具调用的预算租约，由FetchMCPServer.call_tool设置
+current_lease: contextvars.ContextVar[Optional[Lease]] = contextvars.ContextVar(
+    "current_lease", default=None
+)
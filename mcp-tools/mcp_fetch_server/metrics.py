@@ -0,0 +1,168 @@
+"""
+进程内指标注册表
+
+以Prometheus文本格式输出计数器、仪表和摘要，不依赖prometheus_client。
+仪表可以注册回调函数，在抓取时读取当前值，避免在热路径上维护状态。
+"""
+
+import math
+import threading
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, value.replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in key
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    """完整精度输出样本值，:g只保留6位有效数字，大计数器会停滞或跳变"""
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    """指标基类"""
+
+    metric_type = "untyped"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    metric_type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+
+class Gauge(_Metric):
+    """可增可减的仪表，支持抓取时回调取值"""
+
+    metric_type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        callback: Optional[Callable[[], Union[float, Dict[LabelKey, float]]]] = None,
+    ):
+        super().__init__(name, help_text)
+        self.callback = callback
+
+    def set(self, value: float, **labels: str):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        if self.callback is None:
+            return super().samples()
+        result = self.callback()
+        if isinstance(result, dict):
+            return [(self.name, key, value) for key, value in result.items()]
+        return [(self.name, (), float(result))]
+
+
+class Summary(_Metric):
+    """只记录总和与次数的摘要"""
+
+    metric_type = "summary"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._counts: Dict[LabelKey, float] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+            self._counts[key] = self._counts.get(key, 0.0) + 1
+
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        with self._lock:
+            sums = [(self.name + "_sum", key, value) for key, value in self._values.items()]
+            counts = [(self.name + "_count", key, value) for key, value in self._counts.items()]
+        return sums + counts
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self, prefix: str = "mcp_"):
+        self.prefix = prefix
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._register(Counter(self.prefix + name, help_text))
+
+    def gauge(self, name: str, help_text: str, callback=None) -> Gauge:
+        return self._register(Gauge(self.prefix + name, help_text, callback))
+
+    def summary(self, name: str, help_text: str) -> Summary:
+        return self._register(Summary(self.prefix + name, help_text))
+
+    @staticmethod
+    def labels(**labels: str) -> LabelKey:
+        """为仪表回调构造标签键"""
+        return _label_key(labels)
+
+    def render(self) -> str:
+        """输出Prometheus文本格式"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+            for name, key, value in metric.samples():
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,155 @@
+"""
+不可达主机的负缓存
+
+客户端经常反复请求同一个已经失效的URL，每次都要等完整的DNS解析或连接超时才失败。
+``NegativeCache`` 按上游主机(含端口)和失败类型记录最近的失败:
+
+- ``nxdomain``: 域名解析失败
+- ``refused``: 连接被拒绝
+- ``unreachable``: 网络或主机不可达等其他连接错误
+- ``tls``: TLS握手或证书校验失败
+- ``timeout``: 建立连接超时
+
+失败后的一段时间内，对同一主机的请求不再访问上游，直接以 ``HostUnavailable`` 失败。
+时长从失败类型的基础值开始，随连续失败次数翻倍，不超过 ``max_ttl``。期限过后的
+下一个请求会真正访问上游；主机一旦成功响应(任何HTTP状态码)，它的失败记录全部清除。
+读取正文超时和HTTP错误状态不计入，它们不代表主机不可达。
+"""
+
+import errno
+import socket
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from .metrics import MetricsRegistry
+
+
+# 各失败类型的基础时长(秒)
+BASE_TTLS = {
+    "nxdomain": 30.0,
+    "refused": 5.0,
+    "unreachable": 10.0,
+    "tls": 60.0,
+    "timeout": 10.0,
+}
+
+FAILURE_LABELS = {
+    "nxdomain": "域名解析失败",
+    "refused": "拒绝连接",
+    "unreachable": "不可达",
+    "tls": "TLS握手失败",
+    "timeout": "连接超时",
+}
+
+
+class HostUnavailable(ConnectionError):
+    """主机在负缓存中，请求未发往上游"""
+
+    def __init__(self, message: str, failure: str, retry_after: float):
+        super().__init__(message)
+        self.failure = failure
+        self.retry_after = retry_after
+
+
+def classify(error: BaseException) -> Optional[str]:
+    """判断异常是否表示主机不可达，返回失败类型"""
+    import aiohttp
+
+    dns_error = getattr(aiohttp, "ClientConnectorDNSError", None)
+    connect_timeout = getattr(aiohttp, "ConnectionTimeoutError", None)
+    if isinstance(error, aiohttp.ClientSSLError):
+        return "tls"
+    if dns_error is not None and isinstance(error, dns_error):
+        return "nxdomain"
+    if connect_timeout is not None and isinstance(error, connect_timeout):
+        return "timeout"
+    if isinstance(error, aiohttp.ClientConnectorError):
+        os_error = error.os_error
+        # aiohttp 3.10之前的DNS错误没有单独的异常类型
+        if isinstance(os_error, socket.gaierror):
+            return "nxdomain"
+        if isinstance(os_error, ConnectionRefusedError):
+            return "refused"
+        if isinstance(os_error, TimeoutError) or getattr(os_error, "errno", None) == errno.ETIMEDOUT:
+            return "timeout"
+        return "unreachable"
+    return None
+
+
+class _Failure:
+    __slots__ = ("count", "until", "message")
+
+    def __init__(self):
+        self.count = 0
+        self.until = 0.0
+        self.message = ""
+
+
+class NegativeCache:
+    """按主机和失败类型记录连续失败，期限内的请求立即失败"""
+
+    def __init__(
+        self,
+        max_ttl: float = 300.0,
+        max_hosts: int = 4096,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
+        # max_ttl为0时不缓存失败
+        self.max_ttl = max_ttl
+        self.max_hosts = max_hosts
+        # 主机 -> 失败类型 -> 失败记录
+        self._hosts: "OrderedDict[str, Dict[str, _Failure]]" = OrderedDict()
+
+        metrics = metrics or MetricsRegistry()
+        metrics.gauge("negative_cache_hosts", "负缓存中仍在期限内的主机数", self._active_hosts)
+        self._hits = metrics.counter("negative_cache_hits_total", "因负缓存直接失败的请求数")
+        self._failures = metrics.counter("negative_cache_failures_total", "按类型统计的主机不可达失败数")
+
+    def check(self, host: str):
+        """主机在期限内时抛出HostUnavailable"""
+        failures = self._hosts.get(host)
+        if not failures:
+            return
+        now = time.monotonic()
+        failure, entry = max(failures.items(), key=lambda item: item[1].until)
+        if entry.until <= now:
+            return
+        retry_after = entry.until - now
+        self._hits.inc(failure=failure)
+        raise HostUnavailable(
+            f"{host} 最近{FAILURE_LABELS[failure]}(连续{entry.count}次)，"
+            f"{retry_after:.0f}秒内不再请求: {entry.message}",
+            failure,
+            retry_after,
+        )
+
+    def record(self, host: str, error: BaseException) -> Optional[Tuple[str, float]]:
+        """记录一次失败，不表示主机不可达的错误忽略，返回(失败类型, 时长)"""
+        if self.max_ttl <= 0:
+            return None
+        failure = classify(error)
+        if failure is None:
+            return None
+        failures = self._hosts.get(host)
+        if failures is None:
+            while len(self._hosts) >= self.max_hosts:
+                self._hosts.popitem(last=False)
+            failures = self._hosts[host] = {}
+        else:
+            self._hosts.move_to_end(host)
+        entry = failures.setdefault(failure, _Failure())
+        entry.count += 1
+        ttl = min(self.max_ttl, BASE_TTLS[failure] * 2 ** min(entry.count - 1, 16))
+        entry.until = time.monotonic() + ttl
+        entry.message = str(error)
+        self._failures.inc(failure=failure)
+        return failure, ttl
+
+    def success(self, host: str):
+        """主机成功响应，清除失败记录"""
+        self._hosts.pop(host, None)
+
+    def _active_hosts(self) -> int:
+        now = time.monotonic()
+        return sum(1 for failures in self._hosts.values() if any(f.until > now for f in failures.values()))
@@ -0,0 +1,96 @@
+"""
+大正文的分页与token估算
+
+``fetch`` 指定 ``max_length`` 时只返回正文中从 ``start_index`` 开始的一段字符，并给出
+下一段的起点 ``next_start_index``。还有后续分页时，解码后的完整正文按请求缓存在
+``PageCache`` 中，客户端带着游标继续调用不会重新请求上游。
+
+缓存按字节数上限和存活时间淘汰，过期或被淘汰后的翻页请求会重新请求上游。
+"""
+
+import hashlib
+import json
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .metrics import MetricsRegistry
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数: ASCII字符约4个一个token，其他字符(主要是CJK)约一个字符一个token"""
+    length = len(text)
+    if text.isascii():
+        return (length + 3) // 4
+    # CJK字符在UTF-8中占3字节，多出的字节数的一半近似为非ASCII字符数
+    non_ascii = (len(text.encode("utf-8")) - length) // 2
+    return (length - non_ascii + 3) // 4 + non_ascii
+
+
+def page(content: str, start_index: int = 0, max_length: Optional[int] = None) -> Dict[str, Any]:
+    """返回正文中从start_index开始的一段及分页信息"""
+    end = len(content) if max_length is None else start_index + max_length
+    return {
+        "body": content[start_index:end],
+        "start_index": start_index,
+        "total_length": len(content),
+        "next_start_index": end if end < len(content) else None,
+    }
+
+
+def request_key(method: str, url: str, headers: Optional[Dict[str, str]], body: Optional[str]) -> str:
+    """同一请求的缓存键，请求头不区分顺序和大小写"""
+    normalized = sorted((name.lower(), value) for name, value in (headers or {}).items())
+    raw = json.dumps([method.upper(), url, normalized, body], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class PageCache:
+    """按请求缓存解码后的完整正文，供后续分页使用"""
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 300.0,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
+        # max_bytes为0时不缓存，每次翻页都重新请求上游
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        # 键 -> (过期时间, 占用字节数, 响应信息, 正文)，按最近使用排序
+        self._entries: "OrderedDict[str, Tuple[float, int, Dict[str, Any], str]]" = OrderedDict()
+
+        metrics = metrics or MetricsRegistry()
+        metrics.gauge("page_cache_bytes", "分页缓存占用的内存", lambda: self.size)
+        metrics.gauge("page_cache_entries", "分页缓存中的正文数", lambda: len(self._entries))
+        self._lookups = metrics.counter("page_cache_lookups_total", "分页缓存查找次数")
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        """返回缓存的(响应信息, 正文)，不存在或已过期时返回None"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self._lookups.inc(result="miss")
+            return None
+        self._entries.move_to_end(key)
+        self._lookups.inc(result="hit")
+        return entry[2], entry[3]
+
+    def put(self, key: str, info: Dict[str, Any], content: str):
+        # 字符串对象的实际内存，CJK文本每个字符占2或4字节
+        size = sys.getsizeof(content)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, size, info, content)
+        self.size += size
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        self.size -= self._entries.pop(key)[1]
@@ -0,0 +1,141 @@
+"""
+请求级性能剖析
+
+为HTTP传输提供三类剖析能力:
+- 按请求头或采样率对单个请求启用cProfile剖析
+- 对事件循环线程做定时墙钟采样，输出可直接生成火焰图的折叠栈
+- 保存最慢的N个请求(附带剖析结果)的缓冲区
+"""
+
+import cProfile
+import heapq
+import io
+import itertools
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class ProfileCapture:
+    """单次剖析的结果容器"""
+
+    def __init__(self, profile_id: str):
+        self.profile_id = profile_id
+        self.text: Optional[str] = None
+
+
+class RequestProfiler:
+    """请求剖析器，管理单请求剖析和慢请求缓冲区"""
+
+    def __init__(
+        self,
+        sample_rate: float = 0.0,
+        slow_capacity: int = 20,
+        top_functions: int = 30,
+        max_profiles: int = 50,
+    ):
+        self.sample_rate = max(0.0, min(sample_rate, 1.0))
+        self.slow_capacity = slow_capacity
+        self.top_functions = top_functions
+        self.max_profiles = max_profiles
+        # cProfile在同一线程内同时只能有一个生效，事件循环线程里需要互斥
+        self._active = False
+        self._slowest: List[tuple] = []
+        self._counter = itertools.count()
+        self._profiles: "OrderedDict[str, str]" = OrderedDict()
+
+    def should_profile(self, requested: bool = False) -> bool:
+        """判断当前请求是否需要剖析"""
+        if self._active:
+            return False
+        if requested:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    @contextmanager
+    def profile(self, enabled: bool) -> Iterator[Optional[ProfileCapture]]:
+        """剖析上下文；enabled为False时不产生任何开销
+
+        注意: 剖析期间事件循环上运行的其他协程也会被计入结果。
+        """
+        if not enabled or self._active:
+            yield None
+            return
+
+        capture = ProfileCapture(uuid.uuid4().hex[:16])
+        profiler = cProfile.Profile()
+        self._active = True
+        profiler.enable()
+        try:
+            yield capture
+        finally:
+            profiler.disable()
+            self._active = False
+            capture.text = self._format_stats(profiler)
+            self._profiles[capture.profile_id] = capture.text
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+
+    def _format_stats(self, profiler: cProfile.Profile) -> str:
+        """将剖析结果格式化为按累计时间排序的文本"""
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats("cumulative").print_stats(self.top_functions)
+        return stream.getvalue()
+
+    def get_profile(self, profile_id: str) -> Optional[str]:
+        """按ID获取最近的剖析结果"""
+        return self._profiles.get(profile_id)
+
+    def record(self, label: str, duration: float, capture: Optional[ProfileCapture] = None):
+        """记录请求耗时，仅保留最慢的N个"""
+        if self.slow_capacity <= 0:
+            return
+
+        entry = {
+            "label": label,
+            "duration": duration,
+            "timestamp": time.time(),
+            "profile_id": capture.profile_id if capture else None,
+            "profile": capture.text if capture else None,
+        }
+        item = (duration, next(self._counter), entry)
+        if len(self._slowest) < self.slow_capacity:
+            heapq.heappush(self._slowest, item)
+        elif duration > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, item)
+
+    def slowest(self) -> List[Dict[str, Any]]:
+        """按耗时从高到低返回慢请求列表"""
+        return [entry for _, _, entry in sorted(self._slowest, reverse=True)]
+
+
+def sample_stacks(thread_id: int, duration: float, interval: float = 0.005) -> str:
+    """对指定线程做墙钟采样，返回折叠栈文本
+
+    每行格式为 ``frame1;frame2;...;frameN count``，可直接交给
+    flamegraph.pl 或 speedscope 生成火焰图。该函数会阻塞调用线程，
+    应在线程池中运行。
+    """
+    counts: Counter = Counter()
+    current = threading.get_ident()
+    deadline = time.monotonic() + duration
+
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None and thread_id != current:
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            counts[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+
+    return "\n".join(f"{stack} {count}" for stack, count in counts.most_common())
@@ -0,0 +1,237 @@
+"""
+响应缓存与后台刷新
+
+``fetch`` 和 ``fetch_json`` 的GET请求结果按HTTP缓存语义保存在 ``ResponseCache`` 中:
+
+- 新鲜期取上游的 ``Cache-Control: s-maxage/max-age``，没有时使用服务器配置的 ``ttl``
+  (默认0，即只缓存上游声明可缓存的响应)。``no-store``、``no-cache`` 和 ``private`` 的响应不缓存
+- 过期后的 ``stale-while-revalidate`` 窗口内直接返回旧内容，同时由 ``BackgroundRefresher``
+  在后台刷新一次，请求不等待上游
+- 过期后的 ``stale-if-error`` 窗口内，前台请求失败(连接错误、超时或5xx)时返回旧内容
+- 两个窗口优先使用响应中的同名指令，``must-revalidate`` 的响应不返回过期内容
+
+后台刷新与前台请求共用上游连接和主机并发上限，因此同时进行的刷新不超过 ``concurrency``
+个，且上游主机没有空闲名额时推迟刷新(下一次命中过期内容时再安排)，不与前台请求争抢。
+刷新带有ETag或Last-Modified时发送条件请求，304只延长新鲜期。启动时的预热URL列表也通过
+同一个刷新队列加载。
+"""
+
+import asyncio
+import contextvars
+import logging
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from .metrics import MetricsRegistry
+
+
+logger = logging.getLogger(__name__)
+
+# 默认可缓存的状态码(RFC 9110 15.1)
+CACHEABLE_STATUSES = frozenset({200, 203, 204, 300, 301, 308, 404, 405, 410, 414, 501})
+
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    """解析Cache-Control头部，指令名转为小写"""
+    directives: Dict[str, Optional[str]] = {}
+    for part in (value or "").split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip().strip('"') or None
+    return directives
+
+
+def _seconds(value: Optional[str]) -> Optional[float]:
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+class CachedResponse:
+    """缓存的响应，时间均为time.monotonic()"""
+
+    __slots__ = ("info", "content", "size", "stored_at", "fresh_until", "stale_until", "error_until")
+
+    def __init__(self, info: Dict[str, Any], content: str, size: int, stored_at: float,
+                 fresh_until: float, stale_until: float, error_until: float):
+        self.info = info
+        self.content = content
+        self.size = size
+        self.stored_at = stored_at
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+        self.error_until = error_until
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.stored_at
+
+    @property
+    def validators(self) -> Dict[str, str]:
+        """刷新时使用的条件请求头部"""
+        headers = {name.lower(): value for name, value in self.info["headers"].items()}
+        validators = {}
+        if "etag" in headers:
+            validators["If-None-Match"] = headers["etag"]
+        if "last-modified" in headers:
+            validators["If-Modified-Since"] = headers["last-modified"]
+        return validators
+
+
+class ResponseCache:
+    """按请求缓存的响应，超出字节上限时淘汰最久未使用的响应"""
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 0.0,
+        stale_while_revalidate: float = 60.0,
+        stale_if_error: float = 300.0,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
+        # max_bytes为0时不缓存
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_if_error = stale_if_error
+        self.size = 0
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+
+        metrics = metrics or MetricsRegistry()
+        metrics.gauge("response_cache_bytes", "响应缓存占用的内存", lambda: self.size)
+        metrics.gauge("response_cache_entries", "响应缓存中的响应数", lambda: len(self._entries))
+        self.lookups = metrics.counter("response_cache_lookups_total", "按结果统计的响应缓存查找次数")
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def lookup(self, key: str) -> Tuple[Optional[CachedResponse], Optional[str]]:
+        """返回缓存的响应及其状态: fresh、stale(可后台刷新)、expired(只在出错时可用)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, None
+        now = time.monotonic()
+        if now >= max(entry.stale_until, entry.error_until):
+            self._remove(key)
+            return None, None
+        self._entries.move_to_end(key)
+        if now < entry.fresh_until:
+            return entry, "fresh"
+        if now < entry.stale_until:
+            return entry, "stale"
+        return entry, "expired"
+
+    def put(self, key: str, info: Dict[str, Any], content: str) -> bool:
+        """按响应头部计算新鲜期后保存，不可缓存时返回False"""
+        if not self.enabled or info["status"] not in CACHEABLE_STATUSES:
+            return False
+        headers = {name.lower(): value for name, value in info["headers"].items()}
+        directives = parse_cache_control(headers.get("cache-control"))
+        if {"no-store", "no-cache", "private"} & directives.keys():
+            return False
+        ttl = _seconds(directives.get("s-maxage"))
+        if ttl is None:
+            ttl = _seconds(directives.get("max-age"))
+        if ttl is None:
+            ttl = self.ttl
+        if ttl <= 0:
+            return False
+
+        if "must-revalidate" in directives or "proxy-revalidate" in directives:
+            swr = sie = 0.0
+        else:
+            swr = _seconds(directives.get("stale-while-revalidate"))
+            sie = _seconds(directives.get("stale-if-error"))
+            swr = self.stale_while_revalidate if swr is None else swr
+            sie = self.stale_if_error if sie is None else sie
+
+        size = sys.getsizeof(content)
+        if size > self.max_bytes:
+            return False
+        if key in self._entries:
+            self._remove(key)
+        now = time.monotonic()
+        fresh_until = now + ttl
+        self._entries[key] = CachedResponse(
+            info, content, size, now, fresh_until, fresh_until + swr, fresh_until + sie
+        )
+        self.size += size
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+        return True
+
+    def revalidated(self, key: str, entry: CachedResponse, headers: Dict[str, str]):
+        """条件请求返回304时，以旧正文和新的缓存头部重新计算新鲜期"""
+        merged = {**entry.info["headers"], **headers}
+        self.put(key, {**entry.info, "headers": merged}, entry.content)
+
+    def _remove(self, key: str):
+        self.size -= self._entries.pop(key).size
+
+
+class BackgroundRefresher:
+    """后台刷新队列: 按键去重，限制并发，上游主机繁忙时推迟"""
+
+    def __init__(
+        self,
+        has_headroom: Callable[[str], bool],
+        concurrency: int = 2,
+        max_pending: int = 1024,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
+        self.has_headroom = has_headroom
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pending: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+        metrics = metrics or MetricsRegistry()
+        metrics.gauge("refresh_pending", "排队和进行中的后台刷新数", lambda: len(self._pending))
+        self._results = metrics.counter("refresh_total", "按结果统计的后台刷新次数")
+
+    def schedule(self, key: str, host: str, refresh: Callable[[], Awaitable[bool]]) -> bool:
+        """安排一次刷新，同一键已在队列中或队列已满时返回False"""
+        if key in self._pending or len(self._pending) >= self.max_pending:
+            return False
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._pending.add(key)
+        # 在空上下文中运行，不继承触发刷新的请求的截止时间、内存租约和客户端
+        task = contextvars.Context().run(asyncio.ensure_future, self._run(key, host, refresh))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _run(self, key: str, host: str, refresh: Callable[[], Awaitable[bool]]):
+        try:
+            async with self._semaphore:
+                if not self.has_headroom(host):
+                    self._results.inc(result="deferred")
+                    return
+                try:
+                    ok = await refresh()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.debug(f"后台刷新失败: {host}: {e}")
+                    ok = False
+                self._results.inc(result="ok" if ok else "error")
+        finally:
+            self._pending.discard(key)
+
+    async def join(self):
+        """等待当前所有刷新完成"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def stop(self):
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._pending.clear()
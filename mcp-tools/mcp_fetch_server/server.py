@@ -6,25 +6,46 @@ MCP Fetch Streamable HTTP Server
 支持JSON-RPC 2.0协议，兼容MCP Streamable HTTP传输规范。
 """
 
+from __future__ import annotations
+
 import asyncio
 import json
 import logging
-from typing import Dict, Any, Optional
-from urllib.parse import urlparse
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Any, Literal, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
 
-import aiohttp
-from aiohttp import ClientResponseError, ClientConnectionError
-from mcp.server import Server
-from mcp.server.models import InitializationOptions
-from mcp.server.stdio import stdio_server
-from mcp.types import Tool, TextContent, ImageContent, EmbeddedResource
 from pydantic import BaseModel, Field
 
+from .admission import Overloaded
+from .charset import CharsetResolver
+from .clients import ClientContext, current_client
+from .codec import dumps
+from .content_store import ContentStore, content_digest
+from .deadline import current_deadline
+from .diffing import Snapshot, SnapshotStore, compute_diff
 from .error_handler import ErrorHandler
+from .eventloop import run
+from .grep import StreamSearcher, compile_pattern, search_chunks
+from .host_limits import CONGESTION_STATUSES, HostLimiter
+from .memory_budget import BODY_COPIES, Lease, MemoryBudget, current_lease
+from .metrics import MetricsRegistry
+from .negative_cache import NegativeCache
+from .pagination import PageCache, estimate_tokens, page, request_key
+from .refresh import BackgroundRefresher, CachedResponse, ResponseCache
+from .sessions import current_session
+from .shaping import FieldSelector, HeaderSelector, check_fields, select_fields, select_headers
+from .tracing import UpstreamTiming, create_trace_config, current_trace, timing_collector
+from .watch import WatchScheduler
+
+# aiohttp和MCP SDK导入开销较大，延迟到首次使用时导入以缩短冷启动时间
+if TYPE_CHECKING:
+    import aiohttp
+    from mcp.types import TextContent, ImageContent, EmbeddedResource
 
 
-# 配置日志
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
@@ -34,7 +55,14 @@ class FetchRequest(BaseModel):
     method: str = Field("GET", description="HTTP方法")
     headers: Optional[Dict[str, str]] = Field(None, description="请求头")
     body: Optional[str] = Field(None, description="请求体")
-    timeout: Optional[int] = Field(30, description="超时时间(秒)")
+    timeout: Optional[int] = Field(30, description="总超时时间(秒)")
+    connect_timeout: Optional[float] = Field(None, description="连接超时时间(秒)，默认使用服务器配置")
+    read_timeout: Optional[float] = Field(None, description="两次读取之间的超时时间(秒)，默认使用服务器配置")
+    max_length: Optional[int] = Field(None, gt=0, description="最多返回的正文字符数，超出部分通过start_index分页获取")
+    start_index: int = Field(0, ge=0, description="从正文的第几个字符开始返回，取上一次结果中的next_start_index")
+    include_headers: HeaderSelector = Field("default", description="返回的响应头: default(常用响应头)、none、all或响应头名称列表")
+    fields: FieldSelector = Field("default", description="返回的结果字段: default(常用字段)、all或字段名列表")
+    body_ref: bool = Field(False, description="已完整收到过相同正文时只返回摘要，通过get_content取回正文")
 
 
 class FetchJSONRequest(BaseModel):
@@ -43,60 +71,222 @@ class FetchJSONRequest(BaseModel):
     method: str = Field("GET", description="HTTP方法")
     headers: Optional[Dict[str, str]] = Field(None, description="请求头")
     body: Optional[str] = Field(None, description="请求体")
-    timeout: Optional[int] = Field(30, description="超时时间(秒)")
+    timeout: Optional[int] = Field(30, description="总超时时间(秒)")
+    connect_timeout: Optional[float] = Field(None, description="连接超时时间(秒)，默认使用服务器配置")
+    read_timeout: Optional[float] = Field(None, description="两次读取之间的超时时间(秒)，默认使用服务器配置")
+    include_headers: HeaderSelector = Field("default", description="返回的响应头: default(常用响应头)、none、all或响应头名称列表")
+    fields: FieldSelector = Field("default", description="返回的结果字段: default(常用字段)、all或字段名列表")
+
+
+class FetchDiffRequest(BaseModel):
+    """Fetch diff请求模型"""
+    url: str = Field(..., description="要获取的URL")
+    method: str = Field("GET", description="HTTP方法")
+    headers: Optional[Dict[str, str]] = Field(None, description="请求头")
+    body: Optional[str] = Field(None, description="请求体")
+    timeout: Optional[int] = Field(30, description="总超时时间(秒)")
+    connect_timeout: Optional[float] = Field(None, description="连接超时时间(秒)，默认使用服务器配置")
+    read_timeout: Optional[float] = Field(None, description="两次读取之间的超时时间(秒)，默认使用服务器配置")
+    format: Literal["auto", "text", "json"] = Field("auto", description="差异格式: text为unified diff，json为JSON Patch，auto按Content-Type选择")
+    context: int = Field(3, ge=0, description="unified diff的上下文行数")
+
+
+class FetchGrepRequest(BaseModel):
+    """Fetch grep请求模型"""
+    url: str = Field(..., description="要获取的URL")
+    method: str = Field("GET", description="HTTP方法")
+    headers: Optional[Dict[str, str]] = Field(None, description="请求头")
+    body: Optional[str] = Field(None, description="请求体")
+    timeout: Optional[int] = Field(30, description="总超时时间(秒)")
+    connect_timeout: Optional[float] = Field(None, description="连接超时时间(秒)，默认使用服务器配置")
+    read_timeout: Optional[float] = Field(None, description="两次读取之间的超时时间(秒)，默认使用服务器配置")
+    pattern: str = Field(..., description="要查找的文本，regex为true时是Python正则表达式")
+    regex: bool = Field(False, description="pattern是否为正则表达式")
+    ignore_case: bool = Field(False, description="是否忽略大小写")
+    context: int = Field(2, ge=0, le=10, description="每个匹配前后返回的行数")
+    max_matches: int = Field(20, gt=0, le=1000, description="找到这么多匹配后停止读取上游")
+
+
+class GetContentRequest(BaseModel):
+    """按摘要取回正文的请求模型"""
+    digest: str = Field(..., description="fetch结果中的digest或body_ref")
+    max_length: Optional[int] = Field(None, gt=0, description="最多返回的正文字符数")
+    start_index: int = Field(0, ge=0, description="从正文的第几个字符开始返回")
+
+
+class WatchRequest(BaseModel):
+    """watch订阅请求模型"""
+    url: str = Field(..., description="要监视的URL")
+    headers: Optional[Dict[str, str]] = Field(None, description="请求头")
+    interval: float = Field(60.0, gt=0, description="轮询间隔(秒)，不小于服务器配置的最小间隔")
+
+
+class UnwatchRequest(BaseModel):
+    """取消watch订阅的请求模型"""
+    subscription_id: str = Field(..., description="watch返回的subscription_id")
+
+
+# 工具结果的全部字段和默认返回的字段，重定向后默认字段还包括最终的url
+FETCH_FIELDS = (
+    "status", "headers", "body", "url", "method", "size", "timing",
+    "tokens", "start_index", "total_length", "next_start_index", "cached", "digest", "body_ref", "cache", "age",
+)
+FETCH_DEFAULT_FIELDS = (
+    "status", "headers", "body", "tokens", "start_index", "total_length", "next_start_index", "digest", "body_ref",
+    "cache", "age",
+)
+FETCH_JSON_FIELDS = ("status", "headers", "body", "raw_body", "url", "method", "size", "timing", "cache", "age")
+FETCH_JSON_DEFAULT_FIELDS = ("status", "headers", "body", "cache", "age")
+
+# 带有这些请求头的请求不使用响应缓存
+UNCACHED_REQUEST_HEADERS = frozenset({"if-none-match", "if-modified-since", "if-match", "if-unmodified-since", "range"})
 
 
 class FetchMCPServer:
     """MCP Fetch Streamable HTTP服务器"""
     
-    def __init__(self, server_name: str = "mcp-fetch-server"):
+    # 客户端未声明协议版本时使用
+    PROTOCOL_VERSION = "2025-03-26"
+    
+    # 按块读取上游正文时的块大小
+    BODY_CHUNK_SIZE = 64 * 1024
+    
+    def __init__(
+        self,
+        server_name: str = "mcp-fetch-server",
+        trace_export: bool = False,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 30.0,
+        upstream_initial_limit: int = 10,
+        upstream_max_limit: int = 100,
+        memory_budget: int = 0,
+        memory_budget_wait: float = 5.0,
+        page_cache_size: int = 64 * 1024 * 1024,
+        page_cache_ttl: float = 300.0,
+        content_store_size: int = 64 * 1024 * 1024,
+        snapshot_store_size: int = 32 * 1024 * 1024,
+        watch_min_interval: float = 5.0,
+        response_cache_size: int = 64 * 1024 * 1024,
+        cache_ttl: float = 0.0,
+        stale_while_revalidate: float = 60.0,
+        stale_if_error: float = 300.0,
+        refresh_concurrency: int = 2,
+        warm_urls: Sequence[str] = (),
+        negative_cache_max_ttl: float = 300.0,
+    ):
         """初始化MCP服务器"""
         self.server_name = server_name
+        # 默认的连接超时和读取超时，可被单次请求覆盖
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        # 是否将上游请求导出为opentelemetry span
+        self.trace_export = trace_export
         self.error_handler = ErrorHandler()
+        self.metrics = MetricsRegistry()
+        # 每个上游主机的并发上限随观测延迟自适应调整
+        self.host_limiter = HostLimiter(
+            initial_limit=upstream_initial_limit,
+            max_limit=upstream_max_limit,
+            metrics=self.metrics
+        )
+        # 所有进行中的工具调用共享的正文内存预算，0表示只统计不限制
+        self.memory_budget = MemoryBudget(
+            max_bytes=memory_budget,
+            max_wait=memory_budget_wait,
+            metrics=self.metrics
+        )
+        # 分页获取的正文缓存，翻页时不再请求上游
+        self.page_cache = PageCache(
+            max_bytes=page_cache_size,
+            ttl=page_cache_ttl,
+            metrics=self.metrics
+        )
+        # 按内容摘要保存的正文，客户端已收到过的正文只返回摘要
+        self.content_store = ContentStore(max_bytes=content_store_size, metrics=self.metrics)
+        # fetch_diff按客户端和请求保存的上次内容
+        self.snapshots = SnapshotStore(max_bytes=snapshot_store_size, metrics=self.metrics)
+        # 最近不可达的主机，期限内的请求不访问上游直接失败
+        self.negative_cache = NegativeCache(max_ttl=negative_cache_max_ttl, metrics=self.metrics)
+        # GET请求的响应缓存，过期内容在后台刷新，上游出错时可返回过期内容
+        self.response_cache = ResponseCache(
+            max_bytes=response_cache_size,
+            ttl=cache_ttl,
+            stale_while_revalidate=stale_while_revalidate,
+            stale_if_error=stale_if_error,
+            metrics=self.metrics
+        )
+        self.refresher = BackgroundRefresher(
+            self.host_limiter.has_headroom,
+            concurrency=refresh_concurrency,
+            metrics=self.metrics
+        )
+        # 启动时在后台预先加载的URL
+        self.warm_urls = list(warm_urls)
+        # watch订阅按URL合并，由一个后台任务轮询
+        self.watcher = WatchScheduler(self._poll, min_interval=watch_min_interval, metrics=self.metrics)
+        # 未声明字符集的正文只检测前缀样本，检测结果按主机缓存
+        self.charset = CharsetResolver(metrics=self.metrics)
         self.session: Optional[aiohttp.ClientSession] = None
-        self.mcp = Server(server_name)
-        self._setup_tools()
-        self._setup_handlers()
+        # MCP SDK导入耗时数百毫秒，首次访问self.mcp时才创建
+        self._mcp = None
+        self._mcp_lock = threading.Lock()
+        # 工具注册表: 名称 -> (描述, 参数模型, 处理函数)，HTTP传输直接据此分发
+        self.tools = {
+            "fetch": ("获取任意URL的内容，支持各种HTTP方法和选项", FetchRequest, self._handle_fetch),
+            "fetch_json": ("获取JSON内容并解析为结构化数据", FetchJSONRequest, self._handle_fetch_json),
+            "get_content": ("按摘要取回fetch以body_ref代替的正文", GetContentRequest, self._handle_get_content),
+            "fetch_diff": ("获取URL内容相对上次调用的变化: 文本返回unified diff，JSON返回JSON Patch", FetchDiffRequest, self._handle_fetch_diff),
+            "watch": ("监视URL的变化，变化时通过会话的SSE流推送notifications/resources/updated通知", WatchRequest, self._handle_watch),
+            "unwatch": ("取消watch订阅", UnwatchRequest, self._handle_unwatch),
+            "fetch_grep": ("在URL内容中查找文本或正则表达式，只返回匹配的行及其上下文，找到足够的匹配后停止读取", FetchGrepRequest, self._handle_fetch_grep),
+        }
+        # 生成JSON Schema需要数毫秒，工具定义只构建一次
+        self._tool_definitions: Optional[list[Dict[str, Any]]] = None
+    
+    @property
+    def mcp(self):
+        """MCP SDK服务器实例"""
+        if self._mcp is None:
+            with self._mcp_lock:
+                if self._mcp is None:
+                    from mcp.server import Server
+                    
+                    mcp = Server(self.server_name)
+                    self._setup_tools(mcp)
+                    self._setup_handlers(mcp)
+                    self._mcp = mcp
+        return self._mcp
+    
+    def preload(self):
+        """预先导入aiohttp和MCP SDK，可在后台线程调用，避免首个请求承担导入开销"""
+        import aiohttp  # noqa: F401
+        
+        self.mcp
     
-    def _setup_tools(self):
+    def _setup_tools(self, mcp):
         """设置MCP工具"""
+        from mcp.types import Tool
         
-        @self.mcp.list_tools()
+        @mcp.list_tools()
         async def list_tools() -> list[Tool]:
             """列出可用的工具"""
-            return [
-                Tool(
-                    name="fetch",
-                    description="获取任意URL的内容，支持各种HTTP方法和选项",
-                    inputSchema=FetchRequest.model_json_schema()
-                ),
-                Tool(
-                    name="fetch_json",
-                    description="获取JSON内容并解析为结构化数据",
-                    inputSchema=FetchJSONRequest.model_json_schema()
-                )
-            ]
+            return [Tool(**tool) for tool in self.list_tools()]
         
-        @self.mcp.call_tool()
+        @mcp.call_tool()
         async def call_tool(name: str, arguments: Dict[str, Any]) -> list[TextContent | ImageContent | EmbeddedResource]:
             """调用工具"""
-            if name == "fetch":
-                return await self._handle_fetch(arguments)
-            elif name == "fetch_json":
-                return await self._handle_fetch_json(arguments)
-            else:
-                raise ValueError(f"未知的工具: {name}")
+            return await self.call_tool(name, arguments)
     
-    def _setup_handlers(self):
+    def _setup_handlers(self, mcp):
         """设置事件处理器"""
         
-        @self.mcp.list_tools()
+        @mcp.list_tools()
         async def handle_list_tools():
             """处理工具列表请求"""
             self.error_handler.log_info("TOOLS", "列出可用工具")
             return {"tools": [self.fetch_tool, self.fetch_json_tool]}
         
-        @self.mcp.call_tool()
+        @mcp.call_tool()
         async def handle_call_tool(name: str, arguments: dict) -> dict:
             """处理工具调用请求"""
             self.error_handler.log_info("TOOLS", f"调用工具: {name}")
@@ -108,158 +298,695 @@ class FetchMCPServer:
             else:
                 raise ValueError(f"未知工具: {name}")
     
+    def list_tools(self) -> list[Dict[str, Any]]:
+        """列出可用的工具定义"""
+        if self._tool_definitions is None:
+            self._tool_definitions = [
+                {
+                    "name": name,
+                    "description": description,
+                    "inputSchema": model.model_json_schema()
+                }
+                for name, (description, model, _) in self.tools.items()
+            ]
+        return self._tool_definitions
+    
+    async def call_tool(self, name: str, arguments: Optional[Dict[str, Any]]) -> list[TextContent]:
+        """调用工具"""
+        if name not in self.tools:
+            raise ValueError(f"未知的工具: {name}")
+        _, _, handler = self.tools[name]
+        # 调用期间读取的正文计入内存预算，调用结束时统一归还
+        lease = Lease(self.memory_budget)
+        token = current_lease.set(lease)
+        try:
+            return await handler(arguments or {})
+        finally:
+            current_lease.reset(token)
+            lease.release()
+    
+    async def handle_message(self, message: Any) -> Optional[Dict[str, Any]]:
+        """处理单条JSON-RPC消息，通知消息返回None"""
+        if not isinstance(message, dict) or not isinstance(message.get("method"), str):
+            return self._jsonrpc_error(None, -32600, "Invalid Request")
+        
+        msg_id = message.get("id")
+        method = message["method"]
+        params = message.get("params") or {}
+        if msg_id is None:
+            # 通知(如notifications/initialized)无需响应
+            return None
+        
+        try:
+            if method == "initialize":
+                result = {
+                    "protocolVersion": params.get("protocolVersion", self.PROTOCOL_VERSION),
+                    "capabilities": {"tools": {"listChanged": False}},
+                    "serverInfo": {"name": self.server_name, "version": "1.0.0"}
+                }
+            elif method == "ping":
+                result = {}
+            elif method == "tools/list":
+                result = {"tools": self.list_tools()}
+            elif method == "tools/call":
+                content = await self.call_tool(params.get("name"), params.get("arguments"))
+                result = {
+                    "content": [item.model_dump(exclude_none=True) for item in content],
+                    "isError": False
+                }
+            else:
+                return self._jsonrpc_error(msg_id, -32601, "Method not found", method)
+        except ValueError as e:
+            return self._jsonrpc_error(msg_id, -32602, "Invalid params", str(e))
+        
+        return {"jsonrpc": "2.0", "id": msg_id, "result": result}
+    
+    @staticmethod
+    def _jsonrpc_error(msg_id: Any, code: int, message: str, data: Any = None) -> Dict[str, Any]:
+        """构建JSON-RPC错误响应"""
+        error: Dict[str, Any] = {"code": code, "message": message}
+        if data is not None:
+            error["data"] = data
+        return {"jsonrpc": "2.0", "id": msg_id, "error": error}
+    
     async def _ensure_session(self):
         """确保会话已创建"""
+        import aiohttp
+        
         if self.session is None or self.session.closed:
             self.session = aiohttp.ClientSession(
-                timeout=aiohttp.ClientTimeout(total=60),
-                headers={"User-Agent": f"{self.server_name}/1.0.0"}
+                timeout=aiohttp.ClientTimeout(
+                    total=None,
+                    sock_connect=self.connect_timeout,
+                    sock_read=self.read_timeout
+                ),
+                headers={"User-Agent": f"{self.server_name}/1.0.0"},
+                trace_configs=[create_trace_config()]
             )
     
-    async def _handle_fetch(self, arguments: Dict[str, Any]) -> list[TextContent]:
-        """处理fetch工具调用"""
-        try:
-            request = FetchRequest(**arguments)
-            
-            # 验证URL
-            if not self.error_handler.validate_url(request.url):
-                raise ValueError(f"无效的URL: {request.url}")
-            
-            # 记录请求
-            self.error_handler.log_request(
-                method=request.method,
-                url=request.url,
-                client_ip="mcp-client"
+    def connection_pool(self) -> Dict[str, Any]:
+        """上游连接池的使用情况，limit为None表示会话尚未创建或不限制连接数"""
+        limit = None
+        if self.session is not None and not self.session.closed:
+            limit = self.session.connector.limit or None
+        return {"in_use": self.host_limiter.in_flight, "limit": limit}
+    
+    def _client_timeout(self, request: FetchRequest | FetchJSONRequest | FetchDiffRequest | FetchGrepRequest) -> aiohttp.ClientTimeout:
+        """构建单次请求的超时配置，总超时不超过请求截止时间"""
+        import aiohttp
+        
+        total = float(request.timeout or 30)
+        deadline = current_deadline.get()
+        if deadline is not None:
+            total = deadline.clamp(total)
+        
+        return aiohttp.ClientTimeout(
+            total=total,
+            sock_connect=request.connect_timeout or self.connect_timeout,
+            sock_read=request.read_timeout or self.read_timeout
+        )
+    
+    async def _perform_request(
+        self,
+        request: FetchRequest | FetchJSONRequest | FetchDiffRequest | FetchGrepRequest,
+        consume: Optional[Callable[[aiohttp.ClientResponse, str], Awaitable[Tuple[Any, int]]]] = None
+    ) -> Tuple[Dict[str, Any], Any]:
+        """执行上游请求，返回响应信息和文本内容
+        
+        指定consume时由它读取响应正文，返回(内容, 读取的字节数)，用于不缓冲完整正文的工具
+        """
+        # 验证URL
+        if not self.error_handler.validate_url(request.url):
+            raise ValueError(f"无效的URL: {request.url}")
+        
+        # 按调用方区分日志和速率限制
+        client = current_client.get()
+        client_id = self._client_id()
+        
+        # 记录请求
+        self.error_handler.log_request(
+            method=request.method,
+            url=request.url,
+            client_ip=client_id
+        )
+        
+        # 检查速率限制
+        if not self.error_handler.check_rate_limit(client_id):
+            raise ValueError("请求过于频繁，请稍后再试")
+        
+        # 最近DNS解析失败或连接失败的主机直接失败，不再等待超时
+        host = urlsplit(request.url).netloc.lower()
+        self.negative_cache.check(host)
+        
+        # 确保会话存在
+        await self._ensure_session()
+        
+        # 记录各阶段耗时，并向上游传播traceparent
+        timing = UpstreamTiming(current_trace.get())
+        if self.trace_export:
+            timing.start_span(
+                f"upstream {request.method}",
+                {"http.request.method": request.method, "url.full": request.url}
             )
+        headers = dict(request.headers or {})
+        timing.inject(headers)
+        
+        # 超过主机并发上限时排队，排队时间不超过请求的总超时
+        queue_timeout = float(request.timeout or 30)
+        deadline = current_deadline.get()
+        if deadline is not None:
+            queue_timeout = deadline.clamp(queue_timeout)
+        
+        status = None
+        error = None
+        acquired = False
+        clamped = False
+        try:
+            timing.begin("queue")
+            in_flight = await self.host_limiter.acquire(host, queue_timeout)
+            timing.end("queue")
+            acquired = True
+            start_time = time.monotonic()
             
-            # 检查速率限制
-            if not self.error_handler.check_rate_limit("mcp-client"):
-                raise ValueError("请求过于频繁，请稍后再试")
-            
-            # 确保会话存在
-            await self._ensure_session()
+            # 总超时被客户端的截止时间缩短时，超时可能只是客户端给的时间不够
+            client_timeout = self._client_timeout(request)
+            clamped = deadline is not None and client_timeout.total < float(request.timeout or 30)
             
             # 执行请求
             async with self.session.request(
                 method=request.method,
                 url=request.url,
-                headers=request.headers or {},
+                headers=headers,
                 data=request.body.encode() if request.body else None,
-                timeout=aiohttp.ClientTimeout(total=request.timeout or 30)
+                timeout=client_timeout,
+                trace_request_ctx=timing
             ) as response:
+                status = response.status
+                timing.begin("body")
+                if consume is not None:
+                    content, size = await consume(response, host)
+                else:
+                    body = await self._read_body(response)
+                    content = self.charset.decode(body, response.content_type, response.charset, host)
+                    size = len(body)
+                    # 原始字节已不再需要，尽早释放
+                    del body
+                timing.end("body")
                 
-                content = await response.text()
-                
-                # 构建结果
-                result = {
+                info = {
                     "status": response.status,
                     "headers": dict(response.headers),
-                    "body": content,
                     "url": str(response.url),
                     "method": request.method,
-                    "size": len(content.encode('utf-8'))
+                    "size": size
                 }
+                if client is not None:
+                    client.bytes_fetched += info["size"]
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            # 客户端截止时间到期导致的超时不代表上游拥塞或不可达
+            deadline_expired = clamped and isinstance(error, asyncio.TimeoutError) and deadline.expired
+            if acquired:
+                self._release_host(host, in_flight, time.monotonic() - start_time, status, error, deadline_expired)
+            if status is not None:
+                self.negative_cache.success(host)
+            elif error is not None and not deadline_expired:
+                self.negative_cache.record(host, error)
+            timing.finish(status, error)
+            collector = timing_collector.get()
+            if collector is not None:
+                collector.append(timing)
+        
+        info["timing"] = timing.to_dict()
+        return info, content
+    
+    def _cache_key(self, request: FetchRequest | FetchJSONRequest) -> Optional[str]:
+        """可使用响应缓存的请求的缓存键: 没有请求体的GET，且没有条件请求或no-cache请求头"""
+        if not self.response_cache.enabled or request.method.upper() != "GET" or request.body:
+            return None
+        for name, value in (request.headers or {}).items():
+            name = name.lower()
+            if name in UNCACHED_REQUEST_HEADERS:
+                return None
+            if name in ("cache-control", "pragma") and "no-cache" in value.lower():
+                return None
+        return request_key(request.method, request.url, request.headers, None)
+    
+    async def _fetch_cached(self, request: FetchRequest | FetchJSONRequest) -> Tuple[Dict[str, Any], str]:
+        """经过响应缓存执行请求，缓存命中时响应信息中带有cache和age"""
+        key = self._cache_key(request)
+        if key is None:
+            return await self._perform_request(request)
+        
+        lookups = self.response_cache.lookups
+        entry, state = self.response_cache.lookup(key)
+        if state in ("fresh", "stale"):
+            if state == "stale":
+                # 先返回过期内容，由后台刷新
+                self._schedule_refresh(key, request, entry)
+            lookups.inc(result=state)
+            return self._cached_info(entry, state), entry.content
+        
+        try:
+            info, content = await self._perform_request(request)
+        except Overloaded:
+            raise
+        except Exception:
+            if entry is None:
+                raise
+            lookups.inc(result="stale_if_error")
+            return self._cached_info(entry, "stale_if_error"), entry.content
+        if entry is not None and info["status"] >= 500:
+            lookups.inc(result="stale_if_error")
+            return self._cached_info(entry, "stale_if_error"), entry.content
+        
+        lookups.inc(result="miss")
+        self.response_cache.put(key, info, content)
+        return info, content
+    
+    @staticmethod
+    def _cached_info(entry: CachedResponse, state: str) -> Dict[str, Any]:
+        return {**entry.info, "timing": {}, "cache": state, "age": int(entry.age)}
+    
+    @staticmethod
+    def _add_cache_fields(result: Dict[str, Any], info: Dict[str, Any]):
+        """来自响应缓存的结果带上缓存状态和缓存时长(秒)"""
+        if "cache" in info:
+            result["cache"] = info["cache"]
+            result["age"] = info["age"]
+    
+    def _schedule_refresh(
+        self,
+        key: str,
+        request: FetchRequest | FetchJSONRequest,
+        entry: Optional[CachedResponse] = None
+    ) -> bool:
+        host = urlsplit(request.url).netloc.lower()
+        return self.refresher.schedule(key, host, lambda: self._refresh(key, request, entry))
+    
+    async def _refresh(self, key: str, request: FetchRequest | FetchJSONRequest, entry: Optional[CachedResponse]) -> bool:
+        """后台刷新一个缓存的响应，有缓存时发送条件请求"""
+        current_client.set(ClientContext("refresh"))
+        if entry is not None:
+            request = request.model_copy(update={"headers": {**(request.headers or {}), **entry.validators}})
+        info, content = await self._perform_request(request)
+        if entry is not None and info["status"] == 304:
+            self.response_cache.revalidated(key, entry, info["headers"])
+            return True
+        if info["status"] >= 500:
+            # 保留旧内容，供stale-if-error使用
+            return False
+        self.response_cache.put(key, info, content)
+        return True
+    
+    async def _read_body(self, response: aiohttp.ClientResponse) -> bytes:
+        """读取响应正文，按Content-Length或逐块从内存预算中预留"""
+        lease = current_lease.get()
+        if lease is None:
+            return await response.read()
+        
+        deadline = current_deadline.get()
+        timeout = deadline.remaining() if deadline is not None else None
+        reserved = response.content_length or 0
+        if reserved:
+            await lease.reserve(reserved * BODY_COPIES, timeout)
+        
+        chunks = []
+        received = 0
+        async for chunk in response.content.iter_chunked(self.BODY_CHUNK_SIZE):
+            received += len(chunk)
+            if received > reserved:
+                # 没有Content-Length或解压后超出声明长度时，按块补充预留
+                extra = max(received - reserved, self.BODY_CHUNK_SIZE)
+                await lease.reserve(extra * BODY_COPIES, timeout)
+                reserved += extra
+            chunks.append(chunk)
+        return b"".join(chunks)
+    
+    def _release_host(
+        self,
+        host: str,
+        in_flight: int,
+        rtt: float,
+        status: Optional[int],
+        error: Optional[BaseException],
+        deadline_expired: bool = False
+    ):
+        """归还主机并发名额，超时、连接错误和过载响应使上限收缩
+        
+        deadline_expired表示超时由客户端的截止时间引起，只归还名额，不收缩共享的上限
+        """
+        import aiohttp
+        
+        congested = not deadline_expired and (status in CONGESTION_STATUSES or isinstance(
+            error, (asyncio.TimeoutError, aiohttp.ClientConnectionError)
+        ))
+        # 被取消或其他错误的请求耗时不代表上游延迟，不参与调整
+        sample = rtt if error is None else None
+        self.host_limiter.release(host, sample, in_flight, congested)
+    
+    async def _handle_fetch(self, arguments: Dict[str, Any]) -> list[TextContent]:
+        """处理fetch工具调用"""
+        try:
+            request = FetchRequest(**arguments)
+            # 字段名写错时不必请求上游
+            check_fields(request.fields, FETCH_FIELDS)
+            paginate = request.max_length is not None or request.start_index > 0
+            key = request_key(request.method, request.url, request.headers, request.body) if paginate else None
+            
+            # 翻页请求优先使用缓存的正文
+            cached = self.page_cache.get(key) if request.start_index > 0 else None
+            if cached is not None:
+                info, content = cached
+                info = {**info, "timing": {}}
+            else:
+                info, content = await self._fetch_cached(request)
+            
+            # 构建结果
+            result = {
+                "status": info["status"],
+                "headers": info["headers"],
+                "body": content,
+                "url": info["url"],
+                "method": info["method"],
+                "size": info["size"],
+                "timing": info["timing"]
+            }
+            self._add_cache_fields(result, info)
+            
+            if paginate:
+                result.update(page(content, request.start_index, request.max_length))
+                result["cached"] = cached is not None
+                if result["next_start_index"] is not None and cached is None:
+                    self.page_cache.put(key, info, content)
+            if request.body_ref:
+                digest = content_digest(content)
+                result["digest"] = digest
+                # 只有一次拿到完整正文才算客户端已收到
+                complete = request.start_index == 0 and result.get("next_start_index") is None
+                if self.content_store.add(digest, content, self._client_id(), complete):
+                    del result["body"]
+                    result["body_ref"] = digest
+            if "body" in result and (request.fields in ("default", "all") or "tokens" in request.fields):
+                result["tokens"] = estimate_tokens(result["body"])
+            
+            return self._text_content(self._shape(result, request, FETCH_DEFAULT_FIELDS, FETCH_FIELDS))
                 
-                return [TextContent(type="text", text=json.dumps(result, ensure_ascii=False, indent=2))]
-                
+        except Overloaded:
+            # 内存预算用尽属于过载，交给传输层返回503和Retry-After
+            raise
         except Exception as e:
-            error_result = self.error_handler.handle_exception(e, request.url, request.method)
-            return [TextContent(type="text", text=json.dumps(error_result, ensure_ascii=False, indent=2))]
+            error_result = self.error_handler.handle_exception(e, self._error_context(arguments))
+            return self._text_content(error_result)
     
-    async def _handle_fetch_json(self, arguments: Dict[str, Any]) -> list[TextContent]:
-        """处理fetch_json工具调用"""
+    async def _handle_get_content(self, arguments: Dict[str, Any]) -> list[TextContent]:
+        """处理get_content工具调用"""
         try:
-            request = FetchJSONRequest(**arguments)
+            request = GetContentRequest(**arguments)
+            content = self.content_store.get(request.digest)
+            if content is None:
+                raise ValueError(f"内容不存在或已被淘汰，请重新fetch: {request.digest}")
             
-            # 验证URL
-            if not self.error_handler.validate_url(request.url):
-                raise ValueError(f"无效的URL: {request.url}")
-            
-            # 记录请求
-            self.error_handler.log_request(
-                method=request.method,
-                url=request.url,
-                client_ip="mcp-client"
-            )
+            result = {"digest": request.digest, **page(content, request.start_index, request.max_length)}
+            result["tokens"] = estimate_tokens(result["body"])
+            return self._text_content(result)
+        
+        except Exception as e:
+            error_result = self.error_handler.handle_exception(e, {"digest": arguments.get("digest")})
+            return self._text_content(error_result)
+    
+    async def _handle_fetch_diff(self, arguments: Dict[str, Any]) -> list[TextContent]:
+        """处理fetch_diff工具调用"""
+        try:
+            request = FetchDiffRequest(**arguments)
+            key = self._client_id() + ":" + request_key(request.method, request.url, request.headers, request.body)
+            snapshot = self.snapshots.get(key)
             
-            # 检查速率限制
-            if not self.error_handler.check_rate_limit("mcp-client"):
-                raise ValueError("请求过于频繁，请稍后再试")
+            # 有快照时发送条件请求，304表示未变化
+            if snapshot is not None and (snapshot.etag or snapshot.last_modified):
+                headers = dict(request.headers or {})
+                if snapshot.etag:
+                    headers["If-None-Match"] = snapshot.etag
+                if snapshot.last_modified:
+                    headers["If-Modified-Since"] = snapshot.last_modified
+                request = request.model_copy(update={"headers": headers})
+            info, content = await self._perform_request(request)
+            status = info["status"]
+            if snapshot is not None and status == 304:
+                self.snapshots.results.inc(result="not_modified")
+                return self._text_content({"status": status, "changed": False, "reason": "not_modified"})
+            if not 200 <= status < 300:
+                # 错误响应不更新快照，原样返回
+                return self._text_content({"status": status, "body": content, "tokens": estimate_tokens(content)})
             
-            # 确保会话存在
-            await self._ensure_session()
+            digest = content_digest(content)
+            if snapshot is not None and snapshot.digest == digest:
+                self.snapshots.results.inc(result="unchanged")
+                return self._text_content({"status": status, "changed": False, "reason": "unchanged"})
             
-            # 执行请求
-            async with self.session.request(
-                method=request.method,
-                url=request.url,
-                headers=request.headers or {},
-                data=request.body.encode() if request.body else None,
-                timeout=aiohttp.ClientTimeout(total=request.timeout or 30)
-            ) as response:
-                
-                content = await response.text()
-                
-                # 尝试解析JSON
+            headers = {name.lower(): value for name, value in info["headers"].items()}
+            fmt = request.format
+            if fmt == "auto":
+                mimetype = headers.get("content-type", "").split(";")[0].strip().lower()
+                fmt = "json" if mimetype == "application/json" or mimetype.endswith("+json") else "text"
+            if fmt == "json":
                 try:
-                    json_data = json.loads(content)
+                    value = json.loads(content)
                 except json.JSONDecodeError as e:
                     raise ValueError(f"响应内容不是有效的JSON: {str(e)}")
+            else:
+                value = content
+            
+            result: Dict[str, Any] = {"status": status, "changed": True, "format": fmt}
+            if snapshot is None or snapshot.format != fmt:
+                # 第一次调用返回完整内容作为基准
+                self.snapshots.results.inc(result="first")
+                result["body"] = value
+                result["tokens"] = estimate_tokens(content)
+            else:
+                self.snapshots.results.inc(result="changed")
+                diff = await compute_diff(snapshot.value, value, fmt, len(content), request.context)
+                if fmt == "json":
+                    result["patch"] = diff
+                else:
+                    result["diff"] = diff
+                    result["tokens"] = estimate_tokens(diff)
+            
+            self.snapshots.put(key, Snapshot(
+                fmt, value, digest, headers.get("etag"), headers.get("last-modified"), len(content)
+            ))
+            return self._text_content(result)
                 
-                # 构建结果
-                result = {
-                    "status": response.status,
-                    "headers": dict(response.headers),
-                    "body": json_data,
-                    "raw_body": content,
-                    "url": str(response.url),
-                    "method": request.method,
-                    "size": len(content.encode('utf-8'))
-                }
-                
-                return [TextContent(type="text", text=json.dumps(result, ensure_ascii=False, indent=2))]
+        except Overloaded:
+            raise
+        except Exception as e:
+            error_result = self.error_handler.handle_exception(e, self._error_context(arguments))
+            return self._text_content(error_result)
+    
+    async def _handle_watch(self, arguments: Dict[str, Any]) -> list[TextContent]:
+        """处理watch工具调用"""
+        try:
+            request = WatchRequest(**arguments)
+            session = current_session.get()
+            if session is None:
+                raise ValueError("watch需要Streamable HTTP会话，请在initialize后携带Mcp-Session-Id头部")
+            if not self.error_handler.validate_url(request.url):
+                raise ValueError(f"无效的URL: {request.url}")
+            key = request_key("GET", request.url, request.headers, None)
+            subscription = self.watcher.subscribe(session, key, request.url, dict(request.headers or {}), request.interval)
+            return self._text_content({
+                "subscription_id": subscription.id,
+                "interval": subscription.interval,
+                "subscribers": self.watcher.subscribers(key),
+            })
+        except Exception as e:
+            error_result = self.error_handler.handle_exception(e, self._error_context(arguments))
+            return self._text_content(error_result)
+    
+    async def _handle_unwatch(self, arguments: Dict[str, Any]) -> list[TextContent]:
+        """处理unwatch工具调用"""
+        try:
+            request = UnwatchRequest(**arguments)
+            session = current_session.get()
+            if session is None or not self.watcher.unsubscribe(request.subscription_id, session):
+                raise ValueError(f"订阅不存在或已随会话结束: {request.subscription_id}")
+            return self._text_content({"subscription_id": request.subscription_id, "removed": True})
+        except Exception as e:
+            error_result = self.error_handler.handle_exception(e, {"subscription_id": arguments.get("subscription_id")})
+            return self._text_content(error_result)
+    
+    async def _handle_fetch_grep(self, arguments: Dict[str, Any]) -> list[TextContent]:
+        """处理fetch_grep工具调用"""
+        try:
+            request = FetchGrepRequest(**arguments)
+            pattern = compile_pattern(request.pattern, request.regex, request.ignore_case)
+            searcher = StreamSearcher(pattern, request.context, request.max_matches)
+            
+            async def consume(response: aiohttp.ClientResponse, host: str) -> Tuple[StreamSearcher, int]:
+                # 只缓冲当前块和当前行，按一个块的大小从内存预算中预留
+                lease = current_lease.get()
+                if lease is not None:
+                    deadline = current_deadline.get()
+                    await lease.reserve(
+                        self.BODY_CHUNK_SIZE * BODY_COPIES, deadline.remaining() if deadline is not None else None
+                    )
+                size = await search_chunks(
+                    response.content.iter_chunked(self.BODY_CHUNK_SIZE),
+                    searcher,
+                    lambda sample: self.charset.incremental_decoder(
+                        sample, response.content_type, response.charset, host
+                    ),
+                    self.charset.sample_size,
+                )
+                return searcher, size
+            
+            info, _ = await self._perform_request(request, consume)
+            result: Dict[str, Any] = {"status": info["status"]}
+            if info["url"] != request.url:
+                result["url"] = info["url"]
+            result.update({
+                "matches": searcher.matches,
+                "count": len(searcher.matches),
+                # complete为false表示提前停止，正文后面可能还有匹配
+                "complete": searcher.complete,
+                "scanned_bytes": info["size"],
+            })
+            result["tokens"] = estimate_tokens(dumps(searcher.matches).decode("utf-8"))
+            return self._text_content(result)
+        
+        except Overloaded:
+            raise
+        except Exception as e:
+            error_result = self.error_handler.handle_exception(e, self._error_context(arguments))
+            return self._text_content(error_result)
+    
+    async def _poll(self, url: str, headers: Dict[str, str]) -> Tuple[int, Dict[str, str], Optional[str]]:
+        """watch的轮询请求，按独立的客户端计入速率限制"""
+        current_client.set(ClientContext("watch"))
+        info, content = await self._perform_request(FetchRequest(url=url, headers=headers))
+        digest = content_digest(content) if 200 <= info["status"] < 300 else None
+        return info["status"], info["headers"], digest
+    
+    async def _handle_fetch_json(self, arguments: Dict[str, Any]) -> list[TextContent]:
+        """处理fetch_json工具调用"""
+        try:
+            request = FetchJSONRequest(**arguments)
+            check_fields(request.fields, FETCH_JSON_FIELDS)
+            info, content = await self._fetch_cached(request)
+            
+            # 尝试解析JSON
+            try:
+                json_data = json.loads(content)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"响应内容不是有效的JSON: {str(e)}")
+            
+            # 构建结果
+            result = {
+                "status": info["status"],
+                "headers": info["headers"],
+                "body": json_data,
+                "raw_body": content,
+                "url": info["url"],
+                "method": info["method"],
+                "size": info["size"],
+                "timing": info["timing"]
+            }
+            self._add_cache_fields(result, info)
+            
+            return self._text_content(self._shape(result, request, FETCH_JSON_DEFAULT_FIELDS, FETCH_JSON_FIELDS))
                 
+        except Overloaded:
+            # 内存预算用尽属于过载，交给传输层返回503和Retry-After
+            raise
         except Exception as e:
-            error_result = self.error_handler.handle_exception(e, request.url, request.method)
-            return [TextContent(type="text", text=json.dumps(error_result, ensure_ascii=False, indent=2))]
+            error_result = self.error_handler.handle_exception(e, self._error_context(arguments))
+            return self._text_content(error_result)
+    
+    @staticmethod
+    def _client_id() -> str:
+        """当前调用的客户端，没有客户端信息时(stdio)共用一个键"""
+        client = current_client.get()
+        return client.id if client is not None else "mcp-client"
+    
+    @staticmethod
+    def _shape(
+        result: Dict[str, Any],
+        request: FetchRequest | FetchJSONRequest,
+        default: Tuple[str, ...],
+        available: Tuple[str, ...]
+    ) -> Dict[str, Any]:
+        """按请求的include_headers和fields选择结果中的响应头和字段"""
+        headers = select_headers(result["headers"], request.include_headers)
+        if headers is None:
+            del result["headers"]
+        else:
+            result["headers"] = headers
+        if result["url"] != request.url:
+            default += ("url",)
+        return select_fields(result, request.fields, default, available)
+    
+    @staticmethod
+    def _text_content(payload: Dict[str, Any]) -> list[TextContent]:
+        """将结果序列化为紧凑的MCP文本内容"""
+        from mcp.types import TextContent
+        
+        return [TextContent(type="text", text=dumps(payload).decode("utf-8"))]
+    
+    @staticmethod
+    def _error_context(arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """构建错误日志上下文，参数校验失败时也可用"""
+        return {
+            "url": arguments.get("url"),
+            "method": arguments.get("method", "GET")
+        }
     
     async def start(self):
-        """启动服务器"""
+        """启动服务器，上游会话在首次请求时创建，预热URL在后台加载"""
         self.error_handler.log_info("STARTUP", "启动MCP Fetch服务器")
-        await self._ensure_session()
+        self.warm_up()
+    
+    def warm_up(self) -> int:
+        """通过后台刷新队列加载预热URL，返回安排的数量"""
+        scheduled = 0
+        for url in self.warm_urls:
+            request = FetchRequest(url=url)
+            key = self._cache_key(request)
+            if key is None or not self.error_handler.validate_url(url):
+                continue
+            scheduled += self._schedule_refresh(key, request)
+        if scheduled:
+            self.error_handler.log_info("STARTUP", f"后台预热 {scheduled} 个URL")
+        return scheduled
     
     async def stop(self):
         """停止服务器"""
         self.error_handler.log_info("SHUTDOWN", "停止MCP Fetch服务器")
+        await self.watcher.stop()
+        await self.refresher.stop()
         if self.session and not self.session.closed:
             await self.session.close()
     
-    async def run_stdio(self):
-        """运行stdio服务器"""
+    async def run_stdio(self, max_concurrency: int = 16):
+        """运行stdio服务器，最多同时执行max_concurrency个工具调用"""
+        from .stdio_transport import StdioTransport
+        
         await self.start()
         try:
-            async with stdio_server() as (read_stream, write_stream):
-                await self.mcp.run(
-                    read_stream,
-                    write_stream,
-                    InitializationOptions(
-                        server_name=self.server_name,
-                        server_version="1.0.0",
-                        capabilities={"tools": {"listChanged": True}}
-                    )
-                )
+            await StdioTransport(self, max_concurrency=max_concurrency).serve()
         finally:
             await self.stop()
 
 
-# 创建全局服务器实例
-server = FetchMCPServer()
-
-
 async def main():
     """主函数"""
-    await server.run_stdio()
+    # stdout用于stdio传输，日志只能输出到stderr
+    logging.basicConfig(level=logging.INFO)
+    warm_urls = [url.strip() for url in os.environ.get("MCP_WARM_URLS", "").split(",") if url.strip()]
+    server = FetchMCPServer(warm_urls=warm_urls)
+    await server.run_stdio(max_concurrency=int(os.environ.get("MCP_STDIO_CONCURRENCY", "16")))
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    run(main(), loop=os.environ.get("MCP_EVENT_LOOP", "auto"))
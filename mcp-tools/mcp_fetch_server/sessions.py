@@ -0,0 +1,206 @@
+"""
+Streamable HTTP会话
+
+按MCP Streamable HTTP规范，``initialize`` 的响应通过 ``Mcp-Session-Id`` 头部返回会话ID，
+客户端在后续请求中带上该头部:
+
+- ``GET /mcp`` 打开SSE流，接收服务器主动推送的通知(例如watch的变化通知)
+- ``DELETE /mcp`` 结束会话
+
+通知在没有打开的SSE流时暂存在会话中(最多 ``max_queue`` 条，超出时丢弃最早的)，
+流打开后一并发送。会话超过 ``ttl`` 秒没有请求且没有打开的SSE流时过期。会话结束时
+调用通过 ``on_close`` 注册的回调，watch订阅随之取消。
+
+会话表不会被单个客户端占满: 同一客户端的会话超过 ``max_per_client`` 个时关闭它最久未使用的
+会话(优先没有SSE流的)；会话总数达到 ``max_sessions`` 时关闭全局最久未使用的空闲会话，
+只有全部会话都打开着SSE流时才拒绝创建。
+"""
+
+import asyncio
+import contextvars
+import logging
+import secrets
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional
+
+from .admission import Overloaded
+from .codec import dumps
+from .metrics import MetricsRegistry
+
+
+logger = logging.getLogger(__name__)
+
+
+class Session:
+    """单个Streamable HTTP会话"""
+
+    def __init__(self, session_id: str, client_id: str, max_queue: int = 100):
+        self.id = session_id
+        self.client_id = client_id
+        self.last_seen = time.monotonic()
+        self.streaming = False
+        self.closed = False
+        self.dropped = 0
+        self._queue: Deque[bytes] = deque(maxlen=max_queue)
+        self._event = asyncio.Event()
+        self._closers: List[Callable[["Session"], None]] = []
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def notify(self, message: Dict[str, Any]):
+        """排队一条JSON-RPC通知，由SSE流发送"""
+        if self.closed:
+            return
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+        self._queue.append(dumps(message))
+        self._event.set()
+
+    def drain(self) -> List[bytes]:
+        """取出全部待发送的通知"""
+        messages = list(self._queue)
+        self._queue.clear()
+        self._event.clear()
+        return messages
+
+    async def wait(self):
+        """等待新的通知或会话结束"""
+        await self._event.wait()
+
+    def wake(self):
+        """唤醒SSE流，使其检查会话状态"""
+        self._event.set()
+
+    def on_close(self, callback: Callable[["Session"], None]):
+        if callback not in self._closers:
+            self._closers.append(callback)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._event.set()
+        for callback in self._closers:
+            try:
+                callback(self)
+            except Exception:
+                logger.exception("会话关闭回调失败")
+        self._closers.clear()
+
+
+def _oldest(sessions: Iterable[Session]) -> Optional[Session]:
+    """最久未使用的会话，没有SSE流的优先"""
+    return min(sessions, key=lambda session: (session.streaming, session.last_seen), default=None)
+
+
+# 当前请求所属的会话，由MCPEndpoint设置
+current_session: contextvars.ContextVar[Optional[Session]] = contextvars.ContextVar(
+    "current_session", default=None
+)
+
+
+class SessionManager:
+    """创建、查找和过期清理会话"""
+
+    def __init__(
+        self,
+        ttl: float = 1800.0,
+        max_sessions: int = 10000,
+        max_per_client: int = 16,
+        max_queue: int = 100,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        # 0表示不限制单个客户端的会话数
+        self.max_per_client = max_per_client
+        self.max_queue = max_queue
+        self._sessions: Dict[str, Session] = {}
+        # 客户端 -> 该客户端的会话
+        self._clients: Dict[str, Dict[str, Session]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        metrics = metrics or MetricsRegistry()
+        metrics.gauge("sessions", "活动的Streamable HTTP会话数", lambda: len(self._sessions))
+        metrics.gauge(
+            "session_streams", "打开的会话SSE流数",
+            lambda: sum(1 for session in self._sessions.values() if session.streaming)
+        )
+        self._expired = metrics.counter("sessions_expired_total", "过期清理的会话数")
+        self._evicted = metrics.counter("sessions_evicted_total", "为新会话腾出位置而关闭的会话数")
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def create(self, client_id: str) -> Session:
+        owned = self._clients.get(client_id, {})
+        if self.max_per_client and len(owned) >= self.max_per_client:
+            # 客户端的会话已达上限时关闭它自己最久未使用的会话，不影响其他客户端
+            self._evict(_oldest(owned.values()), "client_limit")
+        if len(self._sessions) >= self.max_sessions:
+            self.expire()
+        if len(self._sessions) >= self.max_sessions:
+            idle = _oldest(session for session in self._sessions.values() if not session.streaming)
+            if idle is None:
+                raise Overloaded("会话数已达上限", retry_after=60)
+            self._evict(idle, "capacity")
+        session = Session(secrets.token_urlsafe(24), client_id, self.max_queue)
+        self._sessions[session.id] = session
+        self._clients.setdefault(client_id, {})[session.id] = session
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.touch()
+        return session
+
+    def close(self, session_id: str) -> bool:
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        owned = self._clients.get(session.client_id)
+        if owned is not None:
+            owned.pop(session_id, None)
+            if not owned:
+                del self._clients[session.client_id]
+        session.close()
+        return True
+
+    def _evict(self, session: Session, reason: str):
+        self._evicted.inc(reason=reason)
+        self.close(session.id)
+
+    def expire(self):
+        """关闭超过ttl秒没有请求且没有SSE流的会话"""
+        now = time.monotonic()
+        for session in [s for s in self._sessions.values() if not s.streaming and now - s.last_seen > self.ttl]:
+            self._expired.inc()
+            self.close(session.id)
+
+    def end_streams(self):
+        """唤醒所有SSE流使其结束，用于排空"""
+        for session in self._sessions.values():
+            session.wake()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for session_id in list(self._sessions):
+            self.close(session_id)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(min(60.0, self.ttl))
+            self.expire()
@@ -0,0 +1,66 @@
+"""
+工具结果的字段与响应头选择
+
+完整的结果包含全部响应头以及回显的url、method、size和timing，小响应上这些字段往往
+比正文还大。工具参数 ``fields`` 和 ``include_headers`` 控制结果中出现哪些内容:
+
+- ``fields``: ``"default"`` 只保留客户端常用的字段，``"all"`` 保留全部字段，
+  或者给出字段名列表
+- ``include_headers``: ``"default"`` 只保留 ``DEFAULT_HEADERS`` 中的响应头，
+  ``"none"`` 不返回响应头，``"all"`` 返回全部响应头，或者给出响应头名称列表
+"""
+
+from typing import Any, Dict, Iterable, List, Literal, Optional, Union
+
+
+# 客户端判断内容类型、缓存和重定向时用到的响应头
+DEFAULT_HEADERS = frozenset({
+    "content-type",
+    "content-length",
+    "content-language",
+    "last-modified",
+    "etag",
+    "location",
+    "cache-control",
+    "retry-after",
+})
+
+FieldSelector = Union[Literal["default", "all"], List[str]]
+HeaderSelector = Union[Literal["default", "none", "all"], List[str]]
+
+
+def select_headers(headers: Dict[str, str], include: HeaderSelector) -> Optional[Dict[str, str]]:
+    """按选择器过滤响应头，选择none时返回None"""
+    if include == "all":
+        return headers
+    if include == "none":
+        return None
+    allowed = DEFAULT_HEADERS if include == "default" else {name.lower() for name in include}
+    return {name: value for name, value in headers.items() if name.lower() in allowed}
+
+
+def check_fields(fields: FieldSelector, available: Iterable[str]):
+    """字段名列表中有工具不支持的字段时抛出ValueError，在请求上游之前调用"""
+    if fields in ("default", "all"):
+        return
+    available = list(available)
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise ValueError(f"未知的结果字段: {', '.join(unknown)}，可用字段: {', '.join(available)}")
+
+
+def select_fields(
+    result: Dict[str, Any],
+    fields: FieldSelector,
+    default: Iterable[str],
+    available: Iterable[str],
+) -> Dict[str, Any]:
+    """按选择器保留结果字段，字段名列表中有工具不支持的字段时抛出ValueError"""
+    if fields == "all":
+        return result
+    if fields == "default":
+        fields = default
+    else:
+        check_fields(fields, available)
+    # 分页等字段只在相应情况下出现
+    return {name: result[name] for name in fields if name in result}
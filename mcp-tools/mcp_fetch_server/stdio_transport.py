@@ -0,0 +1,155 @@
+"""
+MCP stdio传输
+
+从stdin逐行读取JSON-RPC消息，每条消息作为独立任务分发，响应按完成顺序
+写回stdout。工具调用受并发上限约束，initialize、ping、tools/list等轻量
+方法不占用名额，慢的上游请求不会阻塞同一连接上的其他消息。
+
+stdin由守护线程读取，stdout写入在线程池中执行并合并同一时刻就绪的响应，
+事件循环本身不会被管道读写阻塞。
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+from typing import TYPE_CHECKING, Any, BinaryIO, Dict, Optional, Set
+
+from .codec import dumps, loads, valid_id
+from .deadline import Deadline, current_deadline
+
+if TYPE_CHECKING:
+    from .server import FetchMCPServer
+
+
+logger = logging.getLogger(__name__)
+
+
+class StdioTransport:
+    """并发处理消息的stdio传输"""
+
+    # 不占用并发名额的轻量MCP方法
+    PRIORITY_METHODS = frozenset({"initialize", "ping", "tools/list"})
+
+    def __init__(
+        self,
+        mcp_server: "FetchMCPServer",
+        max_concurrency: int = 16,
+        stdin: Optional[BinaryIO] = None,
+        stdout: Optional[BinaryIO] = None,
+    ):
+        self.mcp_server = mcp_server
+        self.max_concurrency = max_concurrency
+        self.stdin = stdin or sys.stdin.buffer
+        self.stdout = stdout or sys.stdout.buffer
+        # 信号量和队列需在事件循环内创建，见serve()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._outgoing: "Optional[asyncio.Queue[Optional[bytes]]]" = None
+        self._tasks: Set[asyncio.Task] = set()
+        # 请求ID -> 任务，用于响应notifications/cancelled
+        self._requests: Dict[Any, asyncio.Task] = {}
+
+    async def serve(self):
+        """处理消息直到stdin关闭，然后等待进行中的请求完成"""
+        loop = asyncio.get_event_loop()
+        incoming: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._outgoing = asyncio.Queue()
+
+        def read_stdin():
+            try:
+                for line in iter(self.stdin.readline, b""):
+                    loop.call_soon_threadsafe(incoming.put_nowait, line)
+            finally:
+                loop.call_soon_threadsafe(incoming.put_nowait, None)
+
+        # 守护线程阻塞在readline上也不会妨碍进程退出
+        threading.Thread(target=read_stdin, name="mcp-stdin", daemon=True).start()
+        writer = asyncio.ensure_future(self._write_loop())
+
+        try:
+            while True:
+                line = await incoming.get()
+                if line is None:
+                    break
+                if line.strip():
+                    self._receive(line)
+
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            self._outgoing.put_nowait(None)
+            await writer
+
+    def _receive(self, line: bytes):
+        """解析一行消息并创建处理任务"""
+        try:
+            message = loads(line)
+        except ValueError as e:
+            self._send({"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": "Parse error", "data": str(e)}})
+            return
+
+        if isinstance(message, dict) and message.get("method") == "notifications/cancelled":
+            params = message.get("params")
+            request_id = params.get("requestId") if isinstance(params, dict) else None
+            task = self._requests.get(request_id) if valid_id(request_id) else None
+            if task is not None:
+                task.cancel()
+            return
+
+        msg_id = message.get("id") if isinstance(message, dict) else None
+        if msg_id is not None and not valid_id(msg_id):
+            self._send({"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "Invalid Request", "data": "id必须是字符串或整数"}})
+            return
+
+        task = asyncio.ensure_future(self._handle(message))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        if msg_id is not None:
+            self._requests[msg_id] = task
+            task.add_done_callback(lambda _: self._requests.pop(msg_id, None))
+
+    async def _handle(self, message: Any):
+        """处理单条消息，工具调用需要先获取并发名额"""
+        # 每个任务运行在独立的上下文副本中，截止时间互不影响
+        current_deadline.set(Deadline.from_request(None, message))
+        try:
+            if isinstance(message, dict) and message.get("method") in self.PRIORITY_METHODS:
+                response = await self.mcp_server.handle_message(message)
+            else:
+                async with self._semaphore:
+                    response = await self.mcp_server.handle_message(message)
+        except asyncio.CancelledError:
+            # 客户端已取消，按协议不再发送响应
+            raise
+        except Exception as e:
+            logger.exception("处理stdio消息失败")
+            msg_id = message.get("id") if isinstance(message, dict) else None
+            response = {"jsonrpc": "2.0", "id": msg_id, "error": {"code": -32603, "message": "Internal error", "data": str(e)}}
+
+        if response is not None:
+            self._send(response)
+
+    def _send(self, response: Dict[str, Any]):
+        self._outgoing.put_nowait(dumps(response) + b"\n")
+
+    async def _write_loop(self):
+        """合并已就绪的响应后一次性写入stdout"""
+        loop = asyncio.get_event_loop()
+        closed = False
+        while not closed:
+            batch = [await self._outgoing.get()]
+            while not self._outgoing.empty():
+                batch.append(self._outgoing.get_nowait())
+            if None in batch:
+                closed = True
+                batch = [data for data in batch if data is not None]
+            if batch:
+                await loop.run_in_executor(None, self._write, b"".join(batch))
+
+    def _write(self, data: bytes):
+        self.stdout.write(data)
+        self.stdout.flush()
@@ -0,0 +1,239 @@
+"""
+上游请求耗时分解与链路追踪
+
+通过aiohttp的TraceConfig记录每个上游请求的各阶段耗时:
+连接池排队(queue)、DNS解析(dns)、建立连接(connect，HTTPS时包含TLS握手)、
+首字节(ttfb)和响应体下载(body)。结果会附加到fetch结果中，并可由HTTP
+传输层输出为W3C ``Server-Timing`` 头部。
+
+同时负责W3C ``traceparent`` 的解析和向上游传播；安装了opentelemetry
+且启用导出时，每个上游请求及其阶段会作为span导出。
+"""
+
+import contextvars
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+
+# 当前MCP请求的链路上下文，由传输层根据traceparent头部设置
+current_trace: contextvars.ContextVar[Optional["TraceContext"]] = contextvars.ContextVar(
+    "current_trace", default=None
+)
+
+# 当前MCP请求内所有上游请求的耗时收集器，由传输层设置
+timing_collector: contextvars.ContextVar[Optional[List["UpstreamTiming"]]] = contextvars.ContextVar(
+    "timing_collector", default=None
+)
+
+# Server-Timing中输出的阶段顺序
+PHASES = ("queue", "dns", "connect", "ttfb", "body")
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class TraceContext:
+    """W3C Trace Context"""
+
+    def __init__(self, trace_id: str, span_id: str, flags: str = "01"):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.flags = flags
+
+    @classmethod
+    def parse(cls, header: Optional[str]) -> Optional["TraceContext"]:
+        """解析traceparent头部，格式非法时返回None"""
+        if not header:
+            return None
+        match = _TRACEPARENT_RE.match(header.strip().lower())
+        if not match:
+            return None
+        trace_id, span_id, flags = match.groups()
+        if trace_id == "0" * 32 or span_id == "0" * 16:
+            return None
+        return cls(trace_id, span_id, flags)
+
+    @classmethod
+    def new(cls) -> "TraceContext":
+        """创建新的根链路"""
+        return cls(os.urandom(16).hex(), os.urandom(8).hex())
+
+    def child(self) -> "TraceContext":
+        """创建同一链路下的子span"""
+        return TraceContext(self.trace_id, os.urandom(8).hex(), self.flags)
+
+    def to_header(self) -> str:
+        """生成traceparent头部"""
+        return f"00-{self.trace_id}-{self.span_id}-{self.flags}"
+
+
+class UpstreamTiming:
+    """单个上游请求的阶段耗时"""
+
+    def __init__(self, parent: Optional[TraceContext] = None):
+        self.parent = parent
+        self.trace = parent.child() if parent else TraceContext.new()
+        self.phases: Dict[str, float] = {}
+        self.connection_reused = False
+        self.started_at = time.perf_counter()
+        self.started_wall_ns = time.time_ns()
+        self.finished_at: Optional[float] = None
+        # 阶段开始时间，key为阶段名
+        self._marks: Dict[str, float] = {}
+        # 导出span用的阶段区间 (阶段, 开始, 结束)
+        self._intervals: List[tuple] = []
+        self._span = None
+
+    def begin(self, phase: str):
+        """标记阶段开始"""
+        self._marks[phase] = time.perf_counter()
+
+    def end(self, phase: str):
+        """标记阶段结束，同一阶段多次出现(如重定向)时累加"""
+        start = self._marks.pop(phase, None)
+        if start is None:
+            return
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + (now - start)
+        self._intervals.append((phase, start, now))
+
+    def inject(self, headers: Dict[str, str]):
+        """向上游请求头注入traceparent，调用方已提供时保持不变"""
+        if not any(key.lower() == "traceparent" for key in headers):
+            headers["traceparent"] = self.trace.to_header()
+
+    def start_span(self, name: str, attributes: Dict[str, Any]):
+        """启动导出用的span，opentelemetry不可用时静默跳过"""
+        try:
+            from opentelemetry import trace as otel_trace
+        except ImportError:
+            return
+
+        context = None
+        if self.parent is not None:
+            parent_span = otel_trace.NonRecordingSpan(otel_trace.SpanContext(
+                trace_id=int(self.parent.trace_id, 16),
+                span_id=int(self.parent.span_id, 16),
+                is_remote=True,
+                trace_flags=otel_trace.TraceFlags(int(self.parent.flags, 16))
+            ))
+            context = otel_trace.set_span_in_context(parent_span)
+
+        tracer = otel_trace.get_tracer(__name__)
+        self._span = tracer.start_span(
+            name,
+            context=context,
+            kind=otel_trace.SpanKind.CLIENT,
+            attributes=attributes,
+            start_time=self.started_wall_ns
+        )
+        span_context = self._span.get_span_context()
+        if span_context.is_valid:
+            # 使用导出span的ID向上游传播，保证链路可以串联
+            self.trace = TraceContext(
+                format(span_context.trace_id, "032x"),
+                format(span_context.span_id, "016x"),
+                format(int(span_context.trace_flags), "02x")
+            )
+
+    def finish(self, status: Optional[int] = None, error: Optional[BaseException] = None):
+        """结束计时并导出span"""
+        self.finished_at = time.perf_counter()
+        if self._span is None:
+            return
+
+        from opentelemetry import trace as otel_trace
+
+        tracer = otel_trace.get_tracer(__name__)
+        context = otel_trace.set_span_in_context(self._span)
+        for phase, start, end in self._intervals:
+            tracer.start_span(
+                f"upstream.{phase}",
+                context=context,
+                start_time=self._to_wall_ns(start)
+            ).end(end_time=self._to_wall_ns(end))
+
+        if status is not None:
+            self._span.set_attribute("http.response.status_code", status)
+        if error is not None:
+            self._span.record_exception(error)
+            self._span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR, str(error)))
+        self._span.end(end_time=self._to_wall_ns(self.finished_at))
+        self._span = None
+
+    def _to_wall_ns(self, perf_time: float) -> int:
+        """将perf_counter时间换算为墙钟纳秒"""
+        return self.started_wall_ns + int((perf_time - self.started_at) * 1e9)
+
+    @property
+    def total(self) -> float:
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        return end - self.started_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为毫秒为单位的字典，用于fetch结果"""
+        result: Dict[str, Any] = {
+            phase: round(self.phases[phase] * 1000, 3)
+            for phase in PHASES if phase in self.phases
+        }
+        result["total"] = round(self.total * 1000, 3)
+        result["connection_reused"] = self.connection_reused
+        result["traceparent"] = self.trace.to_header()
+        return result
+
+
+def format_server_timing(timings: List[UpstreamTiming]) -> str:
+    """生成W3C Server-Timing头部，多个上游请求的同名阶段累加"""
+    totals: Dict[str, float] = {}
+    for timing in timings:
+        for phase, duration in timing.phases.items():
+            totals[phase] = totals.get(phase, 0.0) + duration
+        totals["total"] = totals.get("total", 0.0) + timing.total
+
+    return ", ".join(
+        f"upstream-{phase};dur={totals[phase] * 1000:.3f}"
+        for phase in PHASES + ("total",) if phase in totals
+    )
+
+
+def create_trace_config():
+    """创建记录各阶段耗时的aiohttp TraceConfig
+
+    请求时需要通过 ``trace_request_ctx`` 传入 :class:`UpstreamTiming`。
+    """
+    import aiohttp
+
+    def _timing(trace_config_ctx) -> Optional[UpstreamTiming]:
+        timing = trace_config_ctx.trace_request_ctx
+        return timing if isinstance(timing, UpstreamTiming) else None
+
+    def _on(phase: str, begin: bool):
+        async def handler(session, trace_config_ctx, params):
+            timing = _timing(trace_config_ctx)
+            if timing is None:
+                return
+            if begin:
+                timing.begin(phase)
+            else:
+                timing.end(phase)
+        return handler
+
+    async def on_connection_reuseconn(session, trace_config_ctx, params):
+        timing = _timing(trace_config_ctx)
+        if timing is not None:
+            timing.connection_reused = True
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_queued_start.append(_on("queue", True))
+    trace_config.on_connection_queued_end.append(_on("queue", False))
+    trace_config.on_dns_resolvehost_start.append(_on("dns", True))
+    trace_config.on_dns_resolvehost_end.append(_on("dns", False))
+    trace_config.on_connection_create_start.append(_on("connect", True))
+    trace_config.on_connection_create_end.append(_on("connect", False))
+    trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+    trace_config.on_request_headers_sent.append(_on("ttfb", True))
+    # on_request_end/on_request_redirect在收到响应头时触发
+    trace_config.on_request_redirect.append(_on("ttfb", False))
+    trace_config.on_request_end.append(_on("ttfb", False))
+    return trace_config
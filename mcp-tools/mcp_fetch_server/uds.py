@@ -0,0 +1,77 @@
+"""
+Unix域套接字监听
+
+作为sidecar与agent进程部署在同一主机时，可以用Unix域套接字代替127.0.0.1 TCP，
+省去TCP/IP协议栈开销，并通过文件权限控制哪些进程可以连接。
+"""
+
+import errno
+import os
+import socket
+import stat
+from typing import Optional
+
+
+class UnixSocketListener:
+    """创建、授权并在关闭时清理Unix域套接字文件"""
+
+    def __init__(self, path: str, mode: int = 0o660):
+        if not hasattr(socket, "AF_UNIX"):
+            raise ValueError("当前平台不支持Unix域套接字")
+        self.path = path
+        self.mode = mode
+        self.sock: Optional[socket.socket] = None
+        # 记录绑定时的inode，清理时只删除自己创建的文件
+        self._inode: Optional[int] = None
+
+    def bind(self) -> socket.socket:
+        """绑定套接字并设置权限，路径上残留的失效套接字会被清理"""
+        self._remove_stale()
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # 绑定前收紧umask，文件创建后到chmod之前不会以更宽的权限暴露
+        old_umask = os.umask(0o777 & ~self.mode)
+        try:
+            sock.bind(self.path)
+        except OSError:
+            sock.close()
+            raise
+        finally:
+            os.umask(old_umask)
+
+        os.chmod(self.path, self.mode)
+        self._inode = os.stat(self.path).st_ino
+        self.sock = sock
+        return sock
+
+    def _remove_stale(self):
+        """路径已存在时: 无人监听的套接字文件删除，其他情况报错"""
+        try:
+            info = os.stat(self.path)
+        except FileNotFoundError:
+            return
+
+        if not stat.S_ISSOCK(info.st_mode):
+            raise OSError(errno.EEXIST, f"路径已存在且不是套接字: {self.path}")
+
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(self.path)
+            return
+        finally:
+            probe.close()
+        raise OSError(errno.EADDRINUSE, f"套接字正在被其他进程使用: {self.path}")
+
+    def close(self):
+        """关闭套接字并删除套接字文件"""
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        try:
+            if self._inode is not None and os.stat(self.path).st_ino == self._inode:
+                os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        self._inode = None
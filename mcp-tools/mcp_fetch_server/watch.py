@@ -0,0 +1,228 @@
+"""
+watch订阅与合并的后台轮询
+
+多个客户端各自用 ``fetch`` 轮询同一个URL会成倍增加上游流量。``watch`` 工具把订阅登记到
+``WatchScheduler``，同一个URL(及请求头)无论有多少订阅者都只由一个后台任务轮询一次，
+轮询间隔取所有订阅者中最短的一个:
+
+- 上次响应带有ETag或Last-Modified时发送条件请求，304视为未变化
+- 状态码或内容摘要与上次不同时，向每个订阅者所属的会话推送
+  ``notifications/resources/updated`` 通知，由会话的SSE流发送
+- 第一次轮询只记录基准，不发送通知
+
+订阅随会话结束而取消，没有订阅者的URL停止轮询。同时进行的轮询不超过 ``concurrency`` 个，
+不与前台请求争抢上游连接。
+"""
+
+import asyncio
+import contextvars
+import logging
+import secrets
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from .metrics import MetricsRegistry
+from .sessions import Session
+
+
+logger = logging.getLogger(__name__)
+
+# 轮询函数: (url, 请求头) -> (状态码, 响应头, 内容摘要)
+PollFunc = Callable[[str, Dict[str, str]], Awaitable[Tuple[int, Dict[str, str], Optional[str]]]]
+
+
+class Subscription:
+    """会话对某个URL的订阅"""
+
+    __slots__ = ("id", "session", "target", "interval")
+
+    def __init__(self, session: Session, target: "_Target", interval: float):
+        self.id = "watch-" + secrets.token_hex(8)
+        self.session = session
+        self.target = target
+        self.interval = interval
+
+
+class _Target:
+    """一个被轮询的URL及其上次的状态"""
+
+    def __init__(self, key: str, url: str, headers: Dict[str, str]):
+        self.key = key
+        self.url = url
+        self.headers = headers
+        self.subscriptions: Dict[str, Subscription] = {}
+        self.next_due = 0.0
+        self.polling = False
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        # (状态码, 内容摘要或错误类型)，None表示还没有基准
+        self.state: Optional[Tuple[Optional[int], Optional[str]]] = None
+
+    @property
+    def interval(self) -> float:
+        return min(subscription.interval for subscription in self.subscriptions.values())
+
+
+class WatchScheduler:
+    """按URL合并订阅，单个后台任务按需轮询"""
+
+    def __init__(
+        self,
+        poll: PollFunc,
+        min_interval: float = 5.0,
+        concurrency: int = 4,
+        max_per_session: int = 100,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
+        self.poll = poll
+        self.min_interval = min_interval
+        self.max_per_session = max_per_session
+        self._targets: Dict[str, _Target] = {}
+        self._subscriptions: Dict[str, Subscription] = {}
+        self.concurrency = concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._polls: Set[asyncio.Task] = set()
+
+        metrics = metrics or MetricsRegistry()
+        metrics.gauge("watch_subscriptions", "watch订阅数", lambda: len(self._subscriptions))
+        metrics.gauge("watch_targets", "正在轮询的URL数", lambda: len(self._targets))
+        self._polled = metrics.counter("watch_polls_total", "按结果统计的watch轮询次数")
+        self._notified = metrics.counter("watch_notifications_total", "发送的watch变化通知数")
+
+    def subscribe(self, session: Session, key: str, url: str, headers: Dict[str, str], interval: float) -> Subscription:
+        """登记订阅，同一key的订阅共用一个轮询目标"""
+        owned = sum(1 for s in self._subscriptions.values() if s.session is session)
+        if owned >= self.max_per_session:
+            raise ValueError(f"每个会话最多 {self.max_per_session} 个watch订阅")
+
+        target = self._targets.get(key)
+        if target is None:
+            target = self._targets[key] = _Target(key, url, headers)
+        subscription = Subscription(session, target, max(interval, self.min_interval))
+        target.subscriptions[subscription.id] = subscription
+        self._subscriptions[subscription.id] = subscription
+        session.on_close(self.drop_session)
+        # 新订阅的间隔更短时提前下一次轮询
+        target.next_due = min(target.next_due or float("inf"), time.monotonic() + subscription.interval)
+        if target.state is None:
+            target.next_due = 0.0
+        self._ensure_running()
+        return subscription
+
+    def unsubscribe(self, subscription_id: str, session: Optional[Session] = None) -> bool:
+        """取消订阅，指定session时只能取消该会话的订阅"""
+        subscription = self._subscriptions.get(subscription_id)
+        if subscription is None or (session is not None and subscription.session is not session):
+            return False
+        del self._subscriptions[subscription_id]
+        target = subscription.target
+        del target.subscriptions[subscription_id]
+        if not target.subscriptions:
+            del self._targets[target.key]
+        return True
+
+    def drop_session(self, session: Session):
+        """会话结束时取消其全部订阅"""
+        for subscription_id in [s.id for s in self._subscriptions.values() if s.session is session]:
+            self.unsubscribe(subscription_id)
+
+    def subscribers(self, key: str) -> int:
+        target = self._targets.get(key)
+        return len(target.subscriptions) if target is not None else 0
+
+    def _ensure_running(self):
+        if self._wakeup is None:
+            # 在事件循环中创建，Python 3.8/3.9的同步原语在创建时绑定事件循环
+            self._wakeup = asyncio.Event()
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            # 在空上下文中运行，不继承第一个订阅请求的截止时间、内存租约和客户端
+            self._task = contextvars.Context().run(asyncio.ensure_future, self._run())
+
+    async def stop(self):
+        tasks = list(self._polls)
+        if self._task is not None:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._polls.clear()
+
+    async def _run(self):
+        """调度循环: 启动到期的轮询，睡眠到最近的到期时间或有新订阅"""
+        while self._targets:
+            now = time.monotonic()
+            for target in list(self._targets.values()):
+                if target.next_due <= now and not target.polling:
+                    target.polling = True
+                    target.next_due = now + target.interval
+                    task = asyncio.ensure_future(self._poll_target(target))
+                    self._polls.add(task)
+                    task.add_done_callback(self._polls.discard)
+            pending = [target.next_due for target in self._targets.values() if not target.polling]
+            self._wakeup.clear()
+            timeout = max(0.0, min(pending) - time.monotonic()) if pending else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll_target(self, target: _Target):
+        try:
+            async with self._semaphore:
+                headers = dict(target.headers)
+                if target.etag:
+                    headers["If-None-Match"] = target.etag
+                if target.last_modified:
+                    headers["If-Modified-Since"] = target.last_modified
+                try:
+                    status, response_headers, digest = await self.poll(target.url, headers)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self._polled.inc(result="error")
+                    logger.debug(f"watch轮询失败: {target.url}: {e}")
+                    self._update(target, (None, type(e).__name__))
+                    return
+
+            if status == 304:
+                self._polled.inc(result="not_modified")
+                return
+            response_headers = {name.lower(): value for name, value in response_headers.items()}
+            target.etag = response_headers.get("etag")
+            target.last_modified = response_headers.get("last-modified")
+            self._update(target, (status, digest))
+        finally:
+            target.polling = False
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    def _update(self, target: _Target, state: Tuple[Optional[int], Optional[str]]):
+        """记录轮询结果，与上次不同时通知订阅者"""
+        previous, target.state = target.state, state
+        if previous is None or previous == state:
+            self._polled.inc(result="baseline" if previous is None else "unchanged")
+            return
+        self._polled.inc(result="changed")
+        status, detail = state
+        for subscription in list(target.subscriptions.values()):
+            params: Dict[str, Any] = {
+                "uri": target.url,
+                "subscriptionId": subscription.id,
+                "status": status,
+                "changedAt": time.time(),
+            }
+            if status is None:
+                params["error"] = detail
+            else:
+                params["digest"] = detail
+            subscription.session.notify({
+                "jsonrpc": "2.0",
+                "method": "notifications/resources/updated",
+                "params": params,
+            })
+            self._notified.inc()
@@ -0,0 +1,185 @@
+"""
+/mcp/ws WebSocket传输
+
+一个WebSocket连接上可以并发进行多个JSON-RPC调用，响应按完成顺序返回，
+由 ``id`` 对应请求。每条消息都经过与 ``POST /mcp`` 相同的分发逻辑:
+工具注册表、准入控制、截止时间和排空。
+
+每个连接同时处理的消息数不超过 ``max_in_flight``，达到上限后暂停读取，
+由TCP流控把压力传回客户端；发送时等待底层写缓冲排空，慢客户端不会让
+响应在服务器内存中无限堆积。permessage-deflate由uvicorn的WebSocket
+协议实现协商，见 ``HTTPTransportServer`` 的 ``ws_per_message_deflate``。
+"""
+
+import asyncio
+from typing import TYPE_CHECKING, Any, Dict, Optional, Set
+
+from .admission import Overloaded
+from .clients import ClientContext, client_identity, current_client
+from .codec import dumps, loads, valid_id
+from .deadline import Deadline, DeadlineExceeded, current_deadline
+from .mcp_endpoint import ClientDisconnected, RawRequest
+
+if TYPE_CHECKING:
+    from .http_transport import HTTPTransportServer
+
+
+class _Connection:
+    """单个WebSocket连接的状态"""
+
+    def __init__(self, send, max_in_flight: int, client_id: str):
+        self.send = send
+        self.client_id = client_id
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.send_lock = asyncio.Lock()
+        self.closed = asyncio.Event()
+        self.tasks: Set[asyncio.Task] = set()
+        # 请求ID -> 任务，用于响应notifications/cancelled
+        self.requests: Dict[Any, asyncio.Task] = {}
+
+    async def send_json(self, payload: Dict[str, Any]):
+        """发送一条消息，等待写缓冲排空；连接已断开时丢弃"""
+        if self.closed.is_set():
+            return
+        async with self.send_lock:
+            try:
+                await self.send({"type": "websocket.send", "text": dumps(payload).decode("utf-8")})
+            except Exception:
+                self.closed.set()
+
+
+class WebSocketEndpoint:
+    """/mcp/ws的ASGI处理器，其他请求交给内层应用"""
+
+    def __init__(self, app, transport: "HTTPTransportServer", path: str = "/mcp/ws", max_in_flight: int = 32):
+        self.app = app
+        self.transport = transport
+        self.path = path
+        self.max_in_flight = max_in_flight
+        self.connections = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "websocket" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+
+        message = await receive()
+        if message["type"] != "websocket.connect":
+            return
+        if self.transport.draining:
+            # 排空期间拒绝新连接，握手阶段关闭会返回HTTP 403
+            await send({"type": "websocket.close", "code": 1013})
+            return
+        await send({"type": "websocket.accept"})
+
+        request = RawRequest(scope)
+        client_ip = self.transport.error_handler.get_client_ip(request)
+        connection = _Connection(
+            send, self.max_in_flight, client_identity(request.headers, client_ip, self.transport.client_keys)
+        )
+        self.transport.error_handler.log_info("WEBSOCKET", "WebSocket连接已建立", {"client_ip": client_ip})
+        self.connections += 1
+        try:
+            await self._serve(connection, receive)
+        finally:
+            self.connections -= 1
+            connection.closed.set()
+            for task in list(connection.tasks):
+                task.cancel()
+            if connection.tasks:
+                await asyncio.gather(*connection.tasks, return_exceptions=True)
+            self.transport.error_handler.log_info("WEBSOCKET", "WebSocket连接已关闭", {"client_ip": client_ip})
+
+    async def _serve(self, connection: _Connection, receive):
+        """读取消息并为每条消息创建任务，名额用尽时暂停读取"""
+        while True:
+            await connection.slots.acquire()
+            message = await receive()
+            if message["type"] == "websocket.disconnect":
+                connection.slots.release()
+                return
+
+            data = message.get("text")
+            raw = data.encode("utf-8") if data is not None else message.get("bytes") or b""
+            try:
+                body = loads(raw)
+            except ValueError as e:
+                connection.slots.release()
+                await connection.send_json(self._error(None, -32700, "Parse error", str(e)))
+                continue
+
+            if isinstance(body, dict) and body.get("method") == "notifications/cancelled":
+                connection.slots.release()
+                params = body.get("params")
+                request_id = params.get("requestId") if isinstance(params, dict) else None
+                task = connection.requests.get(request_id) if valid_id(request_id) else None
+                if task is not None:
+                    task.cancel()
+                continue
+
+            msg_id = body.get("id") if isinstance(body, dict) else None
+            if msg_id is not None and not valid_id(msg_id):
+                connection.slots.release()
+                await connection.send_json(self._error(None, -32600, "Invalid Request", "id必须是字符串或整数"))
+                continue
+            task = asyncio.ensure_future(self._handle(connection, body))
+            connection.tasks.add(task)
+            task.add_done_callback(lambda done, msg_id=msg_id: self._finish(connection, done, msg_id))
+            if msg_id is not None:
+                connection.requests[msg_id] = task
+
+    @staticmethod
+    def _finish(connection: _Connection, task: asyncio.Task, msg_id: Any):
+        """任务结束后归还名额"""
+        connection.tasks.discard(task)
+        if msg_id is not None and connection.requests.get(msg_id) is task:
+            del connection.requests[msg_id]
+        connection.slots.release()
+
+    async def _handle(self, connection: _Connection, body: Any):
+        """处理单条消息，错误映射与POST /mcp一致"""
+        transport = self.transport
+        msg_id = body.get("id") if isinstance(body, dict) else None
+
+        # 每个任务运行在独立的上下文副本中，截止时间互不影响
+        deadline = Deadline.from_request(None, body)
+        current_deadline.set(deadline)
+        current_client.set(ClientContext(connection.client_id))
+
+        transport.active_requests += 1
+        start_time = asyncio.get_event_loop().time()
+        try:
+            with transport.profiler.profile(transport.profiler.should_profile(False)) as capture:
+                response = await transport._run_cancellable(
+                    connection.closed.wait(),
+                    transport._dispatch(body, deadline),
+                    deadline
+                )
+            transport.profiler.record(
+                transport._describe_message(body),
+                asyncio.get_event_loop().time() - start_time,
+                capture
+            )
+        except ClientDisconnected:
+            return
+        except Overloaded as e:
+            response = self._error(msg_id, -32002, "Server overloaded", {"message": str(e), "retryAfter": e.retry_after})
+        except DeadlineExceeded as e:
+            response = transport.error_handler.handle_exception(e, {"url": self.path})
+            response.update({"jsonrpc": "2.0", "id": msg_id})
+        except Exception as e:
+            transport.error_handler.log_error("ERROR", f"MCP处理错误: {str(e)}", {"url": self.path})
+            response = self._error(msg_id, -32603, "Internal error", str(e))
+        finally:
+            transport.active_requests -= 1
+
+        if response is not None:
+            await connection.send_json(response)
+
+    @staticmethod
+    def _error(msg_id: Any, code: int, message: str, data: Optional[Any] = None) -> Dict[str, Any]:
+        return {
+            "jsonrpc": "2.0",
+            "error": {"code": code, "message": message, "data": data},
+            "id": msg_id
+        }
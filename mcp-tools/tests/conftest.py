@@ -0,0 +1,22 @@
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+
+@pytest_asyncio.fixture
+async def serve_routes():
+    """按路由表(路径 -> GET处理函数)启动本地上游服务器，返回不带结尾斜杠的基础URL，测试结束时关闭"""
+    servers = []
+
+    async def start(routes):
+        app = web.Application()
+        for path, handler in routes.items():
+            app.router.add_get(path, handler)
+        server = TestServer(app, host="127.0.0.1")
+        await server.start_server()
+        servers.append(server)
+        return str(server.make_url("")).rstrip("/")
+
+    yield start
+    for server in servers:
+        await server.close()
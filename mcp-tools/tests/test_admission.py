@@ -0,0 +1,188 @@
+import asyncio
+
+import pytest
+from mcp_fetch_server.admission import AdmissionController, Overloaded
+from mcp_fetch_server.deadline import Deadline, DeadlineExceeded
+from mcp_fetch_server.metrics import MetricsRegistry
+
+
+@pytest.mark.asyncio
+async def test_admits_within_limit():
+    """测试名额内的请求直接获准"""
+    controller = AdmissionController(max_in_flight=2, max_queue=0)
+
+    await controller.acquire()
+    await controller.acquire()
+
+    assert controller.in_flight == 2
+    controller.release()
+    controller.release()
+    assert controller.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_sheds_when_queue_full():
+    """测试队列已满时立即拒绝"""
+    controller = AdmissionController(max_in_flight=1, max_queue=0)
+    await controller.acquire()
+
+    with pytest.raises(Overloaded) as exc_info:
+        await controller.acquire()
+
+    assert exc_info.value.retry_after >= 1
+
+
+@pytest.mark.asyncio
+async def test_queued_request_gets_released_slot():
+    """测试释放的名额移交给排队中的请求"""
+    controller = AdmissionController(max_in_flight=1, max_queue=1, max_queue_wait=1.0)
+    await controller.acquire()
+
+    waiter = asyncio.ensure_future(controller.acquire())
+    await asyncio.sleep(0)
+    assert controller.queue_depth == 1
+
+    controller.release()
+    await waiter
+
+    assert controller.in_flight == 1
+    assert controller.queue_depth == 0
+
+
+@pytest.mark.asyncio
+async def test_queue_wait_timeout():
+    """测试排队超时后拒绝"""
+    controller = AdmissionController(max_in_flight=1, max_queue=1, max_queue_wait=0.05)
+    await controller.acquire()
+
+    with pytest.raises(Overloaded):
+        await controller.acquire()
+
+    assert controller.queue_depth == 0
+
+
+@pytest.mark.asyncio
+async def test_queue_respects_deadline():
+    """测试排队等待受截止时间约束"""
+    controller = AdmissionController(max_in_flight=1, max_queue=1, max_queue_wait=5.0)
+    await controller.acquire()
+
+    with pytest.raises(DeadlineExceeded):
+        await controller.acquire(Deadline(0.05))
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_leak_slot():
+    """测试取消排队中的请求不会泄漏名额"""
+    controller = AdmissionController(max_in_flight=1, max_queue=1, max_queue_wait=1.0)
+    await controller.acquire()
+
+    waiter = asyncio.ensure_future(controller.acquire())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+
+    controller.release()
+    assert controller.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_metrics_exposed():
+    """测试准入指标输出"""
+    metrics = MetricsRegistry()
+    controller = AdmissionController(max_in_flight=1, max_queue=0, metrics=metrics)
+    await controller.acquire()
+    with pytest.raises(Overloaded):
+        await controller.acquire()
+
+    output = metrics.render()
+
+    assert "mcp_admission_in_flight 1" in output
+    assert 'mcp_admission_shed_total{reason="queue_full"} 1' in output
+
+
+async def _queue(controller, client, order):
+    await controller.acquire(client=client)
+    order.append(client)
+
+
+@pytest.mark.asyncio
+async def test_round_robin_across_clients():
+    """测试空出的名额在客户端之间轮流分配"""
+    controller = AdmissionController(max_in_flight=1, max_queue=10, max_queue_wait=1.0)
+    await controller.acquire(client="a")
+
+    order = []
+    tasks = [asyncio.ensure_future(_queue(controller, client, order)) for client in ("a", "a", "a", "b")]
+    await asyncio.sleep(0)
+    assert controller.queue_depth == 4
+
+    for _ in range(4):
+        controller.release(client=order[-1] if order else "a")
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+
+    assert order == ["a", "b", "a", "a"]
+
+
+@pytest.mark.asyncio
+async def test_client_concurrency_quota():
+    """测试单个客户端达到并发上限后排队，其他客户端不受影响"""
+    controller = AdmissionController(max_in_flight=4, max_queue=10, max_queue_wait=1.0, client_max_in_flight=1)
+    await controller.acquire(client="a")
+
+    waiter = asyncio.ensure_future(controller.acquire(client="a"))
+    await asyncio.sleep(0)
+    assert not waiter.done()
+
+    await controller.acquire(client="b")
+    assert controller.client_in_flight("b") == 1
+
+    controller.release(client="a")
+    await asyncio.wait_for(waiter, 1)
+    assert controller.client_in_flight("a") == 1
+    assert controller.in_flight == 2
+
+
+@pytest.mark.asyncio
+async def test_full_queue_pushes_out_longest():
+    """测试队列已满时挤出最长队列末尾的调用"""
+    metrics = MetricsRegistry()
+    controller = AdmissionController(max_in_flight=1, max_queue=2, max_queue_wait=1.0, metrics=metrics)
+    await controller.acquire(client="a")
+    first = asyncio.ensure_future(controller.acquire(client="a"))
+    second = asyncio.ensure_future(controller.acquire(client="a"))
+    await asyncio.sleep(0)
+
+    other = asyncio.ensure_future(controller.acquire(client="b"))
+    await asyncio.sleep(0)
+
+    with pytest.raises(Overloaded):
+        await second
+    assert not first.done() and not other.done()
+    assert controller.queue_depth == 2
+    assert 'mcp_admission_shed_total{reason="pushed_out"} 1' in metrics.render()
+
+    # 同一客户端继续提交时不会挤出自己
+    with pytest.raises(Overloaded):
+        await controller.acquire(client="a")
+
+    for task in (first, other):
+        task.cancel()
+    await asyncio.gather(first, other, return_exceptions=True)
+    assert controller.queue_depth == 0
+
+
+def test_metric_values_full_precision():
+    """测试样本值按完整精度输出，大计数器不被舍入"""
+    metrics = MetricsRegistry()
+    counter = metrics.counter("bytes_total", "字节数")
+    counter.inc(12345678)
+    counter.inc(2 ** 53, kind="large")
+    counter.inc(0.125, kind="fraction")
+
+    output = metrics.render()
+
+    assert "mcp_bytes_total 12345678\n" in output
+    assert 'mcp_bytes_total{kind="large"} 9007199254740992\n' in output
+    assert 'mcp_bytes_total{kind="fraction"} 0.125\n' in output
@@ -0,0 +1,147 @@
+import codecs
+import json
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from mcp_fetch_server import charset
+from mcp_fetch_server.charset import CharsetResolver
+from mcp_fetch_server.metrics import MetricsRegistry
+from mcp_fetch_server.server import FetchMCPServer
+
+
+TEXT = "中文页面，包含一些非ASCII字符。"
+
+
+@pytest.fixture
+def detector(monkeypatch):
+    """记录传给检测库的样本，并固定返回gbk"""
+    samples = []
+
+    def detect(sample):
+        samples.append(sample)
+        return "gbk"
+
+    monkeypatch.setattr(charset, "_detector", detect)
+    return samples
+
+
+def test_header_charset():
+    """测试Content-Type声明的字符集优先"""
+    resolver = CharsetResolver()
+    assert resolver.resolve(TEXT.encode("gbk"), "text/html", "GBK") == ("gbk", "header")
+
+
+def test_unknown_header_charset_falls_through():
+    """测试无法识别的charset参数被忽略"""
+    resolver = CharsetResolver()
+    assert resolver.resolve(TEXT.encode("utf-8"), "text/plain", "x-unknown")[0] == "utf-8"
+
+
+def test_bom():
+    """测试根据BOM识别编码并去掉BOM"""
+    resolver = CharsetResolver()
+    body = codecs.BOM_UTF16_LE + TEXT.encode("utf-16-le")
+    assert resolver.resolve(body)[1] == "bom"
+    assert resolver.decode(body) == TEXT
+
+
+def test_json_is_utf8(detector):
+    """测试JSON类型不做检测"""
+    resolver = CharsetResolver()
+    assert resolver.resolve(TEXT.encode("gbk"), "application/problem+json") == ("utf-8", "json")
+    assert detector == []
+
+
+@pytest.mark.parametrize("head", [
+    b'<html><head><meta charset="gb2312">',
+    b"<html><head><META http-equiv='Content-Type' content='text/html; charset=GB2312'>",
+    b'<?xml version="1.0" encoding="gb2312"?><rss>',
+])
+def test_markup_charset(head, detector):
+    """测试从meta标签和XML声明中读取编码"""
+    resolver = CharsetResolver()
+    body = head + TEXT.encode("gb2312")
+    assert resolver.resolve(body, "text/html") == ("gb2312", "meta")
+    assert resolver.decode(body, "text/html").endswith(TEXT)
+    assert detector == []
+
+
+def test_meta_outside_prescan_is_ignored(detector):
+    """测试只在前META_SCAN_SIZE字节中查找meta标签"""
+    resolver = CharsetResolver()
+    body = b"<html>" + b" " * charset.META_SCAN_SIZE + b'<meta charset="gbk">' + TEXT.encode("gbk")
+    assert resolver.resolve(body, "text/html")[1] == "detected"
+
+
+def test_ascii_sample_not_cached():
+    """测试纯ASCII的样本按UTF-8解码且不缓存"""
+    resolver = CharsetResolver()
+    assert resolver.resolve(b"<html>hello</html>", "text/html", host="a.example") == ("utf-8", "default")
+    assert resolver.resolve(TEXT.encode("utf-8"), "text/html", host="a.example")[1] == "detected"
+
+
+def test_detects_on_bounded_sample_and_caches_per_host(detector):
+    """测试只对前缀样本检测，检测结果按主机缓存"""
+    metrics = MetricsRegistry()
+    resolver = CharsetResolver(sample_size=1024, metrics=metrics)
+    body = TEXT.encode("gbk") * 1000
+
+    assert resolver.decode(body, "text/html", host="gbk.example") == TEXT * 1000
+    assert [len(sample) for sample in detector] == [1024]
+
+    assert resolver.resolve(body, "text/html", host="gbk.example") == ("gbk", "host")
+    assert resolver.resolve(body, "text/html", host="other.example")[1] == "detected"
+    assert len(detector) == 2
+    output = metrics.render()
+    assert 'mcp_charset_resolved_total{source="detected"} 1' in output
+    assert "mcp_charset_cached_hosts 2" in output
+
+
+def test_truncated_utf8_sample(detector):
+    """测试样本在多字节字符中间截断时仍识别为UTF-8"""
+    resolver = CharsetResolver(sample_size=100)
+    body = TEXT.encode("utf-8") * 20
+    assert resolver.resolve(body, "text/plain") == ("utf-8", "detected")
+    assert detector == []
+
+
+def test_fallback_without_detector(monkeypatch):
+    """测试未安装检测库时按cp1252解码，不会失败"""
+    monkeypatch.setattr(charset, "_detector", lambda sample: None)
+    resolver = CharsetResolver()
+    body = "café ½".encode("cp1252")
+    assert resolver.resolve(body, "text/plain") == ("cp1252", "detected")
+    assert resolver.decode(body, "text/plain") == "café ½"
+
+
+def test_host_cache_is_bounded(detector):
+    """测试缓存的主机数不超过max_hosts，淘汰最久未使用的主机"""
+    resolver = CharsetResolver(max_hosts=2)
+    body = TEXT.encode("gbk")
+    for host in ("a", "b", "a", "c"):
+        resolver.resolve(body, host=host)
+    assert list(resolver._hosts) == ["a", "c"]
+
+
+@pytest_asyncio.fixture
+async def upstream(serve_routes):
+    async def handler(request):
+        # 不声明字符集，编码只在meta标签中
+        body = b'<html><head><meta charset="gbk"></head><body>' + TEXT.encode("gbk") + b"</body></html>"
+        return web.Response(body=body, headers={"Content-Type": "text/html"})
+
+    base = await serve_routes({"/": handler})
+    return base + "/"
+
+
+@pytest.mark.asyncio
+async def test_fetch_decodes_meta_charset(upstream):
+    """测试fetch按meta标签声明的字符集解码正文"""
+    server = FetchMCPServer()
+    try:
+        result = await server.call_tool("fetch", {"url": upstream})
+    finally:
+        await server.stop()
+
+    assert TEXT in json.loads(result[0].text)["body"]
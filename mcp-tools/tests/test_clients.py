@@ -0,0 +1,79 @@
+import json
+
+import pytest
+from mcp_fetch_server.admission import Overloaded
+from mcp_fetch_server.clients import ClientQuota, client_identity, current_client, key_digest
+from mcp_fetch_server.http_transport import HTTPTransportServer
+
+from test_mcp_endpoint import call, make_scope
+
+
+def test_identity_prefers_api_key():
+    """测试优先使用配置过的API密钥摘要作为身份，不暴露密钥本身"""
+    known = {key_digest("secret")}
+    by_header = client_identity({"x-api-key": "secret"}, "10.0.0.1", known)
+    by_bearer = client_identity({"authorization": "Bearer secret"}, "10.0.0.2", known)
+
+    assert by_header == by_bearer
+    assert by_header.startswith("key:")
+    assert "secret" not in by_header
+    assert client_identity({}, "10.0.0.1", known) == "ip:10.0.0.1"
+
+
+def test_unknown_key_uses_client_ip():
+    """测试未配置的密钥不作为身份，轮换随机密钥得不到新的身份"""
+    known = {key_digest("secret")}
+    assert client_identity({"x-api-key": "random-1"}, "10.0.0.1", known) == "ip:10.0.0.1"
+    assert client_identity({"authorization": "Bearer random-2"}, "10.0.0.1") == "ip:10.0.0.1"
+
+
+def test_byte_quota():
+    """测试超出字节配额后拒绝，其他客户端不受影响"""
+    quota = ClientQuota(max_bytes=100, window=60)
+    quota.check("a")
+    quota.record("a", 150)
+
+    with pytest.raises(Overloaded) as exc_info:
+        quota.check("a")
+    assert 1 <= exc_info.value.retry_after <= 60
+    quota.check("b")
+
+
+def test_byte_quota_window_resets():
+    """测试窗口结束后配额恢复"""
+    quota = ClientQuota(max_bytes=100, window=0)
+    quota.record("a", 150)
+
+    quota.check("a")
+    assert quota.usage("a") == 0
+
+
+@pytest.mark.asyncio
+async def test_quota_applies_per_client_over_http():
+    """测试按API密钥统计拉取的字节数，超出配额后返回503"""
+    transport = HTTPTransportServer("test-server", client_max_bytes=100, client_keys=["noisy", "quiet"])
+
+    async def handle_message(message):
+        current_client.get().bytes_fetched += 200
+        return {"jsonrpc": "2.0", "id": message["id"], "result": {}}
+
+    transport.mcp_server.handle_message = handle_message
+    body = b'{"jsonrpc":"2.0","id":1,"method":"tools/call","params":{"name":"fetch","arguments":{}}}'
+    headers = [(b"x-api-key", b"noisy")]
+
+    status, _, _ = await call(transport.get_app(), body, make_scope(headers=headers))
+    assert status == 200
+
+    status, response_headers, response = await call(transport.get_app(), body, make_scope(headers=headers))
+    assert status == 503
+    assert int(response_headers[b"retry-after"]) >= 1
+    assert json.loads(response)["error"]["code"] == -32002
+
+    status, _, _ = await call(transport.get_app(), body, make_scope(headers=[(b"x-api-key", b"quiet")]))
+    assert status == 200
+
+    # 未配置的密钥按客户端IP计入同一份配额
+    status, _, _ = await call(transport.get_app(), body, make_scope(headers=[(b"x-api-key", b"random-1")]))
+    assert status == 200
+    status, _, _ = await call(transport.get_app(), body, make_scope(headers=[(b"x-api-key", b"random-2")]))
+    assert status == 503
@@ -0,0 +1,128 @@
+import json
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from mcp_fetch_server.clients import ClientContext, current_client
+from mcp_fetch_server.content_store import ContentStore, content_digest
+from mcp_fetch_server.metrics import MetricsRegistry
+from mcp_fetch_server.server import FetchMCPServer
+
+
+BODY = "相同的正文 " * 500
+
+
+def test_digest_is_stable():
+    """测试相同内容得到相同摘要，不同内容得到不同摘要"""
+    assert content_digest("abc") == content_digest("abc")
+    assert content_digest("abc") != content_digest("abd")
+    assert content_digest("abc").split(":")[0] in ("xxh128", "blake2b")
+
+
+def test_tracks_clients():
+    """测试按客户端记录是否已收到正文"""
+    metrics = MetricsRegistry()
+    store = ContentStore(metrics=metrics)
+    assert store.add("d", "text", "a") is False
+    assert store.add("d", "text", "a") is True
+    assert store.add("d", "text", "b") is False
+    assert store.get("d") == "text"
+    assert "mcp_content_store_refs_total 1" in metrics.render()
+
+
+def test_partial_delivery_not_recorded():
+    """测试sent为False时只保存正文，不记录客户端已收到"""
+    store = ContentStore()
+    assert store.add("d", "text", "a", sent=False) is False
+    assert store.add("d", "text", "a") is False
+    assert store.add("d", "text", "a") is True
+
+
+def test_evicts_least_recently_used():
+    """测试超出字节上限时淘汰最久未使用的正文"""
+    text = "x" * 1000
+    store = ContentStore(max_bytes=2500)
+    store.add("a", text, "c")
+    store.add("b", text, "c")
+    store.get("a")
+    store.add("c", text, "c")
+
+    assert store.get("b") is None
+    assert store.get("a") == text
+    assert store.size <= 2500
+
+
+@pytest_asyncio.fixture
+async def upstream(serve_routes):
+    async def handler(request):
+        return web.Response(text=BODY)
+
+    base = await serve_routes({"/a": handler, "/mirror": handler})
+    return base
+
+
+async def _call(server, tool, arguments, client_id="ip:127.0.0.1"):
+    token = current_client.set(ClientContext(client_id))
+    try:
+        result = await server.call_tool(tool, arguments)
+    finally:
+        current_client.reset(token)
+    return json.loads(result[0].text)
+
+
+@pytest.mark.asyncio
+async def test_repeated_content_returns_reference(upstream):
+    """测试同一客户端再次拿到相同正文时只返回摘要，get_content可取回正文"""
+    server = FetchMCPServer()
+    try:
+        first = await _call(server, "fetch", {"url": upstream + "/a", "body_ref": True})
+        mirror = await _call(server, "fetch", {"url": upstream + "/mirror", "body_ref": True})
+        other = await _call(server, "fetch", {"url": upstream + "/a", "body_ref": True}, client_id="ip:10.0.0.2")
+        resolved = await _call(server, "get_content", {"digest": mirror["body_ref"]})
+    finally:
+        await server.stop()
+
+    assert first["body"] == BODY
+    assert "body_ref" not in first
+    assert "body" not in mirror
+    assert mirror["body_ref"] == first["digest"]
+    assert other["body"] == BODY
+    assert resolved["body"] == BODY
+    assert resolved["tokens"] > 0
+
+
+@pytest.mark.asyncio
+async def test_without_opt_in_always_sends_body(upstream):
+    """测试未指定body_ref时总是返回正文且不计算摘要"""
+    server = FetchMCPServer()
+    try:
+        results = [await _call(server, "fetch", {"url": upstream + "/a"}) for _ in range(2)]
+    finally:
+        await server.stop()
+
+    assert all(result["body"] == BODY and "digest" not in result for result in results)
+    assert server.content_store.size == 0
+
+
+@pytest.mark.asyncio
+async def test_paged_content_is_not_marked_received(upstream):
+    """测试只拿到一页时不算已收到，之后的完整请求仍返回正文"""
+    server = FetchMCPServer()
+    try:
+        first = await _call(server, "fetch", {"url": upstream + "/a", "body_ref": True, "max_length": 100})
+        full = await _call(server, "fetch", {"url": upstream + "/a", "body_ref": True})
+        paged = await _call(server, "get_content", {"digest": first["digest"], "max_length": 100, "start_index": 100})
+    finally:
+        await server.stop()
+
+    assert full["body"] == BODY
+    assert paged["body"] == BODY[100:200]
+    assert paged["next_start_index"] == 200
+
+
+@pytest.mark.asyncio
+async def test_unknown_digest():
+    """测试摘要不存在时返回错误"""
+    server = FetchMCPServer()
+    result = await _call(server, "get_content", {"digest": "blake2b:00"})
+    assert result["error"]["code"] == -32602
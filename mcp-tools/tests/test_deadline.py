@@ -0,0 +1,58 @@
+import time
+
+import pytest
+from mcp_fetch_server.deadline import Deadline, DeadlineExceeded
+
+
+def test_from_header():
+    """测试从请求头解析截止时间"""
+    deadline = Deadline.from_request("2.5")
+
+    assert deadline.timeout == 2.5
+    assert 0 < deadline.remaining() <= 2.5
+
+
+def test_from_message_meta():
+    """测试从消息_meta解析截止时间"""
+    message = {"method": "tools/call", "params": {"_meta": {"timeout": 5}}}
+
+    deadline = Deadline.from_request(None, message)
+
+    assert deadline.timeout == 5.0
+
+
+def test_header_takes_precedence():
+    """测试请求头优先于消息_meta"""
+    message = {"params": {"_meta": {"timeout": 5}}}
+
+    deadline = Deadline.from_request("1", message)
+
+    assert deadline.timeout == 1.0
+
+
+def test_invalid_values_ignored():
+    """测试非法截止时间被忽略"""
+    for value in ["abc", "0", "-1", "nan", "inf", "-inf"]:
+        assert Deadline.from_request(value) is None
+    assert Deadline.from_request(None, {"params": []}) is None
+    assert Deadline.from_request(None, {"params": {"_meta": {"timeout": float("nan")}}}) is None
+
+
+def test_clamp():
+    """测试超时时间被限制在剩余时间内"""
+    deadline = Deadline(1.0)
+
+    assert deadline.clamp(30) <= 1.0
+    assert deadline.clamp(0.1) == 0.1
+    assert deadline.clamp(None) <= 1.0
+
+
+def test_expired_deadline_raises():
+    """测试截止时间已过时抛出异常"""
+    deadline = Deadline(0.01)
+    time.sleep(0.02)
+
+    assert deadline.expired
+    with pytest.raises(DeadlineExceeded):
+        deadline.clamp(30)
+    assert isinstance(DeadlineExceeded(), TimeoutError)
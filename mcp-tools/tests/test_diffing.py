@@ -0,0 +1,167 @@
+import copy
+import json
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from mcp_fetch_server import diffing
+from mcp_fetch_server.diffing import Snapshot, SnapshotStore, json_patch, unified_diff
+from mcp_fetch_server.server import FetchMCPServer
+
+
+def _apply(document, patch):
+    """按RFC 6902应用add/remove/replace操作，用于验证生成的补丁"""
+    document = copy.deepcopy(document)
+    for op in patch:
+        if op["path"] == "":
+            document = op["value"]
+            continue
+        *parents, last = [p.replace("~1", "/").replace("~0", "~") for p in op["path"][1:].split("/")]
+        target = document
+        for part in parents:
+            target = target[int(part)] if isinstance(target, list) else target[part]
+        if isinstance(target, list):
+            index = int(last)
+            if op["op"] == "add":
+                target.insert(index, op["value"])
+            elif op["op"] == "remove":
+                del target[index]
+            else:
+                target[index] = op["value"]
+        elif op["op"] == "remove":
+            del target[last]
+        else:
+            target[last] = op["value"]
+    return document
+
+
+@pytest.mark.parametrize("old,new", [
+    ({"a": 1, "b": {"c": 2}}, {"a": 1, "b": {"c": 3}, "d": [1]}),
+    ({"a/b": 1, "m~n": 2}, {"a/b": 2}),
+    ([1, 2, 3], [0, 1, 2, 3]),
+    ([{"id": 1}, {"id": 2}, {"id": 3}], [{"id": 1}, {"id": 3, "x": 1}, {"id": 4}]),
+    ({"v": 1}, {"v": True}),
+    ({"v": 1}, [1]),
+])
+def test_json_patch_round_trip(old, new):
+    """测试补丁应用到旧值后得到新值"""
+    assert _apply(old, json_patch(old, new)) == new
+
+
+@pytest.mark.parametrize("old,new,patch", [
+    ({"a": {"b": True}}, {"a": {"b": 1}}, [{"op": "replace", "path": "/a/b", "value": 1}]),
+    ({"a": [1, 2]}, {"a": [1.0, 2]}, [{"op": "replace", "path": "/a/0", "value": 1.0}]),
+    ({"a": {"b": 1}, "c": 0}, {"a": {"b": 1}, "c": False}, [{"op": "replace", "path": "/c", "value": False}]),
+])
+def test_json_patch_nested_type_change(old, new, patch):
+    """测试嵌套值在Python中相等但JSON类型不同时生成replace操作"""
+    assert json_patch(old, new) == patch
+    assert json.dumps(_apply(old, patch)) == json.dumps(new)
+
+
+def test_list_prepend_is_single_add():
+    """测试数组头部插入元素只产生一个add操作"""
+    old = [{"id": i} for i in range(10)]
+    patch = json_patch(old, [{"id": -1}] + old)
+    assert patch == [{"op": "add", "path": "/0", "value": {"id": -1}}]
+
+
+def test_unified_diff():
+    """测试文本差异为unified diff格式"""
+    diff = unified_diff("a\nb\nc", "a\nB\nc")
+    assert diff.startswith("--- previous\n+++ current\n")
+    assert "-b\n+B\n" in diff
+
+
+def test_snapshot_store_evicts():
+    """测试快照超出字节上限时淘汰最久未使用的快照"""
+    store = SnapshotStore(max_bytes=2500)
+    for key in ("a", "b", "c"):
+        store.put(key, Snapshot("text", "x" * 1000, key, None, None, 1000))
+    assert store.get("a") is None
+    assert store.get("c") is not None
+    assert store.size <= 2500
+
+
+@pytest_asyncio.fixture
+async def upstream(serve_routes):
+    state = {"text": "line 1\nline 2\n", "json": {"items": [1, 2]}, "requests": []}
+
+    async def text(request):
+        state["requests"].append(dict(request.headers))
+        etag = '"%d"' % hash(state["text"])
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304)
+        return web.Response(text=state["text"], headers={"ETag": etag})
+
+    async def data(request):
+        state["requests"].append(dict(request.headers))
+        return web.json_response(state["json"])
+
+    base = await serve_routes({"/text": text, "/json": data})
+    return base, state
+
+
+async def _diff(server, arguments):
+    result = await server.call_tool("fetch_diff", arguments)
+    return json.loads(result[0].text)
+
+
+@pytest.mark.asyncio
+async def test_text_diff_with_etag(upstream):
+    """测试首次返回完整内容，未变化时由条件请求短路，变化时返回unified diff"""
+    base, state = upstream
+    server = FetchMCPServer()
+    try:
+        first = await _diff(server, {"url": base + "/text"})
+        same = await _diff(server, {"url": base + "/text"})
+        state["text"] = "line 1\nline two\n"
+        changed = await _diff(server, {"url": base + "/text"})
+    finally:
+        await server.stop()
+
+    assert first["changed"] is True and first["body"] == "line 1\nline 2\n"
+    assert same == {"status": 304, "changed": False, "reason": "not_modified"}
+    assert "If-None-Match" in state["requests"][1]
+    assert "-line 2\n+line two\n" in changed["diff"]
+    assert "body" not in changed
+
+
+@pytest.mark.asyncio
+async def test_json_patch_and_hash_short_circuit(upstream, monkeypatch):
+    """测试JSON内容返回JSON Patch，内容摘要相同时不计算差异，大内容在线程池中计算"""
+    base, state = upstream
+    monkeypatch.setattr(diffing, "OFFLOAD_SIZE", 0)
+    server = FetchMCPServer()
+    try:
+        first = await _diff(server, {"url": base + "/json"})
+        same = await _diff(server, {"url": base + "/json"})
+        state["json"] = {"items": [0, 1, 2]}
+        changed = await _diff(server, {"url": base + "/json"})
+    finally:
+        await server.stop()
+
+    assert first["format"] == "json" and first["body"] == {"items": [1, 2]}
+    assert same == {"status": 200, "changed": False, "reason": "unchanged"}
+    assert changed["patch"] == [{"op": "add", "path": "/items/0", "value": 0}]
+    assert 'mcp_diff_results_total{result="changed"} 1' in server.metrics.render()
+
+
+@pytest.mark.asyncio
+async def test_snapshots_are_per_client(upstream):
+    """测试不同客户端的快照互不影响"""
+    from mcp_fetch_server.clients import ClientContext, current_client
+
+    base, _ = upstream
+    server = FetchMCPServer()
+    try:
+        await _diff(server, {"url": base + "/json"})
+        token = current_client.set(ClientContext("ip:10.0.0.2"))
+        try:
+            other = await _diff(server, {"url": base + "/json"})
+        finally:
+            current_client.reset(token)
+    finally:
+        await server.stop()
+
+    assert other["changed"] is True and "body" in other
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+from mcp_fetch_server import eventloop
+
+
+def test_explicit_asyncio(monkeypatch):
+    """测试显式选择asyncio时不检查uvloop"""
+    monkeypatch.setattr(eventloop, "_available", lambda module: True)
+
+    assert eventloop.resolve_loop("asyncio") == "asyncio"
+    assert eventloop.resolve_http("h11") == "h11"
+
+
+def test_fallback_when_missing(monkeypatch):
+    """测试可选依赖缺失时回退"""
+    monkeypatch.setattr(eventloop, "_available", lambda module: False)
+
+    assert eventloop.resolve_loop("auto") == "asyncio"
+    assert eventloop.resolve_loop("uvloop") == "asyncio"
+    assert eventloop.resolve_http("auto") == "h11"
+    assert eventloop.resolve_http("httptools") == "h11"
+
+
+def test_auto_prefers_fast_implementations(monkeypatch):
+    """测试auto在可用时选择uvloop和httptools"""
+    monkeypatch.setattr(eventloop, "_available", lambda module: True)
+    monkeypatch.setattr(eventloop.sys, "platform", "linux")
+
+    assert eventloop.resolve_loop("auto") == "uvloop"
+    assert eventloop.resolve_http("auto") == "httptools"
+
+
+def test_unknown_choice():
+    """测试未知的实现名称"""
+    with pytest.raises(ValueError):
+        eventloop.resolve_loop("trio")
+    with pytest.raises(ValueError):
+        eventloop.resolve_http("h2")
+
+
+def test_run_returns_result():
+    """测试run返回协程结果"""
+    async def answer():
+        await asyncio.sleep(0)
+        return eventloop.describe_loop()
+
+    assert eventloop.run(answer(), loop="asyncio") == "asyncio"
+    assert eventloop.run(answer(), loop="auto") == eventloop.resolve_loop("auto")
@@ -0,0 +1,130 @@
+import json
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from mcp_fetch_server.grep import MAX_LINE, StreamSearcher, compile_pattern
+from mcp_fetch_server.server import FetchMCPServer
+
+
+def _search(text, pattern, step=None, regex=False, **kwargs):
+    """按step个字符一段送入文本"""
+    searcher = StreamSearcher(compile_pattern(pattern, regex), **kwargs)
+    step = step or len(text)
+    for i in range(0, len(text), step):
+        if searcher.feed(text[i:i + step]):
+            break
+    else:
+        searcher.finish()
+    return searcher
+
+
+def test_match_across_chunks():
+    """测试跨块边界的匹配，结果与一次性送入相同"""
+    text = "alpha\nbeta needle gamma\ndelta\r\nneedle\n"
+    whole = _search(text, "needle", context=1)
+    split = _search(text, "needle", step=3, context=1)
+    assert split.matches == whole.matches
+    assert [m["line"] for m in split.matches] == [2, 4]
+    first, second = split.matches
+    assert first["column"] == 5 and first["offset"] == 11
+    assert first["before"] == ["alpha"] and first["after"] == ["delta"]
+    assert second["text"] == "needle" and second["after"] == []
+    assert split.complete
+
+
+def test_regex_and_ignore_case():
+    """测试正则表达式和忽略大小写"""
+    searcher = StreamSearcher(compile_pattern(r"id=(\d+)$", regex=True, ignore_case=True), context=0)
+    searcher.feed("ID=12\r\nid=x\nid=7")
+    searcher.finish()
+    assert [m["match"] for m in searcher.matches] == ["ID=12", "id=7"]
+    assert "before" not in searcher.matches[0]
+
+
+def test_stops_after_max_matches():
+    """测试找到足够的匹配并收集完后文后停止"""
+    text = "".join(f"line {i} hit\n" for i in range(100))
+    searcher = _search(text, "hit", step=7, context=2, max_matches=3)
+    assert len(searcher.matches) == 3
+    assert searcher.matches[-1]["after"] == ["line 3 hit", "line 4 hit"]
+    assert searcher.done and not searcher.complete
+    assert searcher.chars < 100
+
+
+def test_long_line_windows():
+    """测试长行按窗口扫描，跨窗口的匹配只报告一次，缓冲不随行长增长"""
+    filler = "x" * (MAX_LINE - 3)
+    text = filler + "needle" + "y" * (MAX_LINE * 3) + "needle" + "z" * 10 + "\nnext\n"
+    searcher = StreamSearcher(compile_pattern("needle"), context=1)
+    for i in range(0, len(text), 1000):
+        searcher.feed(text[i:i + 1000])
+        assert len(searcher._buf) <= MAX_LINE + 1000
+    searcher.finish()
+    assert [m["offset"] for m in searcher.matches] == [len(filler), len(filler) + 6 + MAX_LINE * 3]
+    assert all(m["line"] == 1 and "needle" in m["text"] for m in searcher.matches)
+    assert searcher.matches[0]["after"] == ["next"]
+
+
+@pytest.mark.parametrize("pattern,regex", [("", False), ("(", True), ("a*", True)])
+def test_invalid_pattern(pattern, regex):
+    """测试空模式、无效正则和能匹配空串的模式"""
+    with pytest.raises(ValueError):
+        compile_pattern(pattern, regex)
+
+
+@pytest_asyncio.fixture
+async def upstream(serve_routes):
+    async def large(request):
+        response = web.StreamResponse(headers={"Content-Type": "text/plain; charset=utf-8"})
+        await response.prepare(request)
+        for i in range(2000):
+            await response.write("".join(f"第{i}块 第{j}行 {'匹配' if j == 5 else ''}\n" for j in range(50)).encode())
+        await response.write_eof()
+        return response
+
+    async def gbk(request):
+        body = "标题\n正文包含关键字\n结尾".encode("gbk")
+        return web.Response(body=body, headers={"Content-Type": "text/plain; charset=gbk"})
+
+    base = await serve_routes({"/large": large, "/gbk": gbk})
+    return base
+
+
+async def _grep(server, arguments):
+    result = await server.call_tool("fetch_grep", arguments)
+    return json.loads(result[0].text)
+
+
+@pytest.mark.asyncio
+async def test_fetch_grep_stops_early(upstream):
+    """测试大正文找到足够的匹配后停止读取"""
+    server = FetchMCPServer()
+    try:
+        result = await _grep(server, {"url": upstream + "/large", "pattern": "匹配", "max_matches": 2, "context": 1})
+    finally:
+        await server.stop()
+
+    assert result["status"] == 200
+    assert result["count"] == 2 and result["complete"] is False
+    assert [m["line"] for m in result["matches"]] == [6, 56]
+    assert result["matches"][0]["before"] == ["第0块 第4行 "]
+    assert result["scanned_bytes"] < 1024 * 1024
+
+
+@pytest.mark.asyncio
+async def test_fetch_grep_charset_and_errors(upstream):
+    """测试按响应字符集解码，无效正则返回参数错误"""
+    server = FetchMCPServer()
+    try:
+        result = await _grep(server, {"url": upstream + "/gbk", "pattern": "关键字"})
+        invalid = await _grep(server, {"url": upstream + "/gbk", "pattern": "(", "regex": True})
+    finally:
+        await server.stop()
+
+    assert result["complete"] is True
+    assert result["matches"] == [{
+        "line": 2, "column": 4, "offset": 7, "match": "关键字", "text": "正文包含关键字",
+        "before": ["标题"], "after": ["结尾"],
+    }]
+    assert invalid["error"]["code"] == -32602
@@ -0,0 +1,125 @@
+import asyncio
+import json
+
+import pytest
+from mcp_fetch_server.health import HealthMonitor
+from mcp_fetch_server.http_transport import HTTPTransportServer
+from mcp_fetch_server.metrics import MetricsRegistry
+
+from test_mcp_endpoint import call, make_scope
+
+
+def make_load(**overrides):
+    load = {
+        "draining": False,
+        "in_flight": 0,
+        "max_in_flight": 4,
+        "queue_depth": 0,
+        "max_queue": 8,
+        "event_loop": {"lag_ms": 0.0},
+        "upstream_pool": {"in_use": 0, "limit": 100},
+    }
+    load.update(overrides)
+    return load
+
+
+def test_ready_when_idle():
+    """测试空闲时就绪"""
+    monitor = HealthMonitor(make_load, window=0)
+    status, body = monitor.response("/ready")
+
+    assert status == 200
+    assert json.loads(body)["status"] == "ready"
+
+
+@pytest.mark.parametrize("overrides, reason", [
+    ({"in_flight": 4, "queue_depth": 1}, "admission"),
+    ({"event_loop": {"lag_ms": 800.0}}, "event_loop_lag"),
+    ({"upstream_pool": {"in_use": 100, "limit": 100}}, "upstream_pool"),
+])
+def test_saturation_reasons(overrides, reason):
+    """测试各项饱和信号"""
+    monitor = HealthMonitor(lambda: make_load(**overrides), window=0)
+    monitor.refresh()
+
+    status, body = monitor.response("/ready")
+    assert status == 503
+    assert json.loads(body)["saturated"] == [reason]
+    # 兼容的/health只在排空时失败
+    assert monitor.response("")[0] == 200
+
+
+def test_memory_limit():
+    """测试常驻内存超过上限时视为饱和"""
+    monitor = HealthMonitor(make_load, window=0, memory_limit=1)
+    monitor.refresh()
+
+    assert monitor.reasons == ["memory"]
+
+
+@pytest.mark.asyncio
+async def test_readiness_requires_sustained_saturation():
+    """测试饱和与恢复都要持续window秒才改变就绪状态"""
+    load = make_load(in_flight=4, queue_depth=2)
+    monitor = HealthMonitor(lambda: dict(load), window=0.05)
+
+    monitor.refresh()
+    assert monitor.ready
+    await asyncio.sleep(0.06)
+    monitor.refresh()
+    assert not monitor.ready
+
+    load["queue_depth"] = 0
+    monitor.refresh()
+    assert not monitor.ready
+    await asyncio.sleep(0.06)
+    monitor.refresh()
+    assert monitor.ready
+
+
+def test_ready_gauge():
+    """测试就绪状态导出为指标"""
+    metrics = MetricsRegistry()
+    monitor = HealthMonitor(lambda: make_load(in_flight=4, queue_depth=1), window=0, metrics=metrics)
+    monitor.refresh()
+
+    assert "mcp_ready 0" in metrics.render()
+
+
+@pytest.mark.asyncio
+async def test_endpoints_serve_cached_snapshot():
+    """测试健康检查端点直接返回缓存快照，不计入进行中请求"""
+    transport = HTTPTransportServer("test-server")
+    app = transport.get_app()
+
+    status, headers, body = await call(app, b"", make_scope(method="GET", path="/health/live"))
+    assert status == 200
+    assert json.loads(body)["status"] == "alive"
+
+    status, headers, body = await call(app, b"", make_scope(method="GET", path="/health/ready"))
+    assert status == 200
+    payload = json.loads(body)
+    assert payload["status"] == "ready"
+    assert payload["max_in_flight"] == transport.admission.max_in_flight
+    assert transport.active_requests == 0
+
+
+@pytest.mark.asyncio
+async def test_draining_fails_readiness_immediately():
+    """测试开始排空后立即返回503"""
+    transport = HTTPTransportServer("test-server", drain_timeout=0)
+    app = transport.get_app()
+    await call(app, b"", make_scope(method="GET", path="/health"))
+
+    transport.begin_drain()
+    status, _, body = await call(app, b"", make_scope(method="GET", path="/health"))
+    assert status == 503
+    assert json.loads(body)["status"] == "draining"
+
+    status, _, body = await call(app, b"", make_scope(method="GET", path="/health/ready"))
+    assert status == 503
+    assert json.loads(body)["status"] == "draining"
+
+    status, _, _ = await call(app, b"", make_scope(method="GET", path="/health/live"))
+    assert status == 200
+    await transport._drain_task
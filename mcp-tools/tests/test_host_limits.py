@@ -0,0 +1,172 @@
+import asyncio
+import json
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from mcp_fetch_server.deadline import Deadline, current_deadline
+from mcp_fetch_server.host_limits import AdaptiveLimit, HostLimiter
+from mcp_fetch_server.metrics import MetricsRegistry
+from mcp_fetch_server.server import FetchMCPServer
+
+
+@pytest.mark.asyncio
+async def test_queues_beyond_limit():
+    """测试超过上限的请求排队，名额归还后按顺序获准"""
+    limit = AdaptiveLimit(initial_limit=1)
+    await limit.acquire()
+
+    waiter = asyncio.ensure_future(limit.acquire())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+
+    limit.release(None, 1)
+    await asyncio.wait_for(waiter, 1)
+    assert limit.in_flight == 1
+
+
+@pytest.mark.asyncio
+async def test_queue_timeout():
+    """测试排队超时抛出TimeoutError且不占用名额"""
+    limit = AdaptiveLimit(initial_limit=1)
+    await limit.acquire()
+
+    with pytest.raises(asyncio.TimeoutError):
+        await limit.acquire(timeout=0.01)
+
+    limit.release(None, 1)
+    assert limit.in_flight == 0
+    assert limit.idle
+
+
+def test_limit_grows_with_stable_latency():
+    """测试延迟平稳且并发饱和时上限增长"""
+    limit = AdaptiveLimit(initial_limit=10, max_limit=50)
+    for _ in range(50):
+        limit.in_flight += 1
+        limit.release(0.1, in_flight=int(limit.limit))
+
+    assert limit.limit > 10
+    assert limit.limit <= 50
+
+
+def test_limit_shrinks_when_latency_rises():
+    """测试延迟升高时上限收缩"""
+    limit = AdaptiveLimit(initial_limit=20)
+    for _ in range(20):
+        limit.in_flight += 1
+        limit.release(0.1, in_flight=20)
+    before = limit.limit
+
+    for _ in range(20):
+        limit.in_flight += 1
+        limit.release(1.0, in_flight=int(limit.limit))
+
+    assert limit.limit < before
+
+
+def test_app_limited_does_not_grow():
+    """测试调用方并发不足时上限不变"""
+    limit = AdaptiveLimit(initial_limit=10)
+    for _ in range(20):
+        limit.in_flight += 1
+        limit.release(0.1, in_flight=1)
+
+    assert limit.limit == 10
+
+
+def test_congestion_backoff():
+    """测试过载信号使上限乘性减小，且不低于下限"""
+    limit = AdaptiveLimit(initial_limit=10, min_limit=2)
+    limit.in_flight += 1
+    limit.release(None, 1, congested=True)
+    assert limit.limit == pytest.approx(9.0)
+
+    for _ in range(100):
+        limit.in_flight += 1
+        limit.release(None, 1, congested=True)
+    assert limit.limit == 2
+
+
+@pytest.mark.asyncio
+async def test_host_limiter_metrics():
+    """测试各主机的上限和并发数通过指标导出"""
+    metrics = MetricsRegistry()
+    limiter = HostLimiter(initial_limit=5, metrics=metrics)
+
+    in_flight = await limiter.acquire("example.com")
+    output = metrics.render()
+    assert 'mcp_upstream_concurrency_limit{host="example.com"} 5' in output
+    assert 'mcp_upstream_in_flight{host="example.com"} 1' in output
+
+    limiter.release("example.com", None, in_flight, congested=True)
+    assert limiter.limits()["example.com"] == pytest.approx(4.5)
+    assert "mcp_upstream_congestion_total 1" in metrics.render()
+
+
+@pytest.mark.asyncio
+async def test_host_limiter_evicts_idle_hosts():
+    """测试主机数超过上限时淘汰空闲主机，保留正在使用的主机"""
+    limiter = HostLimiter(max_hosts=2)
+    await limiter.acquire("busy.example")
+    limiter.get("idle.example")
+    limiter.get("new.example")
+
+    assert set(limiter.limits()) == {"busy.example", "new.example"}
+
+
+@pytest.mark.asyncio
+async def test_host_limiter_shares_overflow_limit():
+    """测试主机表已满且没有空闲主机时新主机共用other上限，主机表和指标不再增长"""
+    metrics = MetricsRegistry()
+    limiter = HostLimiter(initial_limit=5, max_hosts=1, metrics=metrics)
+    busy = await limiter.acquire("busy.example")
+    first = await limiter.acquire("a.example")
+    second = await limiter.acquire("b.example")
+
+    assert set(limiter.limits()) == {"busy.example", "other"}
+    assert limiter.in_flight == 3
+    output = metrics.render()
+    assert 'mcp_upstream_in_flight{host="other"} 2' in output
+    assert "a.example" not in output and "b.example" not in output
+
+    limiter.release("a.example", None, first, congested=True)
+    limiter.release("b.example", None, second)
+    limiter.release("busy.example", None, busy)
+    assert limiter.limits()["other"] == pytest.approx(4.5)
+    assert limiter.in_flight == 0
+
+    # 共用上限中的请求结束后，主机可以重新获得自己的上限
+    await limiter.acquire("a.example")
+    assert set(limiter.limits()) == {"a.example", "other"}
+
+
+@pytest_asyncio.fixture
+async def slow_upstream(serve_routes):
+    async def handler(request):
+        await asyncio.sleep(1)
+        return web.Response(text="late")
+
+    base = await serve_routes({"/slow": handler})
+    return base[len("http://"):]
+
+
+@pytest.mark.asyncio
+async def test_client_deadline_does_not_shrink_limit(slow_upstream):
+    """测试客户端截止时间到期的超时不收缩主机上限，服务器读取超时仍视为拥塞"""
+    host = slow_upstream
+    server = FetchMCPServer(upstream_initial_limit=10)
+    try:
+        token = current_deadline.set(Deadline(0.2))
+        try:
+            expired = json.loads((await server.call_tool("fetch", {"url": f"http://{host}/slow"}))[0].text)
+        finally:
+            current_deadline.reset(token)
+        after_deadline = server.host_limiter.limits()[host]
+        read_timeout = json.loads((await server.call_tool("fetch", {"url": f"http://{host}/slow", "read_timeout": 0.2}))[0].text)
+    finally:
+        await server.stop()
+
+    assert "error" in expired and "error" in read_timeout
+    assert after_deadline == 10
+    assert server.host_limiter.limits()[host] < 10
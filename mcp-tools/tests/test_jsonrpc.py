@@ -0,0 +1,55 @@
+import pytest
+from mcp_fetch_server.server import FetchMCPServer
+
+
+@pytest.fixture
+def server():
+    return FetchMCPServer("test-server")
+
+
+@pytest.mark.asyncio
+async def test_initialize(server):
+    """测试initialize握手"""
+    response = await server.handle_message({
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "initialize",
+        "params": {"protocolVersion": "2024-11-05"}
+    })
+
+    assert response["id"] == 1
+    assert response["result"]["protocolVersion"] == "2024-11-05"
+    assert response["result"]["serverInfo"]["name"] == "test-server"
+
+
+@pytest.mark.asyncio
+async def test_tools_list(server):
+    """测试工具列表来自注册表"""
+    response = await server.handle_message({"jsonrpc": "2.0", "id": 2, "method": "tools/list"})
+
+    names = [tool["name"] for tool in response["result"]["tools"]]
+    assert names == ["fetch", "fetch_json", "get_content", "fetch_diff", "watch", "unwatch", "fetch_grep"]
+    assert "url" in response["result"]["tools"][0]["inputSchema"]["properties"]
+
+
+@pytest.mark.asyncio
+async def test_notification_has_no_response(server):
+    """测试通知消息不返回响应"""
+    assert await server.handle_message({"jsonrpc": "2.0", "method": "notifications/initialized"}) is None
+
+
+@pytest.mark.asyncio
+async def test_errors(server):
+    """测试JSON-RPC错误码"""
+    invalid = await server.handle_message(["not", "an", "object"])
+    unknown_method = await server.handle_message({"jsonrpc": "2.0", "id": 3, "method": "resources/list"})
+    unknown_tool = await server.handle_message({
+        "jsonrpc": "2.0",
+        "id": 4,
+        "method": "tools/call",
+        "params": {"name": "nope", "arguments": {}}
+    })
+
+    assert invalid["error"]["code"] == -32600
+    assert unknown_method["error"]["code"] == -32601
+    assert unknown_tool["error"]["code"] == -32602
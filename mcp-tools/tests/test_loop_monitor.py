@@ -0,0 +1,67 @@
+import asyncio
+import logging
+import time
+
+import pytest
+from mcp_fetch_server.loop_monitor import LoopMonitor
+from mcp_fetch_server.metrics import MetricsRegistry
+
+
+def _blocking_callback(seconds: float):
+    time.sleep(seconds)
+
+
+@pytest.mark.asyncio
+async def test_measures_lag():
+    """测试阻塞事件循环后测得相应的延迟"""
+    monitor = LoopMonitor(interval=0.01, block_threshold=0)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.02)
+        _blocking_callback(0.1)
+        await asyncio.sleep(0.03)
+    finally:
+        await monitor.stop()
+
+    snapshot = monitor.snapshot()
+    assert snapshot["max_lag_ms"] >= 50
+    assert snapshot["blocked_total"] == 0
+
+
+@pytest.mark.asyncio
+async def test_captures_blocking_stack(caplog):
+    """测试阻塞超过阈值时抓取阻塞处的调用栈"""
+    metrics = MetricsRegistry()
+    monitor = LoopMonitor(interval=0.01, block_threshold=0.05, metrics=metrics)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.02)
+        with caplog.at_level(logging.WARNING, logger="mcp_fetch_server.loop_monitor"):
+            _blocking_callback(0.2)
+            await asyncio.sleep(0.03)
+    finally:
+        await monitor.stop()
+
+    assert monitor.blocked_total == 1
+    assert "_blocking_callback" in monitor.last_block["stack"]
+    assert "_blocking_callback" in caplog.text
+    assert "stack" not in monitor.snapshot()["last_block"]
+    assert "mcp_event_loop_blocked_total 1" in metrics.render()
+
+
+@pytest.mark.asyncio
+async def test_rate_limits_logs(caplog):
+    """测试限流期间的阻塞只计数不记录日志"""
+    monitor = LoopMonitor(interval=0.01, block_threshold=0.05, log_interval=60)
+    monitor.start()
+    try:
+        with caplog.at_level(logging.WARNING, logger="mcp_fetch_server.loop_monitor"):
+            for _ in range(2):
+                await asyncio.sleep(0.02)
+                _blocking_callback(0.15)
+            await asyncio.sleep(0.03)
+    finally:
+        await monitor.stop()
+
+    assert monitor.blocked_total == 2
+    assert len(caplog.records) == 1
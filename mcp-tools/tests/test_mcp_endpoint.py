@@ -0,0 +1,123 @@
+import asyncio
+import json
+
+import pytest
+from mcp_fetch_server.http_transport import HTTPTransportServer
+
+
+def make_scope(method="POST", path="/mcp", headers=()):
+    return {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "scheme": "http",
+        "server": ("127.0.0.1", 8000),
+        "headers": [(b"content-type", b"application/json")] + list(headers),
+        "client": ("127.0.0.1", 50000),
+    }
+
+
+async def call(app, body, scope=None, disconnect_after=None):
+    """调用ASGI应用，返回状态码、响应头和响应体"""
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        if disconnect_after is None:
+            await asyncio.Event().wait()
+        await asyncio.sleep(disconnect_after)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope or make_scope(), receive, send)
+    headers = dict(sent[0]["headers"])
+    return sent[0]["status"], headers, sent[1]["body"]
+
+
+@pytest.fixture
+def transport():
+    return HTTPTransportServer("test-server")
+
+
+@pytest.mark.asyncio
+async def test_ping(transport):
+    """测试原始ASGI端点处理JSON-RPC请求"""
+    status, headers, body = await call(transport.get_app(), b'{"jsonrpc":"2.0","id":1,"method":"ping"}')
+
+    assert status == 200
+    assert headers[b"content-type"] == b"application/json"
+    assert headers[b"access-control-allow-origin"] == b"*"
+    assert b"x-process-time" in headers
+    assert json.loads(body) == {"jsonrpc": "2.0", "id": 1, "result": {}}
+
+
+@pytest.mark.asyncio
+async def test_sse_response(transport):
+    """测试Accept为text/event-stream时返回SSE"""
+    scope = make_scope(headers=[(b"accept", b"application/json, text/event-stream")])
+    status, headers, body = await call(transport.get_app(), b'{"jsonrpc":"2.0","id":1,"method":"ping"}', scope)
+
+    assert status == 200
+    assert headers[b"content-type"] == b"text/event-stream"
+    assert body.startswith(b"data: {") and body.endswith(b"\n\n")
+
+
+@pytest.mark.asyncio
+async def test_notification_and_parse_error(transport):
+    """测试通知返回202、非法JSON返回-32700"""
+    status, _, body = await call(transport.get_app(), b'{"jsonrpc":"2.0","method":"notifications/initialized"}')
+    assert status == 202
+    assert body == b""
+
+    status, _, body = await call(transport.get_app(), b"{not json")
+    assert status == 400
+    assert json.loads(body)["error"]["code"] == -32700
+
+
+@pytest.mark.asyncio
+async def test_client_disconnect_cancels_dispatch(transport):
+    """测试客户端断开时取消正在执行的工具调用"""
+    cancelled = asyncio.Event()
+
+    async def slow_message(message):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    transport.mcp_server.handle_message = slow_message
+    body = b'{"jsonrpc":"2.0","id":1,"method":"tools/call","params":{"name":"fetch"}}'
+    status, _, _ = await asyncio.wait_for(call(transport.get_app(), body, disconnect_after=0.05), 2)
+
+    assert status == 499
+    assert cancelled.is_set()
+    assert transport.admission.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_other_paths_reach_fastapi(transport):
+    """测试其他路径仍由FastAPI处理"""
+    status, _, body = await call(transport.get_app(), b"", make_scope(method="GET", path="/info"))
+
+    assert status == 200
+    assert json.loads(body)["name"] == "test-server"
+
+
+@pytest.mark.asyncio
+async def test_method_not_allowed(transport):
+    """测试/mcp的GET只用于打开SSE流，其他方法返回405"""
+    status, headers, _ = await call(transport.get_app(), b"", make_scope(method="GET"))
+    assert status == 405
+    assert headers[b"allow"] == b"GET, POST, DELETE, OPTIONS"
+
+    status, headers, _ = await call(transport.get_app(), b"", make_scope(method="OPTIONS"))
+    assert status == 200
+    assert b"access-control-allow-methods" in headers
@@ -0,0 +1,109 @@
+import asyncio
+import json
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from mcp_fetch_server.admission import Overloaded
+from mcp_fetch_server.memory_budget import BODY_COPIES, MemoryBudget
+from mcp_fetch_server.metrics import MetricsRegistry
+from mcp_fetch_server.server import FetchMCPServer
+
+
+@pytest.mark.asyncio
+async def test_waits_for_release():
+    """测试预算不足时等待，释放后按顺序获得预算"""
+    budget = MemoryBudget(max_bytes=100, max_wait=1.0)
+    await budget.reserve(80)
+
+    waiter = asyncio.ensure_future(budget.reserve(50))
+    await asyncio.sleep(0)
+    assert not waiter.done()
+    assert budget.waiting == 1
+
+    budget.release(80)
+    await asyncio.wait_for(waiter, 1)
+    assert budget.used == 50
+
+
+@pytest.mark.asyncio
+async def test_fail_fast():
+    """测试max_wait为0时立即拒绝"""
+    metrics = MetricsRegistry()
+    budget = MemoryBudget(max_bytes=100, max_wait=0, metrics=metrics)
+    await budget.reserve(80)
+
+    with pytest.raises(Overloaded):
+        await budget.reserve(50)
+    assert budget.used == 80
+    assert 'mcp_memory_budget_rejected_total{reason="exhausted"} 1' in metrics.render()
+
+
+@pytest.mark.asyncio
+async def test_wait_timeout():
+    """测试等待超时后拒绝且不占用预算"""
+    budget = MemoryBudget(max_bytes=100, max_wait=0.02)
+    await budget.reserve(80)
+
+    with pytest.raises(Overloaded):
+        await budget.reserve(50)
+    assert budget.waiting == 0
+
+    budget.release(80)
+    assert budget.used == 0
+
+
+@pytest.mark.asyncio
+async def test_larger_than_budget():
+    """测试超过整个预算的预留直接失败"""
+    budget = MemoryBudget(max_bytes=100)
+
+    with pytest.raises(ValueError):
+        await budget.reserve(101)
+
+
+@pytest_asyncio.fixture
+async def upstream(serve_routes):
+    async def handler(request):
+        # 分块慢速发送，使并发调用的正文读取相互重叠
+        response = web.StreamResponse(headers={"Content-Type": "text/plain"})
+        response.content_length = 1000
+        await response.prepare(request)
+        for _ in range(4):
+            await response.write(b"x" * 250)
+            await asyncio.sleep(0.02)
+        await response.write_eof()
+        return response
+
+    base = await serve_routes({"/": handler})
+    return base + "/"
+
+
+@pytest.mark.asyncio
+async def test_fetch_reserves_budget(upstream):
+    """测试并发的fetch调用受内存预算约束，调用结束后预算全部归还"""
+    server = FetchMCPServer(memory_budget=1000 * BODY_COPIES, memory_budget_wait=5)
+    try:
+        results = await asyncio.gather(*(server.call_tool("fetch", {"url": upstream, "fields": ["size"]}) for _ in range(3)))
+    finally:
+        await server.stop()
+
+    for result in results:
+        assert json.loads(result[0].text)["size"] == 1000
+    assert server.memory_budget.used == 0
+
+
+@pytest.mark.asyncio
+async def test_fetch_overloaded_when_budget_exhausted(upstream):
+    """测试预算用尽且不等待时工具调用以过载失败"""
+    server = FetchMCPServer(memory_budget=1000 * BODY_COPIES, memory_budget_wait=0)
+    try:
+        results = await asyncio.gather(
+            *(server.call_tool("fetch", {"url": upstream}) for _ in range(2)),
+            return_exceptions=True
+        )
+    finally:
+        await server.stop()
+
+    assert sum(isinstance(result, Overloaded) for result in results) == 1
+    assert server.memory_budget.used == 0
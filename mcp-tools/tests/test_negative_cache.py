@@ -0,0 +1,81 @@
+import asyncio
+import json
+import socket
+
+import aiohttp
+import pytest
+from mcp_fetch_server.negative_cache import HostUnavailable, NegativeCache, classify
+from mcp_fetch_server.server import FetchMCPServer
+
+
+def _closed_port() -> int:
+    """返回一个当前没有监听的本地端口"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _connect_error(url):
+    async with aiohttp.ClientSession() as session:
+        try:
+            await session.get(url, timeout=aiohttp.ClientTimeout(total=5))
+        except aiohttp.ClientError as e:
+            return e
+    raise AssertionError("请求没有失败")
+
+
+@pytest.mark.asyncio
+async def test_classify():
+    """测试连接被拒绝和域名解析失败的分类，其他错误不计入"""
+    refused = await _connect_error(f"http://127.0.0.1:{_closed_port()}/")
+    nxdomain = await _connect_error("http://nonexistent.invalid/")
+    assert classify(refused) == "refused"
+    assert classify(nxdomain) == "nxdomain"
+    assert classify(aiohttp.ServerDisconnectedError()) is None
+    assert classify(asyncio.TimeoutError()) is None
+
+
+@pytest.mark.asyncio
+async def test_ttl_grows_and_success_clears():
+    """测试连续失败时期限翻倍且不超过上限，成功后清除"""
+    refused = await _connect_error(f"http://127.0.0.1:{_closed_port()}/")
+    cache = NegativeCache(max_ttl=12)
+    assert cache.record("h", refused) == ("refused", 5.0)
+    assert cache.record("h", refused) == ("refused", 10.0)
+    assert cache.record("h", refused) == ("refused", 12)
+    with pytest.raises(HostUnavailable) as info:
+        cache.check("h")
+    assert info.value.failure == "refused"
+    assert 0 < info.value.retry_after <= 12
+
+    cache.success("h")
+    cache.check("h")
+    assert cache.record("h", refused) == ("refused", 5.0)
+
+
+@pytest.mark.asyncio
+async def test_disabled():
+    """测试max_ttl为0时不记录失败"""
+    refused = await _connect_error(f"http://127.0.0.1:{_closed_port()}/")
+    cache = NegativeCache(max_ttl=0)
+    assert cache.record("h", refused) is None
+    cache.check("h")
+
+
+@pytest.mark.asyncio
+async def test_repeat_fetch_fails_fast():
+    """测试同一不可达主机的重复请求直接失败，并计入指标"""
+    url = f"http://127.0.0.1:{_closed_port()}/missing"
+    server = FetchMCPServer()
+    try:
+        first = json.loads((await server.call_tool("fetch", {"url": url}))[0].text)
+        second = json.loads((await server.call_tool("fetch", {"url": url + "?again"}))[0].text)
+    finally:
+        await server.stop()
+
+    assert "error" in first
+    assert second["error"]["code"] == -32001
+    assert "拒绝连接" in second["error"]["data"]
+    metrics = server.metrics.render()
+    assert 'mcp_negative_cache_hits_total{failure="refused"} 1' in metrics
+    assert 'mcp_negative_cache_failures_total{failure="refused"} 1' in metrics
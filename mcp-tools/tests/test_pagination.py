@@ -0,0 +1,147 @@
+import json
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from mcp_fetch_server.metrics import MetricsRegistry
+from mcp_fetch_server.pagination import PageCache, estimate_tokens, request_key
+from mcp_fetch_server.server import FetchMCPServer
+
+
+BODY = "".join(f"line {i:04d}\n" for i in range(1000))
+
+
+def test_estimate_tokens():
+    """测试ASCII按4个字符、中文按1个字符估算"""
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("a" * 400) == 100
+    assert estimate_tokens("中" * 100) == 100
+    assert estimate_tokens("a" * 400 + "中" * 100) == 200
+
+
+def test_request_key():
+    """测试请求头不区分顺序和大小写，方法和请求体参与区分"""
+    key = request_key("get", "http://a/", {"Accept": "x", "X-Id": "1"}, None)
+    assert key == request_key("GET", "http://a/", {"x-id": "1", "accept": "x"}, None)
+    assert key != request_key("POST", "http://a/", {"Accept": "x", "X-Id": "1"}, None)
+    assert key != request_key("GET", "http://a/", {"Accept": "x", "X-Id": "1"}, "body")
+
+
+def test_cache_evicts_by_size():
+    """测试超出字节上限时淘汰最久未使用的正文"""
+    metrics = MetricsRegistry()
+    text = "x" * 1000
+    cache = PageCache(max_bytes=2500, metrics=metrics)
+    cache.put("a", {}, text)
+    cache.put("b", {}, text)
+    assert cache.get("a") is not None
+    cache.put("c", {}, text)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.size <= 2500
+    assert 'mcp_page_cache_lookups_total{result="miss"} 1' in metrics.render()
+
+
+def test_cache_expires(monkeypatch):
+    """测试过期的正文不再返回并释放占用"""
+    now = [1000.0]
+    monkeypatch.setattr("mcp_fetch_server.pagination.time.monotonic", lambda: now[0])
+    cache = PageCache(ttl=10)
+    cache.put("a", {}, "text")
+    now[0] += 11
+    assert cache.get("a") is None
+    assert cache.size == 0
+
+
+def test_cache_disabled():
+    """测试max_bytes为0时不缓存"""
+    cache = PageCache(max_bytes=0)
+    cache.put("a", {}, "text")
+    assert cache.get("a") is None
+
+
+@pytest_asyncio.fixture
+async def upstream(serve_routes):
+    requests = []
+
+    async def handler(request):
+        requests.append(request.path)
+        return web.Response(text=BODY)
+
+    base = await serve_routes({"/": handler})
+    return base + "/", requests
+
+
+async def _fetch(server, arguments):
+    result = await server.call_tool("fetch", arguments)
+    return json.loads(result[0].text)
+
+
+@pytest.mark.asyncio
+async def test_pages_through_cached_body(upstream):
+    """测试按游标翻页读完整个正文，只请求一次上游"""
+    url, requests = upstream
+    server = FetchMCPServer()
+    try:
+        pages = []
+        start = 0
+        while start is not None:
+            result = await _fetch(server, {"url": url, "max_length": 3000, "start_index": start, "fields": "all"})
+            assert result["total_length"] == len(BODY)
+            assert result["tokens"] == estimate_tokens(result["body"])
+            pages.append(result)
+            start = result["next_start_index"]
+    finally:
+        await server.stop()
+
+    assert "".join(page["body"] for page in pages) == BODY
+    assert [page["start_index"] for page in pages] == [0, 3000, 6000, 9000]
+    assert [page["cached"] for page in pages] == [False, True, True, True]
+    assert len(requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_full_body_without_max_length(upstream):
+    """测试未指定max_length时返回完整正文，不附带分页信息也不缓存"""
+    url, requests = upstream
+    server = FetchMCPServer()
+    try:
+        result = await _fetch(server, {"url": url})
+    finally:
+        await server.stop()
+
+    assert result["body"] == BODY
+    assert result["tokens"] == estimate_tokens(BODY)
+    assert "next_start_index" not in result
+    assert server.page_cache.size == 0
+
+
+@pytest.mark.asyncio
+async def test_refetches_when_not_cached(upstream):
+    """测试缓存中没有正文时翻页请求重新请求上游"""
+    url, requests = upstream
+    server = FetchMCPServer(page_cache_size=0)
+    try:
+        await _fetch(server, {"url": url, "max_length": 3000})
+        result = await _fetch(server, {"url": url, "max_length": 3000, "start_index": 9000, "fields": "all"})
+    finally:
+        await server.stop()
+
+    assert result["body"] == BODY[9000:]
+    assert result["next_start_index"] is None
+    assert result["cached"] is False
+    assert len(requests) == 2
+
+
+@pytest.mark.asyncio
+async def test_invalid_max_length(upstream):
+    """测试max_length必须为正数"""
+    url, _ = upstream
+    server = FetchMCPServer()
+    try:
+        result = await _fetch(server, {"url": url, "max_length": 0})
+    finally:
+        await server.stop()
+
+    assert "body" not in result
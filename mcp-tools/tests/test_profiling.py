@@ -0,0 +1,69 @@
+import threading
+import time
+
+from mcp_fetch_server.profiling import RequestProfiler, sample_stacks
+
+
+def test_profile_capture():
+    """测试单请求剖析"""
+    profiler = RequestProfiler()
+
+    with profiler.profile(True) as capture:
+        sum(range(1000))
+
+    assert capture is not None
+    assert "function calls" in capture.text
+    assert profiler.get_profile(capture.profile_id) == capture.text
+
+
+def test_profile_disabled():
+    """测试未启用剖析时不产生结果"""
+    profiler = RequestProfiler()
+
+    with profiler.profile(False) as capture:
+        pass
+
+    assert capture is None
+
+
+def test_should_profile_not_nested():
+    """测试剖析期间不会嵌套启用"""
+    profiler = RequestProfiler(sample_rate=1.0)
+
+    assert profiler.should_profile() is True
+    with profiler.profile(True):
+        assert profiler.should_profile(requested=True) is False
+
+
+def test_slowest_keeps_top_n():
+    """测试慢请求缓冲区只保留最慢的N个"""
+    profiler = RequestProfiler(slow_capacity=3)
+
+    for duration in [0.1, 0.5, 0.2, 0.9, 0.05, 0.3]:
+        profiler.record("tools/call:fetch", duration)
+
+    durations = [entry["duration"] for entry in profiler.slowest()]
+    assert durations == [0.9, 0.5, 0.3]
+
+
+def test_sample_stacks_collapsed_format():
+    """测试采样剖析输出折叠栈格式"""
+    stop = threading.Event()
+
+    def busy_worker():
+        while not stop.is_set():
+            time.sleep(0.001)
+
+    worker = threading.Thread(target=busy_worker)
+    worker.start()
+    try:
+        output = sample_stacks(worker.ident, duration=0.1, interval=0.005)
+    finally:
+        stop.set()
+        worker.join()
+
+    lines = [line for line in output.splitlines() if line]
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert "busy_worker" in stack
+    assert int(count) > 0
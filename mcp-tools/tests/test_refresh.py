@@ -0,0 +1,152 @@
+import json
+import time
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from mcp_fetch_server.host_limits import HostLimiter
+from mcp_fetch_server.refresh import ResponseCache, parse_cache_control
+from mcp_fetch_server.server import FetchMCPServer
+
+
+def _info(cache_control=None, status=200):
+    headers = {"Cache-Control": cache_control} if cache_control else {}
+    return {"status": status, "headers": headers, "url": "http://example.com/", "method": "GET", "size": 4}
+
+
+def test_parse_cache_control():
+    """测试解析Cache-Control指令"""
+    assert parse_cache_control('Max-Age=60, no-transform, stale-if-error="30"') == {
+        "max-age": "60", "no-transform": None, "stale-if-error": "30"
+    }
+
+
+@pytest.mark.parametrize("cache_control,ttl,stored", [
+    ("max-age=60", 0, True),
+    (None, 0, False),
+    (None, 30, True),
+    ("no-store", 30, False),
+    ("private, max-age=60", 0, False),
+    ("max-age=0", 30, False),
+])
+def test_cacheability(cache_control, ttl, stored):
+    """测试按上游的Cache-Control和默认ttl决定是否缓存"""
+    cache = ResponseCache(ttl=ttl)
+    assert cache.put("k", _info(cache_control), "body") is stored
+
+
+def test_windows_from_directives():
+    """测试响应中的stale指令优先于默认窗口，must-revalidate不返回过期内容"""
+    cache = ResponseCache(stale_while_revalidate=60, stale_if_error=300)
+    cache.put("a", _info("max-age=10, stale-while-revalidate=5, stale-if-error=20"), "body")
+    cache.put("b", _info("max-age=10, must-revalidate"), "body")
+    a, _ = cache.lookup("a")
+    assert a.stale_until - a.fresh_until == 5
+    assert a.error_until - a.fresh_until == 20
+
+    b, state = cache.lookup("b")
+    assert state == "fresh"
+    b.fresh_until = b.stale_until = b.error_until = time.monotonic() - 1
+    assert cache.lookup("b") == (None, None)
+    assert cache.size == sum(entry.size for entry in cache._entries.values())
+
+
+def test_host_headroom():
+    """测试主机名额用去一半后后台请求不再有余量"""
+    limiter = HostLimiter(initial_limit=4)
+    assert limiter.has_headroom("a")
+    limit = limiter.get("a")
+    limit.in_flight = 1
+    assert limiter.has_headroom("a")
+    limit.in_flight = 2
+    assert not limiter.has_headroom("a")
+
+
+@pytest_asyncio.fixture
+async def upstream(serve_routes):
+    state = {"body": "v1", "status": 200, "requests": []}
+
+    async def handler(request):
+        state["requests"].append(dict(request.headers))
+        if state["status"] != 200:
+            return web.Response(status=state["status"], text="down")
+        etag = '"%s"' % state["body"]
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag, "Cache-Control": "max-age=60"})
+        return web.Response(text=state["body"], headers={"ETag": etag, "Cache-Control": "max-age=60"})
+
+    base = await serve_routes({"/page": handler})
+    return base + "/page", state
+
+
+async def _fetch(server, arguments):
+    result = await server.call_tool("fetch", arguments)
+    return json.loads(result[0].text)
+
+
+def _expire(server, past_stale=False):
+    """把缓存中的响应改为已过期，past_stale时超出stale-while-revalidate窗口"""
+    for entry in server.response_cache._entries.values():
+        entry.fresh_until = time.monotonic() - 1
+        if past_stale:
+            entry.stale_until = entry.fresh_until
+
+
+@pytest.mark.asyncio
+async def test_fresh_then_stale_while_revalidate(upstream):
+    """测试新鲜期内直接返回缓存，过期后返回旧内容并在后台以条件请求刷新"""
+    url, state = upstream
+    server = FetchMCPServer()
+    try:
+        first = await _fetch(server, {"url": url})
+        fresh = await _fetch(server, {"url": url})
+        _expire(server)
+        state["body"] = "v2"
+        stale = await _fetch(server, {"url": url})
+        await server.refresher.join()
+        refreshed = await _fetch(server, {"url": url})
+    finally:
+        await server.stop()
+
+    assert "cache" not in first
+    assert fresh["cache"] == "fresh" and fresh["body"] == "v1"
+    assert stale["cache"] == "stale" and stale["body"] == "v1"
+    assert state["requests"][1]["If-None-Match"] == '"v1"'
+    assert refreshed["cache"] == "fresh" and refreshed["body"] == "v2"
+    assert len(state["requests"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_stale_if_error(upstream):
+    """测试超出stale-while-revalidate窗口后，上游出错时返回旧内容"""
+    url, state = upstream
+    server = FetchMCPServer()
+    try:
+        await _fetch(server, {"url": url})
+        _expire(server, past_stale=True)
+        state["status"] = 503
+        result = await _fetch(server, {"url": url})
+        uncached = await _fetch(server, {"url": url, "headers": {"Cache-Control": "no-cache"}})
+    finally:
+        await server.stop()
+
+    assert result["cache"] == "stale_if_error" and result["body"] == "v1"
+    assert uncached["status"] == 503
+    assert 'mcp_response_cache_lookups_total{result="stale_if_error"} 1' in server.metrics.render()
+
+
+@pytest.mark.asyncio
+async def test_warm_up_at_start(upstream):
+    """测试start()在后台加载预热URL"""
+    url, state = upstream
+    server = FetchMCPServer(warm_urls=[url, "not-a-url"])
+    try:
+        await server.start()
+        await server.refresher.join()
+        result = await _fetch(server, {"url": url})
+    finally:
+        await server.stop()
+
+    assert result["cache"] == "fresh"
+    assert len(state["requests"]) == 1
+    assert 'mcp_refresh_total{result="ok"} 1' in server.metrics.render()
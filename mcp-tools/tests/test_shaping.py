@@ -0,0 +1,111 @@
+import json
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from mcp_fetch_server.server import FetchMCPServer
+from mcp_fetch_server.shaping import select_fields, select_headers
+
+
+BODY = '{"name": "测试"}'
+HEADERS = {"Content-Type": "text/plain", "Server": "test", "X-Request-Id": "abc", "ETag": '"1"'}
+
+
+def test_select_headers():
+    """测试默认、none、all和名称列表四种响应头选择"""
+    assert select_headers(HEADERS, "default") == {"Content-Type": "text/plain", "ETag": '"1"'}
+    assert select_headers(HEADERS, "none") is None
+    assert select_headers(HEADERS, "all") == HEADERS
+    assert select_headers(HEADERS, ["x-request-id"]) == {"X-Request-Id": "abc"}
+
+
+def test_select_fields():
+    """测试字段选择，只在出现时返回可选字段"""
+    result = {"status": 200, "body": "x", "size": 1}
+    available = ("status", "body", "size", "next_start_index")
+    assert select_fields(result, "default", ("status", "body"), available) == {"status": 200, "body": "x"}
+    assert select_fields(result, "all", (), available) is result
+    assert select_fields(result, ["size", "next_start_index"], (), available) == {"size": 1}
+    with pytest.raises(ValueError, match="unknown"):
+        select_fields(result, ["unknown"], (), available)
+
+
+@pytest_asyncio.fixture
+async def upstream(serve_routes):
+    async def handler(request):
+        return web.Response(text=BODY, content_type="application/json", headers={"Server": "test", "X-Trace": "abc"})
+
+    async def redirect(request):
+        raise web.HTTPFound("/")
+
+    base = await serve_routes({"/": handler, "/old": redirect})
+    return base + "/"
+
+
+async def _call(tool, arguments):
+    server = FetchMCPServer()
+    try:
+        result = await server.call_tool(tool, arguments)
+    finally:
+        await server.stop()
+    return result[0].text
+
+
+@pytest.mark.asyncio
+async def test_default_profile_is_lean(upstream):
+    """测试默认只返回常用字段和响应头，输出为紧凑JSON"""
+    text = await _call("fetch", {"url": upstream})
+    result = json.loads(text)
+
+    assert set(result) == {"status", "headers", "body", "tokens"}
+    assert set(result["headers"]) == {"Content-Type", "Content-Length"}
+    assert "\n" not in text
+    assert "测试" in text
+
+
+@pytest.mark.asyncio
+async def test_selected_fields_and_headers(upstream):
+    """测试按参数选择字段和响应头"""
+    result = json.loads(await _call("fetch", {
+        "url": upstream,
+        "fields": ["status", "headers", "size"],
+        "include_headers": ["x-trace"],
+    }))
+    assert result == {"status": 200, "headers": {"X-Trace": "abc"}, "size": len(BODY.encode())}
+
+    result = json.loads(await _call("fetch", {"url": upstream, "fields": "all", "include_headers": "none"}))
+    assert "headers" not in result
+    assert {"url", "method", "size", "timing"} <= set(result)
+
+
+@pytest.mark.asyncio
+async def test_redirect_includes_url(upstream):
+    """测试发生重定向时默认字段包括最终的url"""
+    result = json.loads(await _call("fetch", {"url": upstream + "old"}))
+    assert result["url"] == upstream
+
+
+@pytest.mark.asyncio
+async def test_fetch_json_default_profile(upstream):
+    """测试fetch_json默认不返回raw_body"""
+    result = json.loads(await _call("fetch_json", {"url": upstream}))
+    assert result["body"] == {"name": "测试"}
+    assert set(result) == {"status", "headers", "body"}
+
+
+@pytest.mark.asyncio
+async def test_unknown_field(serve_routes):
+    """测试请求未知字段时返回参数错误，且不请求上游"""
+    requests = []
+
+    async def handler(request):
+        requests.append(request.path)
+        return web.json_response({})
+
+    base = await serve_routes({"/": handler})
+    result = json.loads(await _call("fetch", {"url": base, "fields": ["nope"]}))
+    assert "nope" in json.dumps(result, ensure_ascii=False)
+    assert result["error"]["code"] == -32602
+    result = json.loads(await _call("fetch_json", {"url": base, "fields": ["raw_body", "digest"]}))
+    assert "digest" in json.dumps(result, ensure_ascii=False)
+    assert requests == []
@@ -0,0 +1,105 @@
+import asyncio
+import io
+import json
+import time
+
+import pytest
+from mcp_fetch_server.server import FetchMCPServer
+from mcp_fetch_server.stdio_transport import StdioTransport
+
+
+def make_stdin(*messages):
+    lines = [json.dumps(message) if isinstance(message, dict) else message for message in messages]
+    return io.BytesIO(("\n".join(lines) + "\n").encode())
+
+
+def read_responses(stdout):
+    return [json.loads(line) for line in stdout.getvalue().decode().splitlines()]
+
+
+@pytest.fixture
+def server():
+    server = FetchMCPServer("test-server")
+
+    async def handle_message(message):
+        if message.get("id") is None:
+            return None
+        await asyncio.sleep(message["params"]["delay"])
+        return {"jsonrpc": "2.0", "id": message["id"], "result": {}}
+
+    server.handle_message = handle_message
+    return server
+
+
+def call(msg_id, delay):
+    return {"jsonrpc": "2.0", "id": msg_id, "method": "tools/call", "params": {"delay": delay}}
+
+
+@pytest.mark.asyncio
+async def test_responses_in_completion_order(server):
+    """测试慢请求不阻塞后续请求，响应按完成顺序写出"""
+    stdout = io.BytesIO()
+    transport = StdioTransport(server, stdin=make_stdin(call(1, 0.3), call(2, 0.3), call(3, 0.01)), stdout=stdout)
+
+    start = time.monotonic()
+    await transport.serve()
+
+    assert time.monotonic() - start < 0.55
+    assert [response["id"] for response in read_responses(stdout)][0] == 3
+    assert sorted(response["id"] for response in read_responses(stdout)) == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_concurrency_cap(server):
+    """测试工具调用并发上限"""
+    stdout = io.BytesIO()
+    transport = StdioTransport(server, max_concurrency=1, stdin=make_stdin(call(1, 0.1), call(2, 0.1)), stdout=stdout)
+
+    start = time.monotonic()
+    await transport.serve()
+
+    assert time.monotonic() - start >= 0.2
+    assert len(read_responses(stdout)) == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_request_has_no_response(server):
+    """测试notifications/cancelled取消进行中的请求"""
+    stdout = io.BytesIO()
+    cancel = {"jsonrpc": "2.0", "method": "notifications/cancelled", "params": {"requestId": 1}}
+    transport = StdioTransport(server, stdin=make_stdin(call(1, 10), cancel, call(2, 0)), stdout=stdout)
+
+    await asyncio.wait_for(transport.serve(), 2)
+
+    assert [response["id"] for response in read_responses(stdout)] == [2]
+
+
+@pytest.mark.asyncio
+async def test_parse_error():
+    """测试非法JSON返回-32700"""
+    stdout = io.BytesIO()
+    transport = StdioTransport(FetchMCPServer("test-server"), stdin=make_stdin("{oops", {"jsonrpc": "2.0", "id": 1, "method": "ping"}), stdout=stdout)
+
+    await transport.serve()
+
+    responses = read_responses(stdout)
+    assert responses[0]["error"]["code"] == -32700
+    assert responses[1] == {"jsonrpc": "2.0", "id": 1, "result": {}}
+
+
+@pytest.mark.asyncio
+async def test_invalid_id_and_cancel_params():
+    """测试无法作为键的id返回-32600，params不是对象的取消通知被忽略，服务器继续处理后续请求"""
+    stdout = io.BytesIO()
+    stdin = make_stdin(
+        {"jsonrpc": "2.0", "id": [1], "method": "ping"},
+        {"jsonrpc": "2.0", "method": "notifications/cancelled", "params": [1]},
+        {"jsonrpc": "2.0", "id": 2, "method": "ping"},
+    )
+    transport = StdioTransport(FetchMCPServer("test-server"), stdin=stdin, stdout=stdout)
+
+    await transport.serve()
+
+    responses = read_responses(stdout)
+    assert responses[0]["id"] is None and responses[0]["error"]["code"] == -32600
+    assert responses[1] == {"jsonrpc": "2.0", "id": 2, "result": {}}
@@ -0,0 +1,72 @@
+from mcp_fetch_server.tracing import TraceContext, UpstreamTiming, format_server_timing
+
+
+def test_parse_traceparent():
+    """测试traceparent解析"""
+    context = TraceContext.parse("00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01")
+
+    assert context.trace_id == "4bf92f3577b34da6a3ce929d0e0e4736"
+    assert context.span_id == "00f067aa0ba902b7"
+    assert context.flags == "01"
+
+
+def test_parse_invalid_traceparent():
+    """测试非法traceparent"""
+    invalid_headers = [
+        None,
+        "",
+        "not-a-traceparent",
+        "00-00000000000000000000000000000000-00f067aa0ba902b7-01",
+        "00-4bf92f3577b34da6a3ce929d0e0e4736-0000000000000000-01",
+    ]
+
+    for header in invalid_headers:
+        assert TraceContext.parse(header) is None
+
+
+def test_child_keeps_trace_id():
+    """测试子span沿用trace_id"""
+    parent = TraceContext.new()
+    timing = UpstreamTiming(parent)
+
+    headers = {}
+    timing.inject(headers)
+
+    assert headers["traceparent"].startswith(f"00-{parent.trace_id}-")
+    assert timing.trace.span_id != parent.span_id
+
+
+def test_inject_keeps_caller_traceparent():
+    """测试调用方已提供traceparent时不覆盖"""
+    timing = UpstreamTiming()
+    headers = {"TraceParent": "custom"}
+
+    timing.inject(headers)
+
+    assert headers == {"TraceParent": "custom"}
+
+
+def test_phases_accumulate():
+    """测试同一阶段多次出现时累加"""
+    timing = UpstreamTiming()
+    for _ in range(2):
+        timing.begin("ttfb")
+        timing.end("ttfb")
+    timing.end("dns")
+    timing.finish(200)
+
+    result = timing.to_dict()
+    assert "ttfb" in result
+    assert "dns" not in result
+    assert result["total"] >= result["ttfb"]
+
+
+def test_format_server_timing():
+    """测试Server-Timing头部格式"""
+    timing = UpstreamTiming()
+    timing.phases = {"dns": 0.002, "ttfb": 0.05}
+    timing.finish(200)
+
+    header = format_server_timing([timing])
+
+    assert header.startswith("upstream-dns;dur=2.000, upstream-ttfb;dur=50.000, upstream-total;dur=")
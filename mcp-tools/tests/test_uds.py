@@ -0,0 +1,69 @@
+import os
+import socket
+import stat
+
+import pytest
+from mcp_fetch_server.uds import UnixSocketListener
+
+
+def test_bind_sets_mode_and_cleans_up(tmp_path):
+    """测试套接字权限和关闭时删除文件"""
+    path = str(tmp_path / "mcp.sock")
+    listener = UnixSocketListener(path, 0o600)
+
+    listener.bind()
+    info = os.stat(path)
+    assert stat.S_ISSOCK(info.st_mode)
+    assert stat.S_IMODE(info.st_mode) == 0o600
+
+    listener.close()
+    assert not os.path.exists(path)
+
+
+def test_stale_socket_is_replaced(tmp_path):
+    """测试无人监听的残留套接字被清理"""
+    path = str(tmp_path / "mcp.sock")
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+
+    listener = UnixSocketListener(path)
+    listener.bind()
+    listener.close()
+
+
+def test_socket_in_use(tmp_path):
+    """测试其他进程正在监听时拒绝启动"""
+    path = str(tmp_path / "mcp.sock")
+    other = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    other.bind(path)
+    other.listen(1)
+    try:
+        with pytest.raises(OSError):
+            UnixSocketListener(path).bind()
+        assert os.path.exists(path)
+    finally:
+        other.close()
+
+
+def test_refuses_regular_file(tmp_path):
+    """测试路径是普通文件时不删除"""
+    path = tmp_path / "mcp.sock"
+    path.write_text("data")
+
+    with pytest.raises(OSError):
+        UnixSocketListener(str(path)).bind()
+    assert path.read_text() == "data"
+
+
+def test_close_keeps_replaced_file(tmp_path):
+    """测试套接字文件被替换后关闭时不误删"""
+    path = str(tmp_path / "mcp.sock")
+    listener = UnixSocketListener(path)
+    listener.bind()
+    os.unlink(path)
+    with open(path, "w") as f:
+        f.write("other")
+
+    listener.close()
+    assert os.path.exists(path)
@@ -0,0 +1,216 @@
+import asyncio
+import json
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from mcp_fetch_server.admission import Overloaded
+from mcp_fetch_server.http_transport import HTTPTransportServer
+from mcp_fetch_server.sessions import Session, SessionManager
+from mcp_fetch_server.watch import WatchScheduler
+
+from test_mcp_endpoint import call, make_scope
+
+
+async def _until(predicate, timeout=2.0):
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        assert loop.time() < deadline, "等待超时"
+        await asyncio.sleep(0.01)
+
+
+def test_session_queue_drops_oldest():
+    """测试通知队列满时丢弃最早的通知"""
+    session = Session("s", "c", max_queue=2)
+    for i in range(3):
+        session.notify({"n": i})
+    assert [json.loads(m)["n"] for m in session.drain()] == [1, 2]
+    assert session.dropped == 1
+
+
+def test_session_expiry_runs_close_callbacks():
+    """测试空闲会话过期时调用关闭回调，有SSE流的会话不过期"""
+    manager = SessionManager(ttl=0)
+    idle = manager.create("c")
+    streaming = manager.create("c")
+    streaming.streaming = True
+    closed = []
+    idle.on_close(closed.append)
+    manager.expire()
+
+    assert closed == [idle]
+    assert manager.get(idle.id) is None
+    assert manager.get(streaming.id) is streaming
+
+
+def test_session_cap_per_client():
+    """测试单个客户端超出会话上限时关闭它最久未使用的空闲会话，其他客户端不受影响"""
+    manager = SessionManager(max_per_client=2)
+    other = manager.create("b")
+    first = manager.create("a")
+    second = manager.create("a")
+    first.streaming = True
+    third = manager.create("a")
+
+    assert manager.get(second.id) is None and second.closed
+    assert manager.get(first.id) is first and manager.get(third.id) is third
+    assert manager.get(other.id) is other
+    assert len(manager) == 3
+
+
+def test_full_table_evicts_oldest_idle():
+    """测试会话表已满时关闭全局最久未使用的空闲会话，全部打开SSE流时才拒绝"""
+    manager = SessionManager(max_sessions=2, max_per_client=0)
+    oldest = manager.create("a")
+    newer = manager.create("b")
+    oldest.last_seen -= 10
+    created = manager.create("c")
+
+    assert oldest.closed and manager.get(newer.id) is newer
+    newer.streaming = created.streaming = True
+    with pytest.raises(Overloaded):
+        manager.create("d")
+
+
+@pytest.mark.asyncio
+async def test_scheduler_coalesces_subscribers():
+    """测试同一URL的多个订阅只轮询一次，变化时通知所有订阅者，会话结束后停止轮询"""
+    polls = []
+    state = {"digest": "a"}
+
+    async def poll(url, headers):
+        polls.append(headers)
+        return 200, {"ETag": '"%s"' % state["digest"]}, state["digest"]
+
+    scheduler = WatchScheduler(poll, min_interval=0.05)
+    first, second = Session("1", "c"), Session("2", "c")
+    try:
+        sub1 = scheduler.subscribe(first, "k", "http://example.com/", {}, 0.05)
+        sub2 = scheduler.subscribe(second, "k", "http://example.com/", {}, 10)
+        assert scheduler.subscribers("k") == 2
+        await _until(lambda: len(polls) >= 2)
+        state["digest"] = "b"
+        await _until(lambda: len(second._queue) > 0)
+    finally:
+        await scheduler.stop()
+
+    # 第二次轮询起带上条件请求头部
+    assert polls[1]["If-None-Match"] == '"a"'
+    message = json.loads(second.drain()[0])
+    assert message["method"] == "notifications/resources/updated"
+    assert message["params"]["subscriptionId"] == sub2.id
+    assert message["params"]["digest"] == "b"
+
+    first.close()
+    assert scheduler.unsubscribe(sub1.id) is False
+    assert scheduler.unsubscribe(sub2.id, first) is False
+    assert scheduler.unsubscribe(sub2.id, second) is True
+    assert scheduler.subscribers("k") == 0
+
+
+@pytest.mark.asyncio
+async def test_session_limit():
+    """测试每个会话的订阅数上限"""
+    async def poll(url, headers):
+        return 200, {}, "a"
+
+    scheduler = WatchScheduler(poll, max_per_session=1)
+    session = Session("1", "c")
+    try:
+        scheduler.subscribe(session, "k", "http://example.com/", {}, 60)
+        with pytest.raises(ValueError):
+            scheduler.subscribe(session, "k2", "http://example.com/2", {}, 60)
+    finally:
+        await scheduler.stop()
+
+
+@pytest_asyncio.fixture
+async def upstream(serve_routes):
+    state = {"text": "v1", "requests": 0}
+
+    async def handler(request):
+        state["requests"] += 1
+        return web.Response(text=state["text"])
+
+    base = await serve_routes({"/page": handler})
+    return base + "/page", state
+
+
+def _post(body, session_id=None):
+    headers = [(b"mcp-session-id", session_id.encode())] if session_id else []
+    return json.dumps(body).encode(), make_scope(headers=headers)
+
+
+async def _tool(app, session_id, name, arguments):
+    body, scope = _post({
+        "jsonrpc": "2.0", "id": 2, "method": "tools/call",
+        "params": {"name": name, "arguments": arguments},
+    }, session_id)
+    status, _, payload = await call(app, body, scope)
+    return status, json.loads(json.loads(payload)["result"]["content"][0]["text"])
+
+
+@pytest.mark.asyncio
+async def test_watch_over_streamable_http(upstream):
+    """测试initialize返回会话ID，watch的变化通知通过会话的SSE流推送，DELETE结束会话"""
+    url, state = upstream
+    transport = HTTPTransportServer("test-server", watch_min_interval=0.05)
+    app = transport.get_app()
+    body, scope = _post({"jsonrpc": "2.0", "id": 1, "method": "initialize", "params": {}})
+    status, headers, _ = await call(app, body, scope)
+    assert status == 200
+    session_id = headers[b"mcp-session-id"].decode()
+
+    # 打开SSE流
+    sent = []
+    disconnect = asyncio.Event()
+
+    async def receive():
+        await disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    stream_scope = make_scope(method="GET", headers=[
+        (b"accept", b"text/event-stream"), (b"mcp-session-id", session_id.encode())
+    ])
+    stream = asyncio.ensure_future(app(stream_scope, receive, send))
+    try:
+        status, result = await _tool(app, session_id, "watch", {"url": url, "interval": 0.05})
+        assert status == 200 and result["subscribers"] == 1
+        await _until(lambda: state["requests"] >= 1)
+        state["text"] = "v2"
+        await _until(lambda: any(b"notifications/resources/updated" in m.get("body", b"") for m in sent))
+
+        # 同一会话只能有一个SSE流
+        status, _, _ = await call(app, b"", stream_scope)
+        assert status == 409
+    finally:
+        disconnect.set()
+        await stream
+        await transport.mcp_server.stop()
+
+    assert sent[0]["status"] == 200
+    event = next(m["body"] for m in sent if b"resources/updated" in m.get("body", b""))
+    assert event.startswith(b"event: message\ndata: ")
+    assert json.loads(event.split(b"data: ", 1)[1])["params"]["uri"] == url
+
+    status, _, _ = await call(app, b"", make_scope(method="DELETE", headers=[(b"mcp-session-id", session_id.encode())]))
+    assert status == 204
+    # 会话结束后订阅随之取消，URL不再轮询
+    assert not transport.mcp_server.watcher._targets
+
+    body, scope = _post({"jsonrpc": "2.0", "id": 3, "method": "ping"}, session_id)
+    status, _, _ = await call(app, body, scope)
+    assert status == 404
+
+
+@pytest.mark.asyncio
+async def test_watch_requires_session():
+    """测试没有会话时watch返回参数错误"""
+    transport = HTTPTransportServer("test-server")
+    status, result = await _tool(transport.get_app(), None, "watch", {"url": "http://example.com/"})
+    assert status == 200
+    assert result["error"]["code"] == -32602
@@ -0,0 +1,134 @@
+import asyncio
+import json
+
+import pytest
+from mcp_fetch_server.http_transport import HTTPTransportServer
+
+
+class FakeSocket:
+    """模拟ASGI WebSocket连接"""
+
+    def __init__(self):
+        self.incoming = asyncio.Queue()
+        self.sent = []
+        self.reads = 0
+        self.incoming.put_nowait({"type": "websocket.connect"})
+
+    def send_message(self, message):
+        self.incoming.put_nowait({"type": "websocket.receive", "text": json.dumps(message)})
+
+    def close(self):
+        self.incoming.put_nowait({"type": "websocket.disconnect", "code": 1000})
+
+    async def receive(self):
+        self.reads += 1
+        return await self.incoming.get()
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    def responses(self):
+        return [json.loads(message["text"]) for message in self.sent if message["type"] == "websocket.send"]
+
+
+def call(msg_id, delay):
+    return {"jsonrpc": "2.0", "id": msg_id, "method": "tools/call", "params": {"name": "fetch", "delay": delay}}
+
+
+@pytest.fixture
+def transport():
+    transport = HTTPTransportServer("test-server", ws_max_in_flight=2)
+
+    async def handle_message(message):
+        await asyncio.sleep(message["params"]["delay"])
+        return {"jsonrpc": "2.0", "id": message["id"], "result": {}}
+
+    transport.mcp_server.handle_message = handle_message
+    return transport
+
+
+async def serve(transport, socket):
+    scope = {"type": "websocket", "path": "/mcp/ws", "headers": [], "client": ("127.0.0.1", 50000)}
+    return asyncio.ensure_future(transport.get_app()(scope, socket.receive, socket.send))
+
+
+@pytest.mark.asyncio
+async def test_multiplexed_calls(transport):
+    """测试同一连接上的调用并发执行，按完成顺序返回"""
+    socket = FakeSocket()
+    task = await serve(transport, socket)
+    socket.send_message(call(1, 0.2))
+    socket.send_message(call(2, 0.01))
+
+    await asyncio.sleep(0.3)
+    socket.close()
+    await asyncio.wait_for(task, 1)
+
+    assert socket.sent[0] == {"type": "websocket.accept"}
+    assert [response["id"] for response in socket.responses()] == [2, 1]
+    assert transport.active_requests == 0
+
+
+@pytest.mark.asyncio
+async def test_backpressure_stops_reading(transport):
+    """测试达到单连接并发上限后暂停读取"""
+    socket = FakeSocket()
+    task = await serve(transport, socket)
+    for msg_id in range(4):
+        socket.send_message(call(msg_id, 0.2))
+
+    await asyncio.sleep(0.1)
+    # 握手1次 + 两个名额各读取1条消息
+    assert socket.reads == 3
+    assert socket.incoming.qsize() == 2
+
+    await asyncio.sleep(0.5)
+    socket.close()
+    await asyncio.wait_for(task, 1)
+    assert len(socket.responses()) == 4
+
+
+@pytest.mark.asyncio
+async def test_cancel_and_disconnect(transport):
+    """测试取消通知和断开连接都会取消进行中的调用"""
+    socket = FakeSocket()
+    task = await serve(transport, socket)
+    socket.send_message(call(1, 10))
+    socket.send_message({"jsonrpc": "2.0", "method": "notifications/cancelled", "params": {"requestId": 1}})
+    socket.send_message(call(2, 10))
+
+    await asyncio.sleep(0.05)
+    socket.close()
+    await asyncio.wait_for(task, 1)
+
+    assert socket.responses() == []
+    assert transport.active_requests == 0
+
+
+@pytest.mark.asyncio
+async def test_invalid_id_keeps_connection(transport):
+    """测试无法作为键的id返回-32600，params不是对象的取消通知被忽略，连接上的其他调用不受影响"""
+    socket = FakeSocket()
+    task = await serve(transport, socket)
+    socket.send_message(call(1, 0.1))
+    socket.send_message({"jsonrpc": "2.0", "id": [2], "method": "ping"})
+    socket.send_message({"jsonrpc": "2.0", "method": "notifications/cancelled", "params": [1]})
+
+    await asyncio.sleep(0.2)
+    socket.close()
+    await asyncio.wait_for(task, 1)
+
+    responses = socket.responses()
+    assert responses[0]["id"] is None and responses[0]["error"]["code"] == -32600
+    assert responses[1] == {"jsonrpc": "2.0", "id": 1, "result": {}}
+
+
+@pytest.mark.asyncio
+async def test_reject_while_draining(transport):
+    """测试排空期间拒绝新连接"""
+    transport.draining = True
+    socket = FakeSocket()
+    task = await serve(transport, socket)
+    await asyncio.wait_for(task, 1)
+
+    assert socket.sent == [{"type": "websocket.close", "code": 1013}]